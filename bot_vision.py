@@ -1,669 +1,1119 @@
-import time
-import pyautogui
 import logging
-import tkinter as tk
-import pytesseract
-import re
-from datetime import datetime
-import calendar
 from PIL import ImageEnhance, Image, ImageFilter
 import threading
+from functools import cached_property
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
+import sys
 import numpy as np
 import cv2
-import pyperclip
+
+import clock
+import frame_source
+import input_channel
+import ocr_cache
+import ocr_engine
+import ocr_stats
+import overlay
+import recording
+import screen_wait
+import task_graph
+import task_plan
+import template_assets
+import template_matching
+import tracing
+from text_filters import limpar_texto, matches_filter, clean_target
 
 # Importe as tarefas e exponha-as como parte do módulo
-from planresult_tasks import tasks
+try:
+    from planresult_tasks import tasks
+except ImportError:
+    tasks = []
+
+logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
 
 # Configure o caminho para o executável do Tesseract e o diretório tessdata
-pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
-os.environ['TESSDATA_PREFIX'] = r"C:\Program Files\Tesseract-OCR\tessdata"
+# (RPA_TESSERACT_CMD e TESSDATA_PREFIX; padrão do Windows só no Windows)
+ocr_engine.configure_tesseract()
 
-logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+# Captura de tela e mouse/teclado das tarefas. RPA_FRAME_SOURCE aponta para uma
+# pasta de quadros gravados e RPA_INPUT_DISPLAY direciona a entrada para um
+# display X (ex.: sessão Xvfb). RPA_RECORD grava a execução e RPA_REPLAY a
+# reproduz sem display, com entrada simulada e relógio virtual (ver recording.py).
+_FRAME_SOURCE, INPUT = recording.from_environment(frame_source.default_source, input_channel.default_channel)
 
-def limpar_texto(texto, filter_type="both"):
-    """
-    Remove caracteres do texto conforme o filtro desejado:
-      - "numbers": remove tudo, exceto dígitos.
-      - "letters": remove tudo, exceto letras (incluindo acentuadas).
-      - "both": remove todos os caracteres que não sejam letras ou dígitos.
-      - Caso outro valor seja informado, remove apenas caracteres especiais do início e fim.
-    """
-    texto = texto.strip()
-    if filter_type == "numbers":
-        texto = re.sub(r"[^\d]", "", texto)
-    elif filter_type == "letters":
-        texto = re.sub(r"[^A-Za-zÀ-ÖØ-öø-ÿ]", "", texto)
-    elif filter_type == "both":
-        # Permite letras e números
-        texto = re.sub(r"[^A-Za-zÀ-ÖØ-öø-ÿ0-9]", "", texto)
-    else:
-        texto = re.sub(r'^[\W_]+|[\W_]+$', '', texto)
-    return texto
+# Captura compartilhada da tela: OCR, busca de imagens e recortes de região usam
+# o mesmo quadro enquanto ele tiver no máximo FRAME_MAX_AGE segundos; depois
+# disso cada pedido captura só a própria região (RPA_FRAME_MAX_AGE).
+FRAME_MAX_AGE = float(os.environ.get("RPA_FRAME_MAX_AGE", 0.05))
+FRAME_GRABBER = frame_source.FrameGrabber(_FRAME_SOURCE, max_age=FRAME_MAX_AGE)
 
-def matches_filter(word, filter_type):
-    """
-    Verifica se a palavra corresponde ao filtro desejado:
-      - Se filter_type == "numbers": apenas dígitos entre 1 e 31.
-      - Se filter_type == "letters": apenas letras (incluindo acentuadas).
-      - Se filter_type == "both": apenas letras e números.
-      - Caso contrário, retorna True.
-    """
-    filter_type = filter_type.lower()
-    if filter_type == "numbers":
-        if not re.fullmatch(r"\d+", word):
-            return False
-        try:
-            num = int(word)
-            return 1 <= num <= 31
-        except ValueError:
-            return False
-    elif filter_type == "letters":
-        return re.fullmatch(r"[A-Za-zÀ-ÖØ-öø-ÿ]+", word) is not None
-    elif filter_type == "both":
-        return re.fullmatch(r"[A-Za-zÀ-ÖØ-öø-ÿ0-9]+", word) is not None
-    return True
+# Esperas orientadas a mudanças na tela: os tempos fixos entre tentativas, antes do
+# clique, após o sendtext e o 'delay' das tarefas passam a ser apenas limites
+# superiores. Tarefas com 'wait_mode': 'fixed' mantêm as pausas fixas.
+CHANGE_DRIVEN_WAITS = True
+
+# Adianta o OCR da próxima tarefa de texto enquanto a atual executa clique, sendtext
+# e delay. Tarefas com 'lookahead': False não são antecipadas.
+LOOKAHEAD_OCR = True
+
+# Cache de resultados de OCR por quadro capturado. RPA_OCR_CACHE define um arquivo
+# para persistir o cache entre execuções; sem ele o cache fica apenas em memória.
+OCR_RESULT_CACHE = ocr_cache.OcrResultCache(max_entries=256, tolerance=0.0,
+                                            path=os.environ.get("RPA_OCR_CACHE"))
 
 def show_overlay(region, duration=1000):
     """
-    Cria uma janela transparente de tela cheia que exibe um retângulo vermelho
-    destacando a região onde o clique será realizado.
+    Destaca com um retângulo vermelho a região onde o clique será realizado.
+    O desenho é feito pela janela persistente do overlay (ver overlay.py),
+    então a chamada retorna imediatamente.
     
     Parâmetros:
       region: tupla (x, y, w, h) definindo a área a ser destacada.
       duration: tempo (em milissegundos) que o overlay ficará visível.
     """
-    x, y, w, h = region
-    root = tk.Tk()
-    root.overrideredirect(True)
-    root.attributes("-topmost", True)
-    root.config(bg='black')
-    root.attributes('-transparentcolor', 'black')
+    with tracing.span("overlay"):
+        overlay.show(region, duration)
 
-    screen_width = root.winfo_screenwidth()
-    screen_height = root.winfo_screenheight()
-    root.geometry(f"{screen_width}x{screen_height}+0+0")
+class _PreprocessContext:
+    """
+    Intermediários compartilhados entre as variações de pré-processamento.
+    Cada um é calculado apenas na primeira vez que uma variação precisa dele.
+    """
+    def __init__(self, img):
+        self._img = img
 
-    canvas = tk.Canvas(root, width=screen_width, height=screen_height, bg='black', highlightthickness=0)
-    canvas.pack()
-    canvas.create_rectangle(x, y, x + w, y + h, outline="red", width=4)
+    @cached_property
+    def pil(self):
+        if isinstance(self._img, np.ndarray):
+            return Image.fromarray(self._img)
+        return self._img
 
-    root.after(duration, root.destroy)
-    root.mainloop()
+    @cached_property
+    def img_np(self):
+        # Converte para array numpy para manipulação
+        if isinstance(self._img, np.ndarray):
+            return self._img
+        return np.array(self._img)
 
-def preprocess_image_for_ocr(img):
-    """
-    Aplica técnicas de pré-processamento otimizadas com base nos resultados de execução.
-    Foca em métodos que melhor detectaram números e remove métodos ineficazes.
-    """
-    # Lista para armazenar todas as versões processadas
-    processed_images = []
-    
-    # Converte para array numpy para manipulação
-    img_np = np.array(img)
-    
+    @cached_property
+    def img_hsv(self):
+        # HSV com saturação aumentada para destacar cores (base do método 28 e das máscaras)
+        img_hsv = cv2.cvtColor(self.img_np, cv2.COLOR_RGB2HSV)
+        img_hsv[:,:,1] = np.clip(img_hsv[:,:,1] * 1.4, 0, 255).astype(np.uint8)
+        return img_hsv
+
+    @cached_property
+    def img_enhanced(self):
+        return cv2.cvtColor(self.img_hsv, cv2.COLOR_HSV2RGB)
+
+    @cached_property
+    def img_gray(self):
+        return cv2.cvtColor(self.img_enhanced, cv2.COLOR_RGB2GRAY)
+
+    @cached_property
+    def gray(self):
+        return self.pil.convert("L")
+
+    @cached_property
+    def gray_np(self):
+        return np.array(self.gray)
+
+    @cached_property
+    def contrast_sharp(self):
+        # Contraste alto + nitidez (otimizado)
+        return ImageEnhance.Contrast(self.gray).enhance(2.5).filter(ImageFilter.SHARPEN)
+
+    @cached_property
+    def enhanced_gray(self):
+        # Lab color space processing - bom para números em fundos coloridos diversos
+        lab_img = cv2.cvtColor(self.img_np, cv2.COLOR_RGB2LAB)
+        l_channel, a_channel, b_channel = cv2.split(lab_img)
+        
+        # Equaliza o canal L (luminosidade) - técnica que foi bem sucedida
+        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
+        cl = clahe.apply(l_channel)
+        
+        # Recombina os canais e converte de volta para RGB e depois para escala de cinza
+        updated_lab_img = cv2.merge((cl, a_channel, b_channel))
+        enhanced_img = cv2.cvtColor(updated_lab_img, cv2.COLOR_LAB2RGB)
+        return cv2.cvtColor(enhanced_img, cv2.COLOR_RGB2GRAY)
+
+
+def _threshold(img, value, mode=cv2.THRESH_BINARY):
+    _, result = cv2.threshold(img, value, 255, mode)
+    return result
+
+def _channel_diff(ctx):
+    # Detecção de canais com base em diferenças entre R, G, B
+    r_channel = ctx.img_np[:,:,0]
+    b_channel = ctx.img_np[:,:,2]
+    channel_diff = np.absolute(r_channel.astype(np.int16) - b_channel.astype(np.int16))
+    channel_diff = np.clip(channel_diff * 2, 0, 255).astype(np.uint8)
+    return _threshold(channel_diff, 30)
+
+def _inverted_mask(ctx, lower, upper):
+    return cv2.bitwise_not(cv2.inRange(ctx.img_hsv, np.array(lower), np.array(upper)))
+
+# Variações de pré-processamento em ordem de prioridade, com base nos resultados de execução.
+# O índice na lista define o bônus de método usado na pontuação do OCR.
+PREPROCESSING_VARIANTS = [
     # MÉTODO 28 (62% confiança) - Prioridade máxima
-    # -----------------------------------------------------------------------------------
     # Versão com melhor detecção de números em caixas coloridas
-    # Processamento HSV com ajustes específicos
-    img_hsv = cv2.cvtColor(img_np, cv2.COLOR_RGB2HSV)
-    
-    # Aumenta a saturação para destacar cores
-    img_hsv[:,:,1] = np.clip(img_hsv[:,:,1] * 1.4, 0, 255).astype(np.uint8)
-    img_enhanced = cv2.cvtColor(img_hsv, cv2.COLOR_HSV2RGB)
-    processed_images.append(Image.fromarray(img_enhanced))
-    
+    ("hsv_saturacao", lambda ctx: ctx.img_enhanced),
     # Versão com threshold específico - variação do método 28
-    img_gray = cv2.cvtColor(img_enhanced, cv2.COLOR_RGB2GRAY)
-    _, thresh = cv2.threshold(img_gray, 150, 255, cv2.THRESH_BINARY)
-    processed_images.append(Image.fromarray(thresh))
+    ("hsv_threshold_150", lambda ctx: _threshold(ctx.img_gray, 150)),
     
     # MÉTODO 2 (59% confiança) - Segunda prioridade
-    # -----------------------------------------------------------------------------------
     # Inversão para texto claro em fundo escuro
-    _, dark_bg_thresh = cv2.threshold(np.array(img.convert("L")), 160, 255, cv2.THRESH_BINARY_INV)
-    processed_images.append(Image.fromarray(dark_bg_thresh))
-    
+    ("fundo_escuro_inv_160", lambda ctx: _threshold(ctx.gray_np, 160, cv2.THRESH_BINARY_INV)),
     # Variação do método 2 com diferentes thresholds
-    dark_thresholds = [140, 160, 180]
-    for thresh_val in dark_thresholds:
-        _, dark_var = cv2.threshold(np.array(img.convert("L")), thresh_val, 255, cv2.THRESH_BINARY_INV)
-        processed_images.append(Image.fromarray(dark_var))
+    ("fundo_escuro_inv_140_var", lambda ctx: _threshold(ctx.gray_np, 140, cv2.THRESH_BINARY_INV)),
+    ("fundo_escuro_inv_160_var", lambda ctx: _threshold(ctx.gray_np, 160, cv2.THRESH_BINARY_INV)),
+    ("fundo_escuro_inv_180_var", lambda ctx: _threshold(ctx.gray_np, 180, cv2.THRESH_BINARY_INV)),
     
     # MÉTODO 22 (57% confiança) - Terceira prioridade
-    # -----------------------------------------------------------------------------------
-    # Processamento de canais de cor e detecção específica
-    r_channel = img_np[:,:,0]
-    g_channel = img_np[:,:,1]
-    b_channel = img_np[:,:,2]
-    
-    # Variações de manipulação de canais
-    # Detecção de canais com base em diferenças entre R, G, B
-    channel_diff = np.absolute(r_channel.astype(np.int16) - b_channel.astype(np.int16))
-    channel_diff = np.clip(channel_diff * 2, 0, 255).astype(np.uint8)
-    _, channel_thresh = cv2.threshold(channel_diff, 30, 255, cv2.THRESH_BINARY)
-    processed_images.append(Image.fromarray(channel_thresh))
+    ("diferenca_canais", _channel_diff),
     
     # MÉTODO 13 (41% confiança) e MÉTODO 27 (41% confiança)
-    # -----------------------------------------------------------------------------------
-    # Versões com alta nitidez e contraste
-    gray = img.convert("L")
-    
-    # Contraste alto + nitidez (otimizado)
-    contrast_sharp = ImageEnhance.Contrast(gray).enhance(2.5).filter(ImageFilter.SHARPEN)
-    processed_images.append(contrast_sharp)
-    
+    ("contraste_nitidez", lambda ctx: ctx.contrast_sharp),
     # Nitidez adicional para melhorar bordas
-    extra_sharp = contrast_sharp.filter(ImageFilter.SHARPEN).filter(ImageFilter.SHARPEN)
-    processed_images.append(extra_sharp)
+    ("nitidez_extra", lambda ctx: ctx.contrast_sharp.filter(ImageFilter.SHARPEN).filter(ImageFilter.SHARPEN)),
     
     # TÉCNICAS PARA TEXTO CLARO EM FUNDO ESCURO (cinza, preto)
-    # -----------------------------------------------------------------------------------
     # Inversão simples (útil para texto branco em fundo escuro)
-    inverted = Image.fromarray(255 - img_np)
-    processed_images.append(inverted)
-    
-    # Thresholding adaptativo para texto em fundo escuro
-    cv_gray = np.array(gray)
-    
+    ("invertida", lambda ctx: 255 - ctx.img_np),
     # Adaptativo com diferentes janelas - melhor para números pequenos em fundos variados
-    adaptive_thresh1 = cv2.adaptiveThreshold(
-        cv_gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 7, 2
-    )
-    processed_images.append(Image.fromarray(adaptive_thresh1))
-    
-    adaptive_thresh2 = cv2.adaptiveThreshold(
-        cv_gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, 11, 3
-    )
-    processed_images.append(Image.fromarray(adaptive_thresh2))
+    ("adaptativo_gaussiano", lambda ctx: cv2.adaptiveThreshold(
+        ctx.gray_np, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 7, 2)),
+    ("adaptativo_media", lambda ctx: cv2.adaptiveThreshold(
+        ctx.gray_np, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, 11, 3)),
     
     # MANIPULAÇÃO DE COR PARA FUNDOS COLORIDOS (rosa, cinza)
-    # -----------------------------------------------------------------------------------
-    # Rosa/roxo claro em HSV com faixas mais precisas
-    lower_pink = np.array([140, 50, 150])
-    upper_pink = np.array([170, 255, 255])
-    pink_mask_hsv = cv2.inRange(img_hsv, lower_pink, upper_pink)
-    pink_mask_inv = cv2.bitwise_not(pink_mask_hsv)
-    processed_images.append(Image.fromarray(pink_mask_inv))
-    
-    # Cinza claro em HSV
-    lower_gray = np.array([0, 0, 180])
-    upper_gray = np.array([180, 30, 255])
-    gray_mask_hsv = cv2.inRange(img_hsv, lower_gray, upper_gray)
-    gray_mask_inv = cv2.bitwise_not(gray_mask_hsv)
-    processed_images.append(Image.fromarray(gray_mask_inv))
-    
-    # Cinza escuro/preto
-    lower_dark_gray = np.array([0, 0, 0])
-    upper_dark_gray = np.array([180, 30, 80])
-    dark_gray_mask = cv2.inRange(img_hsv, lower_dark_gray, upper_dark_gray)
-    dark_gray_mask_inv = cv2.bitwise_not(dark_gray_mask)
-    processed_images.append(Image.fromarray(dark_gray_mask_inv))
-    
-    # EQUALIZAÇÃO E APRIMORAMENTO DE LUMINOSIDADE
-    # -----------------------------------------------------------------------------------
-    # Lab color space processing - bom para números em fundos coloridos diversos
-    lab_img = cv2.cvtColor(img_np, cv2.COLOR_RGB2LAB)
-    l_channel, a_channel, b_channel = cv2.split(lab_img)
-    
-    # Equaliza o canal L (luminosidade) - técnica que foi bem sucedida
-    clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
-    cl = clahe.apply(l_channel)
-    
-    # Recombina os canais
-    updated_lab_img = cv2.merge((cl, a_channel, b_channel))
-    
-    # Converte de volta para RGB e depois para escala de cinza
-    enhanced_img = cv2.cvtColor(updated_lab_img, cv2.COLOR_LAB2RGB)
-    enhanced_gray = cv2.cvtColor(enhanced_img, cv2.COLOR_RGB2GRAY)
-    
-    # Aplica thresholding na imagem melhorada
-    _, binary_enhanced = cv2.threshold(enhanced_gray, 127, 255, cv2.THRESH_BINARY)
-    processed_images.append(Image.fromarray(binary_enhanced))
+    ("mascara_rosa", lambda ctx: _inverted_mask(ctx, [140, 50, 150], [170, 255, 255])),
+    ("mascara_cinza_claro", lambda ctx: _inverted_mask(ctx, [0, 0, 180], [180, 30, 255])),
+    ("mascara_cinza_escuro", lambda ctx: _inverted_mask(ctx, [0, 0, 0], [180, 30, 80])),
     
+    # EQUALIZAÇÃO E APRIMORAMENTO DE LUMINOSIDADE (CLAHE no canal L do Lab)
+    ("clahe_lab_binario", lambda ctx: _threshold(ctx.enhanced_gray, 127)),
     # Versão invertida para texto claro em fundo escuro
-    _, binary_enhanced_inv = cv2.threshold(enhanced_gray, 127, 255, cv2.THRESH_BINARY_INV)
-    processed_images.append(Image.fromarray(binary_enhanced_inv))
+    ("clahe_lab_binario_inv", lambda ctx: _threshold(ctx.enhanced_gray, 127, cv2.THRESH_BINARY_INV)),
     
     # COMBINAÇÕES OTIMIZADAS - mescla técnicas bem sucedidas
-    # -----------------------------------------------------------------------------------
-    
     # Combinação: alta nitidez + contraste elevado
-    contrast_highest = ImageEnhance.Contrast(gray).enhance(3.0)
-    sharpened_strong = contrast_highest.filter(ImageFilter.SHARPEN).filter(ImageFilter.SHARPEN)
-    processed_images.append(sharpened_strong)
-    
+    ("contraste_maximo", lambda ctx: ImageEnhance.Contrast(ctx.gray).enhance(3.0)
+        .filter(ImageFilter.SHARPEN).filter(ImageFilter.SHARPEN)),
     # Mescla lab e hsv para capturar o melhor dos dois mundos
-    merged_img = cv2.addWeighted(enhanced_gray, 0.5, img_gray, 0.5, 0)
-    _, merged_thresh = cv2.threshold(merged_img, 140, 255, cv2.THRESH_BINARY)
-    processed_images.append(Image.fromarray(merged_thresh))
-    
-    # Filtra imagens válidas
+    ("mescla_lab_hsv", lambda ctx: _threshold(cv2.addWeighted(ctx.enhanced_gray, 0.5, ctx.img_gray, 0.5, 0), 140)),
+]
+
+class _LazyVariants:
+    """
+    Acesso por índice às variações de pré-processamento de uma imagem. Cada
+    variação é construída na primeira vez que é pedida e reaproveitada depois.
+    """
+    def __init__(self, img):
+        self._ctx = _PreprocessContext(img)
+        self._cache = {}
+
+    def get(self, index):
+        if index not in self._cache:
+            name, build = PREPROCESSING_VARIANTS[index]
+            try:
+                with tracing.span("preprocess", variant=name):
+                    self._cache[index] = build(self._ctx)
+            except Exception as e:
+                logging.debug(f"Erro ao processar a variação {name}: {e}")
+                self._cache[index] = None
+        return self._cache[index]
+
+def iter_preprocessed_images(img):
+    """
+    Gera as variações de pré-processamento uma a uma, na ordem de prioridade,
+    calculando cada uma apenas quando solicitada. Produz tuplas (índice, imagem),
+    onde a imagem é um array NumPy ou uma imagem PIL.
+    """
+    variants = _LazyVariants(img)
+    for index in range(len(PREPROCESSING_VARIANTS)):
+        processed = variants.get(index)
+        if processed is not None:
+            yield index, processed
+
+def preprocess_image_for_ocr(img):
+    """
+    Aplica técnicas de pré-processamento otimizadas com base nos resultados de execução.
+    Foca em métodos que melhor detectaram números e remove métodos ineficazes.
+    Retorna todas as variações como imagens PIL (ver iter_preprocessed_images
+    para a versão sob demanda).
+    """
     valid_images = []
-    for img in processed_images:
-        try:
-            if img.mode in ['RGB', 'L', '1']:
-                valid_images.append(img)
-        except Exception as e:
-            logging.debug(f"Erro ao processar uma das imagens: {e}")
+    for _, processed in iter_preprocessed_images(img):
+        if isinstance(processed, np.ndarray):
+            processed = Image.fromarray(processed)
+        if processed.mode in ['RGB', 'L', '1']:
+            valid_images.append(processed)
     
     print(f"Gerando {len(valid_images)} variações otimizadas de pré-processamento para OCR")
     
     return valid_images
 
-def locate_image_with_retry(image_path, region=None, confidence=0.9, max_attempts=3, scales=None):
+# Busca em duas etapas (reduzida e refinada) para imagens procuradas na tela inteira
+COARSE_TO_FINE_FULLSCREEN = True
+
+def locate_image_with_retry(image_path, region=None, confidence=0.9, max_attempts=3, scales=None, coarse_to_fine=None):
     """
     Tenta localizar uma imagem com diferentes escalas e níveis de confiança.
+    Cada tentativa faz uma única captura e avalia todas as escalas (e a
+    confiança reduzida) sobre ela com o TemplateMatcher.
+    Buscas na tela inteira usam a busca em duas etapas (reduzida e depois
+    refinada), a menos que coarse_to_fine=False seja informado.
     """
     if scales is None:
         scales = [1.0, 0.95, 1.05]  # Tenta com escala original e ±5%
+    if coarse_to_fine is None:
+        coarse_to_fine = region is None and COARSE_TO_FINE_FULLSCREEN
+    
+    matcher = template_matching.get_matcher()
     
     for attempt in range(max_attempts):
-        # Tenta localizar com diferentes escalas
-        for scale in scales:
-            try:
-                if scale != 1.0:
-                    # Carrega e redimensiona a imagem de referência
-                    ref_img = Image.open(image_path)
-                    new_width = int(ref_img.width * scale)
-                    new_height = int(ref_img.height * scale)
-                    scaled_img = ref_img.resize((new_width, new_height))
-                    
-                    # Salva temporariamente para usar com pyautogui
-                    temp_path = f"temp_scaled_{scale}.png"
-                    scaled_img.save(temp_path)
-                    
-                    if region:
-                        location = pyautogui.locateOnScreen(temp_path, region=region, confidence=confidence)
-                    else:
-                        location = pyautogui.locateOnScreen(temp_path, confidence=confidence)
-                    
-                    os.remove(temp_path)  # Limpa arquivo temporário
-                else:
-                    if region:
-                        location = pyautogui.locateOnScreen(image_path, region=region, confidence=confidence)
-                    else:
-                        location = pyautogui.locateOnScreen(image_path, confidence=confidence)
-                
-                if location:
-                    return location
-            except Exception as e:
-                logging.debug(f"Erro ao buscar imagem com escala {scale}: {e}")
-                continue
-        
-        # Se a escala não funcionou, tente reduzir a confiança
+        # Se a escala não funcionar, tenta com a confiança reduzida
         adjusted_confidence = max(0.7, confidence - 0.05 * (attempt + 1))
-        logging.debug(f"Ajustando confiança para {adjusted_confidence}")
+        logging.debug(f"Buscando {image_path} com confiança {confidence} (ajustada: {adjusted_confidence})")
         
         try:
-            if region:
-                location = pyautogui.locateOnScreen(image_path, region=region, confidence=adjusted_confidence)
-            else:
-                location = pyautogui.locateOnScreen(image_path, confidence=adjusted_confidence)
-            
+            haystack, offset = FRAME_GRABBER.capture(region)
+            location = matcher.locate(image_path, haystack, confidence, scales=scales,
+                                      fallback_confidence=adjusted_confidence, offset=offset,
+                                      coarse_to_fine=coarse_to_fine)
             if location:
                 return location
         except Exception as e:
-            logging.debug(f"Erro ao buscar imagem com confiança ajustada: {e}")
+            logging.debug(f"Erro ao buscar imagem {image_path}: {e}")
         
-        # Pequena pausa entre tentativas
-        time.sleep(0.5)
+        # Pequena pausa entre tentativas, encerrada antes se a região mudar
+        if CHANGE_DRIVEN_WAITS:
+            screen_wait.wait_for_change(FRAME_GRABBER, region, timeout=0.5)
+        else:
+            clock.sleep(0.5)
     
     return None
 
-def find_text_with_multiple_preprocessing(region_img, target_text, filter_type, early_confidence_threshold=75.0):
+# Configurações OCR com prioridade para PSM 7 e 8 (melhores para números isolados)
+OCR_CONFIGS = [
+    r'--oem 3 --psm 7 -c tessedit_char_whitelist=0123456789',  # Linha única - limitada a números
+    r'--oem 3 --psm 8 -c tessedit_char_whitelist=0123456789',  # Palavra única - limitada a números
+    r'--oem 3 --psm 6',  # Layout de página mais comum
+    r'--oem 3 --psm 11'  # Texto esparso
+]
+
+# Reordena as combinações de OCR de cada tarefa pelo histórico de acertos (ocr_stats.json)
+ADAPTIVE_OCR_RANKING = True
+
+# Bônus para métodos prioritários
+HIGH_CONFIDENCE_BONUS = 8.0  # Bônus mais alto para os primeiros métodos (optimizados)
+
+class OcrTokens:
+    """
+    Resultado de um image_to_data normalizado em arrays NumPy para um filtro:
+    palavras limpas (e em minúsculas para comparação), máscara das palavras
+    válidas para o filtro, confiança e limites de cada caixa.
+    """
+    def __init__(self, data, filter_type):
+        cleaned = [limpar_texto(word, filter_type) for word in data['text']]
+        self.cleaned = cleaned
+        self.recognized = [word for raw, word in zip(data['text'], cleaned)
+                           if raw.strip() and matches_filter(word, filter_type)]
+        self.words = np.array([word.lower() for word in cleaned], dtype=str)
+        self.valid = np.array([bool(word) and matches_filter(word, filter_type) for word in cleaned], dtype=bool)
+        self.conf = np.array([float(conf) for conf in data['conf']], dtype=float)
+        self.left = np.asarray(data['left'], dtype=np.int64)
+        self.top = np.asarray(data['top'], dtype=np.int64)
+        self.right = self.left + np.asarray(data['width'], dtype=np.int64)
+        self.bottom = self.top + np.asarray(data['height'], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.cleaned)
+
+    def find_sequence(self, target_words):
+        """
+        Índices iniciais das janelas em que as palavras válidas coincidem, na
+        ordem, com target_words (já em minúsculas). Comparação vetorizada
+        sobre todas as posições da janela deslizante.
+        """
+        n_words = len(target_words)
+        n_windows = len(self) - n_words + 1
+        if n_words == 0 or n_windows <= 0:
+            return np.empty(0, dtype=np.int64)
+        hits = np.ones(n_windows, dtype=bool)
+        for k, word in enumerate(target_words):
+            hits &= self.valid[k:k + n_windows] & (self.words[k:k + n_windows] == word)
+        return np.flatnonzero(hits)
+
+    def window_stats(self, starts, n_words):
+        """
+        Para cada janela, calcula a confiança média (considerando apenas valores
+        positivos) e a caixa que envolve todas as palavras.
+        """
+        windows = starts[:, None] + np.arange(n_words)[None, :]
+        conf = self.conf[windows]
+        positive = conf > 0
+        counts = positive.sum(axis=1)
+        sums = np.where(positive, conf, 0.0).sum(axis=1)
+        avg_confidence = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+        min_left = self.left[windows].min(axis=1)
+        min_top = self.top[windows].min(axis=1)
+        max_right = self.right[windows].max(axis=1)
+        max_bottom = self.bottom[windows].max(axis=1)
+        return avg_confidence, min_left, min_top, max_right - min_left, max_bottom - min_top
+
+def _match_target_in_data(tokens, target_words, filter_type, img_index, config_index, total_images):
+    """
+    Procura a sequência de palavras alvo nos tokens de um image_to_data.
+    Retorna uma lista de tuplas (box, confiança final, palavras candidatas),
+    já com os bônus de configuração e de método aplicados.
+    """
+    # Print numbers found in OCR
+    if filter_type == "numbers":
+        if tokens.recognized:
+            print(f"OCR Numbers found (método {img_index+1}/{total_images}): {tokens.recognized}")
+    elif filter_type == "both":
+        # Filter only numeric words to print
+        numeric_words = [w for w in tokens.recognized if w.isdigit()]
+        if numeric_words:
+            print(f"OCR Numbers found (método {img_index+1}/{total_images}): {numeric_words}")
+    
+    n_words = len(target_words)
+    starts = tokens.find_sequence([word.lower() for word in target_words])
+    if not len(starts):
+        return []
+    
+    # Adicionar bônus conforme o processamento e configuração
+    config_bonus = 0
+    if filter_type == "numbers" and config_index < 2:  # PSM 7 e 8 com whitelist
+        config_bonus = 8 if config_index == 0 else 5
+    
+    # Adiciona bônus para os métodos de alta prioridade
+    method_bonus = 0
+    if img_index < 10:  # Os primeiros métodos são específicos para melhor desempenho
+        method_bonus = HIGH_CONFIDENCE_BONUS * (1.0 - (img_index / 10.0))
+    
+    avg_confidence, lefts, tops, widths, heights = tokens.window_stats(starts, n_words)
+    matches = []
+    for pos, idx in enumerate(starts):
+        candidate = tokens.cleaned[idx:idx + n_words]
+        box = (int(lefts[pos]), int(tops[pos]), int(widths[pos]), int(heights[pos]))
+        final_confidence = float(avg_confidence[pos]) + config_bonus + method_bonus
+        
+        print(f"Encontrado '{' '.join(candidate)}' com confiança: {final_confidence:.2f}% (método {img_index+1})")
+        matches.append((box, final_confidence, candidate))
+    return matches
+
+class RegionOcrIndex:
+    """
+    Índice dos tokens reconhecidos em uma captura de região. O OCR de cada
+    combinação (variação, configuração) roda no máximo uma vez por captura,
+    então várias buscas de texto na mesma imagem reaproveitam o mesmo
+    reconhecimento em vez de repetir a varredura completa.
+    """
+    def __init__(self, region_img, region=None):
+        self.region = tuple(region) if region else None
+        self.digest = ocr_cache.frame_digest(region_img)
+        self.thumbnail = ocr_cache.frame_thumbnail(region_img)
+        self.ocr_calls = 0
+        self._variants = _LazyVariants(region_img)
+        self._data = {}
+        self._tokens = {}
+        self._variants_lock = threading.Lock()
+        self._data_lock = threading.Lock()
+
+    def matches_frame(self, region, region_img, tolerance=0.0):
+        """Indica se a captura (região e pixels) é a mesma usada para montar o índice."""
+        if self.region != (tuple(region) if region else None):
+            return False
+        if ocr_cache.frame_digest(region_img) == self.digest:
+            return True
+        return bool(tolerance) and ocr_cache.changed_fraction(
+            ocr_cache.frame_thumbnail(region_img), self.thumbnail) <= tolerance
+
+    def image(self, img_index):
+        with self._variants_lock:
+            return self._variants.get(img_index)
+
+    def data(self, img_index, config_index, cancel=None):
+        """
+        Resultado do image_to_data da combinação, executando o OCR só na primeira vez.
+        Se cancel (threading.Event) já estiver sinalizado depois de gerar a variação,
+        o OCR não roda e nada fica no cache: retorna None.
+        """
+        pair = (img_index, config_index)
+        with self._data_lock:
+            if pair in self._data:
+                return self._data[pair]
+        img = self.image(img_index)
+        if cancel is not None and cancel.is_set():
+            return None
+        data = None
+        if img is not None:
+            with tracing.span("ocr", variant=PREPROCESSING_VARIANTS[img_index][0], config=OCR_CONFIGS[config_index]):
+                data = ocr_engine.get_engine().image_to_data(img, config=OCR_CONFIGS[config_index])
+        with self._data_lock:
+            self.ocr_calls += 1
+            self._data[pair] = data
+        return data
+
+    def tokens(self, img_index, config_index, filter_type, cancel=None):
+        """Tokens normalizados da combinação para o filtro (calculados uma vez)."""
+        key = (img_index, config_index, filter_type)
+        with self._data_lock:
+            if key in self._tokens:
+                return self._tokens[key]
+        data = self.data(img_index, config_index, cancel)
+        if data is None and cancel is not None and cancel.is_set():
+            return None
+        tokens = OcrTokens(data, filter_type) if data is not None else None
+        with self._data_lock:
+            self._tokens[key] = tokens
+        return tokens
+
+    def matches(self, img_index, config_index, target_words, filter_type, cancel=None):
+        """
+        Procura o alvo no resultado de uma combinação. Com cancel, a busca é
+        abandonada entre as etapas (variação, OCR, comparação) assim que o
+        evento for sinalizado, liberando o pool do motor OCR para a próxima busca.
+        """
+        if cancel is not None and cancel.is_set():
+            return []
+        try:
+            tokens = self.tokens(img_index, config_index, filter_type, cancel)
+            if tokens is None:
+                return []
+            with tracing.span("ocr_match", variant=PREPROCESSING_VARIANTS[img_index][0],
+                              config=OCR_CONFIGS[config_index]) as span:
+                found = _match_target_in_data(tokens, target_words, filter_type, img_index, config_index,
+                                              len(PREPROCESSING_VARIANTS))
+                span.set(hit=bool(found))
+            return found
+        except Exception as e:
+            logging.debug(f"Erro em OCR com configuração {OCR_CONFIGS[config_index]}: {e}")
+            return []
+
+def _search_plan(stats_key):
+    """
+    Ordem das combinações (índice da variação, índice da configuração) a testar.
+    Sem histórico, segue a ordem estática. Com histórico, retorna primeiro as
+    combinações que já venceram para a tarefa e depois as demais.
+    """
+    default_pairs = [(img_index, config_index)
+                     for img_index in range(len(PREPROCESSING_VARIANTS))
+                     for config_index in range(len(OCR_CONFIGS))]
+    if stats_key is None:
+        return [], default_pairs
+    
+    pair_keys = {_pair_key(pair): pair for pair in default_pairs}
+    learned, remaining = ocr_stats.get_stats().ranked_pairs(stats_key, list(pair_keys))
+    return [pair_keys[key] for key in learned], [pair_keys[key] for key in remaining]
+
+def _pair_key(pair):
+    img_index, config_index = pair
+    return ocr_stats.make_pair_key(PREPROCESSING_VARIANTS[img_index][0], OCR_CONFIGS[config_index])
+
+def _record_winner(stats_key, pair):
+    """Registra no histórico a combinação vencedora (ou a ausência dela)."""
+    if stats_key is not None:
+        ocr_stats.get_stats().record(stats_key, _pair_key(pair) if pair is not None else None)
+
+def _collect_results(stats_key, results):
+    """
+    Ordena os resultados na ordem estática. Nenhum atingiu o limiar, então a
+    execução é registrada no histórico sem vencedor: uma combinação abaixo do
+    limiar não deve ganhar prioridade nas próximas buscas.
+    """
+    _record_winner(stats_key, None)
+    
+    # Mantém a mesma ordem da busca serial para a seleção por ocorrência
+    results.sort(key=lambda item: item[0])
+    return [box for _, box, _ in results], [conf for _, _, conf in results], False
+
+def _find_text_parallel(index, stages, target_words, filter_type, early_confidence_threshold, stats_key):
+    """
+    Submete as combinações (imagem × configuração) de cada etapa ao pool do
+    motor OCR, à medida que as variações são geradas, e consome os resultados
+    conforme ficam prontos. Assim que um resultado atinge o limiar, o trabalho
+    pendente é cancelado e as etapas seguintes nem são submetidas.
+    """
+    results = []
+    cancel = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=ocr_engine.get_engine().workers)
+    futures = {}
+    try:
+        for stage_pairs in stages:
+            stage = {}
+            for img_index, config_index in stage_pairs:
+                if index.image(img_index) is None:
+                    continue
+                future = executor.submit(tracing.wrap(index.matches), img_index, config_index, target_words, filter_type,
+                                         cancel)
+                stage[future] = (img_index, config_index)
+            futures.update(stage)
+            
+            for future in as_completed(stage):
+                pair = stage[future]
+                for box, final_confidence, _ in future.result():
+                    if final_confidence >= early_confidence_threshold:
+                        print(f">>> Detecção com alta confiança ({final_confidence:.2f}%) encontrada! Executando ação imediatamente.")
+                        _record_winner(stats_key, pair)
+                        return [box], [final_confidence], True
+                    results.append((pair, box, final_confidence))
+    finally:
+        # Cancela o que ainda não começou e sinaliza o que já está em execução
+        # para parar na próxima etapa, sem ocupar o pool da busca seguinte
+        cancel.set()
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+    
+    return _collect_results(stats_key, results)
+
+def find_text_with_multiple_preprocessing(region_img, target_text, filter_type, early_confidence_threshold=75.0,
+                                          parallel=False, stats_key=None, prune=False, index=None,
+                                          target_words=None):
     """
     Tenta encontrar o texto usando múltiplas versões pré-processadas da imagem.
     Retorna as caixas encontradas junto com seus scores de confiança.
     Se encontrar um resultado com confiança acima do threshold, retorna imediatamente.
+    As variações de pré-processamento são geradas sob demanda, então uma detecção
+    antecipada evita o custo das variações restantes.
+    Com parallel=True as combinações são avaliadas em paralelo no pool do motor OCR.
+    Com stats_key, as combinações que mais acertaram para a tarefa são testadas
+    primeiro e a que atingir o limiar é registrada no histórico como vencedora.
+    A busca serial já termina na primeira combinação que atinge o limiar; com
+    parallel=True, prune=True avalia as combinações do histórico antes de
+    submeter as demais, que só rodam se nenhuma delas atingir o limiar.
+    Um RegionOcrIndex da mesma captura pode ser passado em index para
+    reaproveitar o OCR já executado por buscas anteriores, e target_words
+    (palavras já limpas, ver task_plan.py) evita limpar o texto alvo de novo.
     """
-    processed_images = preprocess_image_for_ocr(region_img)
+    if index is None:
+        index = RegionOcrIndex(region_img)
+    learned_pairs, remaining_pairs = _search_plan(stats_key)
     
-    # Configurações OCR com prioridade para PSM 7 e 8 (melhores para números isolados)
-    configs = [
-        r'--oem 3 --psm 7 -c tessedit_char_whitelist=0123456789',  # Linha única - limitada a números
-        r'--oem 3 --psm 8 -c tessedit_char_whitelist=0123456789',  # Palavra única - limitada a números
-        r'--oem 3 --psm 6',  # Layout de página mais comum
-        r'--oem 3 --psm 11'  # Texto esparso
-    ]
-    
-    all_found_boxes = []
-    all_confidence_scores = []
+    if target_words is None:
+        target_words = clean_target(target_text, filter_type)
     
     print(f"Buscando texto '{target_text}' com limiar de confiança de {early_confidence_threshold}%")
     
-    # Bônus para métodos prioritários
-    high_confidence_bonus = 8.0  # Bônus mais alto para os primeiros métodos (optimizados)
+    if parallel:
+        stages = (learned_pairs, remaining_pairs) if prune and learned_pairs else (learned_pairs + remaining_pairs,)
+        return _find_text_parallel(index, stages, target_words, filter_type,
+                                   early_confidence_threshold, stats_key)
     
-    for img_index, img in enumerate(processed_images):
-        for config_index, config in enumerate(configs):
-            try:
-                data = pytesseract.image_to_data(img, output_type=pytesseract.Output.DICT, config=config)
-                
-                recognized_words = [limpar_texto(w, filter_type) for w in data['text'] if w.strip()]
-                recognized_words = [w for w in recognized_words if matches_filter(w, filter_type)]
-                
-                # Print numbers found in OCR
-                if filter_type == "numbers":
-                    if recognized_words:
-                        print(f"OCR Numbers found (método {img_index+1}/{len(processed_images)}): {recognized_words}")
-                elif filter_type == "both":
-                    # Filter only numeric words to print
-                    numeric_words = [w for w in recognized_words if w.isdigit()]
-                    if numeric_words:
-                        print(f"OCR Numbers found (método {img_index+1}/{len(processed_images)}): {numeric_words}")
-                
-                target_words = [limpar_texto(word, filter_type) for word in target_text.split()]
-                target_words = [w for w in target_words if matches_filter(w, filter_type)]
-                n_words = len(target_words)
+    results = []
+    
+    for stage_pairs in (learned_pairs, remaining_pairs):
+        for img_index, config_index in stage_pairs:
+            matches = index.matches(img_index, config_index, target_words, filter_type)
+            for box, final_confidence, _ in matches:
+                # Se a confiança for alta o suficiente, retorna imediatamente
+                if final_confidence >= early_confidence_threshold:
+                    print(f">>> Detecção com alta confiança ({final_confidence:.2f}%) encontrada! Executando ação imediatamente.")
+                    _record_winner(stats_key, (img_index, config_index))
+                    return [box], [final_confidence], True
                 
-                for idx in range(len(data['text']) - n_words + 1):
-                    candidate = [limpar_texto(data['text'][j], filter_type) for j in range(idx, idx + n_words)]
-                    if not all(candidate):
-                        continue
-                    if not all(matches_filter(word, filter_type) for word in candidate):
-                        continue
-                    
-                    # Verifica se as palavras candidatas correspondem às palavras alvo
-                    if all(candidate[k].lower() == target_words[k].lower() for k in range(n_words)):
-                        # Calcula o score de confiança médio para essas palavras
-                        confidence_values = [float(data['conf'][j]) for j in range(idx, idx + n_words) if float(data['conf'][j]) > 0]
-                        
-                        if confidence_values:
-                            avg_confidence = sum(confidence_values) / len(confidence_values)
-                        else:
-                            avg_confidence = 0
-                            
-                        lefts = [data['left'][j] for j in range(idx, idx + n_words)]
-                        tops = [data['top'][j] for j in range(idx, idx + n_words)]
-                        rights = [data['left'][j] + data['width'][j] for j in range(idx, idx + n_words)]
-                        bottoms = [data['top'][j] + data['height'][j] for j in range(idx, idx + n_words)]
-                        
-                        min_left = min(lefts)
-                        min_top = min(tops)
-                        max_right = max(rights)
-                        max_bottom = max(bottoms)
-                        
-                        box = (min_left, min_top, max_right - min_left, max_bottom - min_top)
-                        
-                        # Adicionar bônus conforme o processamento e configuração
-                        config_bonus = 0
-                        if filter_type == "numbers" and config_index < 2:  # PSM 7 e 8 com whitelist
-                            config_bonus = 8 if config_index == 0 else 5
-                        
-                        # Adiciona bônus para os métodos de alta prioridade
-                        method_bonus = 0
-                        if img_index < 10:  # Os primeiros métodos são específicos para melhor desempenho
-                            method_bonus = high_confidence_bonus * (1.0 - (img_index / 10.0))
-                        
-                        final_confidence = avg_confidence + config_bonus + method_bonus
-                        
-                        print(f"Encontrado '{' '.join(candidate)}' com confiança: {final_confidence:.2f}% (método {img_index+1})")
-                        
-                        # Se a confiança for alta o suficiente, retorna imediatamente
-                        if final_confidence >= early_confidence_threshold:
-                            print(f">>> Detecção com alta confiança ({final_confidence:.2f}%) encontrada! Executando ação imediatamente.")
-                            return [box], [final_confidence], True
-                        
-                        # Adicione o box e sua pontuação de confiança para comparação posterior
-                        all_found_boxes.append(box)
-                        all_confidence_scores.append(final_confidence)
-            except Exception as e:
-                logging.debug(f"Erro em OCR com configuração {config}: {e}")
-                continue
+                # Adicione o box e sua pontuação de confiança para comparação posterior
+                results.append(((img_index, config_index), box, final_confidence))
+    
+    return _collect_results(stats_key, results)
+
+def locate_texts(region, targets, early_confidence_threshold=75.0, region_img=None):
+    """
+    Localiza vários textos em uma única captura da região. O OCR de cada
+    combinação (variação, configuração) roda uma vez e atende todas as buscas.
+    
+    Parâmetros:
+      region: tupla (x, y, w, h) da região a capturar.
+      targets: lista de tuplas (texto alvo, filtro).
+      region_img: captura já feita da região (opcional).
     
-    return all_found_boxes, all_confidence_scores, False
+    Retorna um dicionário {(texto, filtro): (caixas, confianças, detecção antecipada)},
+    com as caixas relativas à região.
+    """
+    if region_img is None:
+        region_img = FRAME_GRABBER.region(region)
+    index = RegionOcrIndex(region_img, region)
+    results = {}
+    for target_text, filter_type in targets:
+        results[(target_text, filter_type)] = find_text_with_multiple_preprocessing(
+            region_img, target_text, filter_type, early_confidence_threshold, index=index
+        )
+    logging.info(f"{len(targets)} busca(s) na região {region} com {index.ocr_calls} chamada(s) de OCR.")
+    return results
+
+def _search_text_task(task, region_img, index):
+    """Executa a busca de texto de uma tarefa compilada na captura, com as opções da tarefa."""
+    return find_text_with_multiple_preprocessing(
+        region_img, task.text, task.char_type, task.early_confidence,
+        parallel=task.parallel_ocr,
+        stats_key=task.stats_key if ADAPTIVE_OCR_RANKING else None,
+        prune=task.prune_ocr_variants,
+        index=index,
+        target_words=task.target_words
+    )
+
+def _cache_options(task):
+    """Opções da tarefa que mudam o resultado da busca de texto (parte da chave do cache)."""
+    return (task.early_confidence, task.prune_ocr_variants, task.parallel_ocr,
+            ADAPTIVE_OCR_RANKING and task.stats_key is not None)
+
+def _can_prefetch(task):
+    return task.kind == "text" and task.region is not None and task.lookahead
+
+class _Lookahead:
+    """
+    OCR antecipado de uma tarefa de texto, executado em segundo plano enquanto
+    a tarefa anterior termina seu clique, sendtext e delay. O resultado só é
+    usado se a captura da tarefa, quando ela começar, for igual à antecipada.
+    """
+    def __init__(self, executor, task_index, task, settle):
+        self.task_index = task_index
+        self.region = task.region
+        self.index = None
+        self._captured = threading.Event()
+        self.future = executor.submit(tracing.wrap(self._run), task, settle)
+
+    def _run(self, task, settle):
+        try:
+            # Captura apenas depois que a região para de mudar com o clique anterior;
+            # settle é o delay da tarefa em execução, que é quem mexe na tela agora
+            if CHANGE_DRIVEN_WAITS:
+                screen_wait.wait_until_stable(FRAME_GRABBER, self.region, timeout=max(0.5, settle))
+            region_img = FRAME_GRABBER.region(self.region, max_age=0)
+            self.index = RegionOcrIndex(region_img, self.region)
+        finally:
+            self._captured.set()
+        return _search_text_task(task, region_img, self.index)
+
+    def result_for(self, task_index, region, region_img, tolerance=0.0):
+        """
+        Resultado antecipado para a tarefa, ou None se for outra tarefa, se a
+        captura antecipada ainda não aconteceu ou se a tela mudou desde ela.
+        """
+        if task_index != self.task_index or not self._captured.is_set() or self.index is None:
+            return None
+        if not self.index.matches_frame(region, region_img, tolerance):
+            logging.info("A região mudou desde o OCR antecipado; descartando-o.")
+            return None
+        try:
+            return self.future.result()
+        except Exception as e:
+            logging.debug(f"Erro no OCR antecipado: {e}")
+            return None
+
+def _select_found_box(task, found_boxes, confidence_scores, early_match):
+    """Escolhe, entre as detecções do texto, a caixa (relativa à região) usada pela tarefa."""
+    if early_match:
+        # Se houver uma correspondência antecipada, use-a diretamente
+        logging.info(f"Usando detecção antecipada com confiança: {confidence_scores[0]:.2f}%")
+        return found_boxes[0]
+    if task.best_confidence:
+        # Senão, selecione o box com maior confiança
+        best_index = confidence_scores.index(max(confidence_scores))
+        logging.info(f"Selecionada a detecção com maior confiança: {max(confidence_scores):.2f}%")
+        return found_boxes[best_index]
+    # Mantém o comportamento anterior para compatibilidade
+    if len(found_boxes) >= task.occurrence:
+        return found_boxes[task.occurrence - 1]
+    return found_boxes[-1]
+
+def screen_bounds():
+    """Limites (x, y, largura, altura) da tela capturada, ou None se a captura falhar."""
+    try:
+        frame = FRAME_GRABBER.frame(max_age=float("inf"))
+    except Exception as e:
+        logging.debug(f"Limites da tela indisponíveis: {e}")
+        return None
+    height, width = frame.pixels.shape[:2]
+    return (frame.origin[0], frame.origin[1], width, height)
+
+def compile_plan(tasks, default_confidence=0.9):
+    """
+    Compila as tarefas em um plano (ver task_plan.py), com as regiões
+    recortadas aos limites da tela. Lança task_plan.TaskPlanError se alguma
+    tarefa for inválida.
+    """
+    return task_plan.compile_tasks(tasks, screen_bounds(), default_confidence)
+
+def locate_task_target(task, default_confidence=0.9):
+    """
+    Localiza o alvo de uma tarefa (texto ou imagem) sem clicar nem alterar a
+    tela. Retorna a caixa (x, y, largura, altura) em coordenadas de tela ou
+    None. Usada pelos passos somente leitura do grafo de tarefas, que podem
+    rodar em paralelo. Aceita a tarefa como dicionário ou já compilada.
+    """
+    if not isinstance(task, task_plan.CompiledTask):
+        task = task_plan.compile_task(task, screen=screen_bounds(), default_confidence=default_confidence)
+    region = task.region
+    if task.kind == "text":
+        region_img = FRAME_GRABBER.region(region)
+        if region_img is None or region_img.shape[1] <= 1 or region_img.shape[0] <= 1:
+            return None
+        options = _cache_options(task)
+        result = OCR_RESULT_CACHE.lookup(region, task.text, task.char_type, region_img,
+                                         tolerance=task.cache_tolerance, options=options)
+        if result is None:
+            result = _search_text_task(task, region_img, RegionOcrIndex(region_img, region))
+            OCR_RESULT_CACHE.store(region, task.text, task.char_type, region_img, result, options)
+        found_boxes, confidence_scores, early_match = result
+        if not found_boxes or all(score < task.early_confidence for score in confidence_scores):
+            return None
+        x, y, w, h = _select_found_box(task, found_boxes, confidence_scores, early_match)
+        return (region[0] + x, region[1] + y, w, h)
+    if task.specific:
+        return locate_image_with_retry(task.image, region=region, confidence=task.confidence)
+    return locate_image_with_retry(task.image, confidence=task.confidence, coarse_to_fine=task.coarse_to_fine)
+
+def read_region_text(region, config="--psm 6"):
+    """Texto lido pelo OCR na região (x, y, largura, altura), com o pré-processamento padrão."""
+    region_img = FRAME_GRABBER.region(region)
+    _, img = next(iter_preprocessed_images(region_img))
+    return ocr_engine.get_engine().image_to_string(img, config=config).strip()
+
+def wait_for_screen(task, timeout, region=None, until="stable"):
+    """
+    Espera orientada a mudanças na tela, com timeout como limite superior.
+    until="stable" espera a região (ou a tela inteira) parar de mudar;
+    until="change" espera a região mudar em relação ao último quadro capturado.
+    Com CHANGE_DRIVEN_WAITS desligado ou 'wait_mode': 'fixed' na tarefa,
+    faz uma pausa fixa de timeout segundos.
+    """
+    if timeout <= 0:
+        return
+    fixed = not CHANGE_DRIVEN_WAITS or task.wait_mode == 'fixed'
+    with tracing.span("wait", until="fixed" if fixed else until, timeout=timeout):
+        if fixed:
+            clock.sleep(timeout)
+            return
+        started = clock.monotonic()
+        try:
+            if until == "change":
+                screen_wait.wait_for_change(FRAME_GRABBER, region, timeout=timeout)
+            else:
+                screen_wait.wait_until_stable(FRAME_GRABBER, region, timeout=timeout)
+        except Exception as e:
+            logging.debug(f"Erro na espera pela tela: {e}")
+            clock.sleep(max(0.0, timeout - (clock.monotonic() - started)))
 
 def click_images(tasks, default_confidence=0.9, default_margin=50):
     """
     Itera sobre as tasks e executa as ações necessárias com detecção aprimorada.
+    Retorna, para cada tarefa, a última posição encontrada ("skip" quando o
+    clique foi pulado, None quando a tarefa falhou).
+    As tarefas (lista de dicionários ou TaskPlan já compilado) são validadas
+    antes do primeiro clique; task_plan.TaskPlanError indica tarefas inválidas.
+    Depois da última lista de tarefas da execução, chame finish_run().
     """
+    tasks = compile_plan(tasks, default_confidence)
+    results = [None] * len(tasks)
     i = 0
     max_attempts = 4  # Sempre 3 tentativas para cada tarefa
     task_failures = {}  # Rastreia quantas vezes uma tarefa falhou após backtracking
+    region_index = None  # OCR da última região capturada, compartilhado entre tarefas vizinhas
+    lookahead = None  # OCR antecipado da próxima tarefa de texto
+    lookahead_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ocr-lookahead")
     
-    while i < len(tasks):
-        task = tasks[i]
-        region = task.get('region')
-        delay = task.get('delay', 0)
-        location = None
-        attempts = 0
+    try:
+        while i < len(tasks):
+            task = tasks[i]
+            region = task.region
+            delay = task.delay
+            location = None
+            attempts = 0
         
-        # Define o limiar de confiança para ação imediata
-        early_confidence_threshold = task.get('early_confidence', 75.0)
+            # Define o limiar de confiança para ação imediata
+            early_confidence_threshold = task.early_confidence
         
-        # Nome da tarefa para logs (texto ou nome do arquivo de imagem)
-        task_name = task.get('text', task.get('image', f"Tarefa {i+1}"))
+            # Nome da tarefa para logs (texto ou nome do arquivo de imagem)
+            task_name = task.name
         
-        logging.info(f"Iniciando tarefa {i+1}/{len(tasks)}: {task_name}")
+            logging.info(f"Iniciando tarefa {i+1}/{len(tasks)}: {task_name}")
+            tracing.set_context(task=i + 1, task_name=task_name, attempt=None)
         
-        while attempts < max_attempts and location is None:
-            try:
-                if 'text' in task:
-                    target_text = task.get('text')
-                    filter_type = task.get('char_type', 'both').lower()
+            while attempts < max_attempts and location is None:
+                tracing.set_context(attempt=attempts + 1)
+                try:
+                    if task.kind == "text":
+                        # Região obrigatória e já recortada à tela na compilação do plano
+                        target_text = task.text
+                        filter_type = task.char_type
                     
-                    # Verifica se a região está definida
-                    if not region:
-                        logging.warning("Nenhuma região definida para OCR. É necessário especificar uma região válida.")
-                        break
+                        logging.info(f"Buscando o texto '{target_text}' em TODA a região {region} com filtro '{filter_type}' (tentativa {attempts+1} de {max_attempts})")
                     
-                    logging.info(f"Buscando o texto '{target_text}' em TODA a região {region} com filtro '{filter_type}' (tentativa {attempts+1} de {max_attempts})")
+                        # Captura a screenshot da área completa definida pela região
+                        # Formato da região: (x, y, largura, altura)
+                        region_img = FRAME_GRABBER.region(region)
                     
-                    # Captura a screenshot da área completa definida pela região
-                    # Formato da região: (x, y, largura, altura)
-                    region_img = pyautogui.screenshot(region=region)
+                        # Verifica se a imagem foi capturada corretamente
+                        if region_img is None or region_img.shape[1] <= 1 or region_img.shape[0] <= 1:
+                            logging.warning(f"Falha ao capturar a região {region} para OCR. Verifique se as coordenadas são válidas.")
+                            attempts += 1
+                            continue
                     
-                    # Verifica se a imagem foi capturada corretamente
-                    if not region_img or region_img.width <= 1 or region_img.height <= 1:
-                        logging.warning(f"Falha ao capturar a região {region} para OCR. Verifique se as coordenadas são válidas.")
-                        attempts += 1
-                        continue
+                        logging.info(f"Área capturada para OCR: {region[2]}x{region[3]} pixels")
                     
-                    logging.info(f"Área capturada para OCR: {region[2]}x{region[3]} pixels")
+                        # O OCR antecipado durante a tarefa anterior vale se a tela não mudou desde então
+                        result = None
+                        if lookahead is not None and attempts == 0:
+                            result = lookahead.result_for(i, region, region_img, task.cache_tolerance or 0.0)
+                            if result is not None:
+                                logging.info(f"Usando o OCR antecipado da região {region}.")
+                                region_index = lookahead.index
+                                OCR_RESULT_CACHE.store(region, target_text, filter_type, region_img, result,
+                                                       _cache_options(task))
                     
-                    # Usa a função melhorada de detecção de texto processando TODA a área da imagem
-                    found_boxes, confidence_scores, early_match = find_text_with_multiple_preprocessing(
-                        region_img, target_text, filter_type, early_confidence_threshold
-                    )
+                        # Um quadro igual ao de uma busca anterior reaproveita o resultado do OCR
+                        if result is None:
+                            result = OCR_RESULT_CACHE.lookup(region, target_text, filter_type, region_img,
+                                                             tolerance=task.cache_tolerance,
+                                                             options=_cache_options(task))
+                            if result is not None:
+                                logging.info(f"Região {region} inalterada; reutilizando resultado de OCR em cache.")
                     
-                    if found_boxes:
-                        # Verifica se todas as confianças estão abaixo do limiar
-                        if all(score < early_confidence_threshold for score in confidence_scores):
-                            logging.info(f"Todas as confianças para '{target_text}' estão abaixo de {early_confidence_threshold}%. " +
-                                         "Presumindo que o alvo já foi clicado. Avançando para a próxima tarefa.")
-                            location = "skip"  # Sinalização para pular o clique
-                            break
-                            
-                        if early_match:
-                            # Se houver uma correspondência antecipada, use-a diretamente
-                            selected_box_relative = found_boxes[0]
-                            logging.info(f"Usando detecção antecipada com confiança: {confidence_scores[0]:.2f}%")
-                        elif task.get('best_confidence', True):
-                            # Senão, selecione o box com maior confiança
-                            best_index = confidence_scores.index(max(confidence_scores))
-                            selected_box_relative = found_boxes[best_index]
-                            logging.info(f"Selecionada a detecção com maior confiança: {max(confidence_scores):.2f}%")
-                        else:
-                            # Mantém o comportamento anterior para compatibilidade
-                            occurrence = task.get('occurrence', 1)
-                            if len(found_boxes) >= occurrence:
-                                selected_box_relative = found_boxes[occurrence - 1]
+                        if result is None:
+                            # Tarefas vizinhas na mesma região, com a tela inalterada, compartilham o OCR
+                            if region_index is None or not region_index.matches_frame(
+                                    region, region_img, task.cache_tolerance or 0.0):
+                                region_index = RegionOcrIndex(region_img, region)
                             else:
-                                selected_box_relative = found_boxes[-1]
+                                logging.info(f"Reutilizando o OCR da região {region} feito pela tarefa anterior.")
                         
-                        # Converter coordenadas relativas para absolutas
-                        # Isso garante que o clique ocorra na posição correta dentro da região especificada
-                        selected_box = (
-                            region[0] + selected_box_relative[0],
-                            region[1] + selected_box_relative[1],
-                            selected_box_relative[2],
-                            selected_box_relative[3]
-                        )
+                            # Usa a função melhorada de detecção de texto processando TODA a área da imagem
+                            result = _search_text_task(task, region_img, region_index)
+                            OCR_RESULT_CACHE.store(region, target_text, filter_type, region_img, result,
+                                                   _cache_options(task))
+                    
+                        found_boxes, confidence_scores, early_match = result
+                    
+                        if found_boxes:
+                            # Verifica se todas as confianças estão abaixo do limiar
+                            if all(score < early_confidence_threshold for score in confidence_scores):
+                                logging.info(f"Todas as confianças para '{target_text}' estão abaixo de {early_confidence_threshold}%. " +
+                                             "Presumindo que o alvo já foi clicado. Avançando para a próxima tarefa.")
+                                location = "skip"  # Sinalização para pular o clique
+                                break
+                            
+                            selected_box_relative = _select_found_box(task, found_boxes, confidence_scores, early_match)
                         
-                        logging.info(f"Texto '{target_text}' encontrado na posição {selected_box_relative} dentro da região {region}")
-                        location = selected_box
-                    else:
-                        logging.warning(f"Texto '{target_text}' não encontrado em toda a região {region}. Tentativa {attempts+1} de {max_attempts}.")
+                            # Converter coordenadas relativas para absolutas
+                            # Isso garante que o clique ocorra na posição correta dentro da região especificada
+                            selected_box = (
+                                region[0] + selected_box_relative[0],
+                                region[1] + selected_box_relative[1],
+                                selected_box_relative[2],
+                                selected_box_relative[3]
+                            )
+                        
+                            logging.info(f"Texto '{target_text}' encontrado na posição {selected_box_relative} dentro da região {region}")
+                            location = selected_box
+                        else:
+                            logging.warning(f"Texto '{target_text}' não encontrado em toda a região {region}. Tentativa {attempts+1} de {max_attempts}.")
                 
-                elif 'image' in task:
-                    image = task.get('image')
-                    confidence = task.get('confidence', default_confidence)
-                    specific = task.get('specific', True)
-                    
-                    if specific:
-                        # Se for específico, busca apenas na região definida
-                        logging.info(f"Buscando {image} na região {region} com confiança {confidence} (tentativa {attempts+1} de {max_attempts})")
-                        location = locate_image_with_retry(image, region=region, confidence=confidence)
                     else:
-                        # Se não for específico, busca na tela inteira
-                        logging.info(f"Buscando {image} em toda a tela com confiança {confidence} (tentativa {attempts+1} de {max_attempts})")
-                        location = locate_image_with_retry(image, confidence=confidence)
-                else:
-                    logging.warning("Task sem chave 'text' ou 'image' definida.")
-                    break
-            except Exception as e:
-                logging.error(f"Erro na tarefa {i+1}, tentativa {attempts+1}: {e}")
+                        image = task.image
+                        confidence = task.confidence
+                    
+                        if task.specific:
+                            # Se for específico, busca apenas na região definida
+                            logging.info(f"Buscando {image} na região {region} com confiança {confidence} (tentativa {attempts+1} de {max_attempts})")
+                            location = locate_image_with_retry(image, region=region, confidence=confidence)
+                        else:
+                            # Se não for específico, busca na tela inteira
+                            logging.info(f"Buscando {image} em toda a tela com confiança {confidence} (tentativa {attempts+1} de {max_attempts})")
+                            location = locate_image_with_retry(image, confidence=confidence,
+                                                               coarse_to_fine=task.coarse_to_fine)
+                except Exception as e:
+                    logging.error(f"Erro na tarefa {i+1}, tentativa {attempts+1}: {e}")
             
-            # Se não encontrou, aguarde um pouco antes da próxima tentativa
-            if not location:
-                time.sleep(max(0.5, attempts * 0.5))  # Aumenta o tempo de espera gradualmente
+                # Se não encontrou, aguarde a região mudar antes da próxima tentativa
+                if not location:
+                    search_region = region if (task.kind == "text" or task.specific) else None
+                    wait_for_screen(task, max(0.5, attempts * 0.5), search_region, until="change")  # Aumenta o tempo de espera gradualmente
                 
-            attempts += 1
+                attempts += 1
         
-        if location:
-            # Tarefa bem-sucedida, avança para a próxima
-            logging.info(f"✓ Tarefa {i+1}/{len(tasks)}: '{task_name}' concluída com sucesso.")
-            i += 1
+            results[i] = location or None
+            if location:
+                # Tarefa bem-sucedida, avança para a próxima
+                logging.info(f"✓ Tarefa {i+1}/{len(tasks)}: '{task_name}' concluída com sucesso.")
+                i += 1
             
-            # Se foi marcado para pular, avança para a próxima tarefa sem clicar
-            if location == "skip":
-                logging.info("Pulando ação de clique para esta tarefa.")
-                continue
+                # Se foi marcado para pular, avança para a próxima tarefa sem clicar
+                if location == "skip":
+                    logging.info("Pulando ação de clique para esta tarefa.")
+                    continue
                 
-            # Inicia o overlay em uma thread separada
-            overlay_thread = threading.Thread(target=show_overlay, args=(location, 1000))
-            overlay_thread.start()
-            
-            # Pequeno delay para garantir que o overlay seja exibido antes do clique
-            time.sleep(0.2)
+                # Destaca o alvo no overlay (não bloqueia a automação)
+                show_overlay(location, 1000)
             
-            # Calcula o ponto de clique (centro do elemento)
-            click_point = pyautogui.center(location)
+                # Calcula o ponto de clique (centro do elemento)
+                click_point = input_channel.center(location)
             
-            # Movimento suave do mouse para reduzir erros de clique
-            pyautogui.moveTo(click_point.x, click_point.y, duration=0.1)
-
-            # Pequena pausa para garantir que o movimento foi registrado antes do clique
-            time.sleep(1)
-
-            # Verifica qual botão do mouse usar para o clique
-            mouse_button = task.get('mouse_button', 'left').lower()
-            if mouse_button == 'right':
-                pyautogui.rightClick()
-                logging.info(f"Clique com botão direito realizado na posição {click_point}. Aguardando {delay} segundos.")
-            elif mouse_button == 'double' or mouse_button == 'double left':
-                pyautogui.doubleClick()
-                logging.info(f"Clique duplo com botão esquerdo realizado na posição {click_point}. Aguardando {delay} segundos.")
-            else:
-                pyautogui.click()
-                logging.info(f"Clique com botão esquerdo realizado na posição {click_point}. Aguardando {delay} segundos.")
+                # Movimento suave do mouse para reduzir erros de clique
+                with tracing.span("input", action="move"):
+                    INPUT.move_to(click_point.x, click_point.y, duration=0.1)
+
+                # Pequena pausa para garantir que o movimento foi registrado antes do clique
+                # (encerrada assim que a área ao redor do alvo para de mudar)
+                x, y, w, h = location
+                wait_for_screen(task, 1.0, (x - 20, y - 20, w + 40, h + 40))
+
+                # Verifica qual botão do mouse usar para o clique
+                mouse_button = task.mouse_button
+                with tracing.span("input", action="click", button=mouse_button):
+                    if mouse_button == 'right':
+                        INPUT.click('right')
+                        logging.info(f"Clique com botão direito realizado na posição {click_point}. Aguardando {delay} segundos.")
+                    elif mouse_button == 'double' or mouse_button == 'double left':
+                        INPUT.double_click()
+                        logging.info(f"Clique duplo com botão esquerdo realizado na posição {click_point}. Aguardando {delay} segundos.")
+                    else:
+                        INPUT.click()
+                        logging.info(f"Clique com botão esquerdo realizado na posição {click_point}. Aguardando {delay} segundos.")
             
-            # Verifica se a tarefa tem o campo 'sendtext' e digita o texto após o clique
-            if 'sendtext' in task and task['sendtext']:
-                full_text_command = task['sendtext']
-                logging.info(f"Processando sendtext: '{full_text_command}'")
-
-                # Processa comandos especiais no início da string
-                text_to_write = full_text_command
-                commands_processed = True
-                while commands_processed:
-                    commands_processed = False
-                    # Padroniza para minúsculas para facilitar a correspondência
-                    lower_text = text_to_write.lower() 
-                    
-                    if lower_text.startswith('{ctrl}a'):
-                        logging.info("Executando comando: CTRL+A (Selecionar Tudo)")
-                        pyautogui.hotkey('ctrl', 'a')
-                        # Remove o comando original, preservando o caso do restante
-                        text_to_write = text_to_write[len('{ctrl}a'):]
-                        commands_processed = True
-                        time.sleep(0.1) # Pequena pausa
-                    elif lower_text.startswith('{del}'):
-                        logging.info("Executando comando: DEL (Deletar)")
-                        pyautogui.press('delete')
-                        text_to_write = text_to_write[len('{del}'):]
-                        commands_processed = True
-                        time.sleep(0.1) # Pequena pausa
-                    elif lower_text.startswith('{tab}'):
-                        logging.info("Executando comando: TAB")
-                        pyautogui.press('tab')
-                        text_to_write = text_to_write[len('{tab}'):]
-                        commands_processed = True
-                        time.sleep(0.1)
-                    elif lower_text.startswith('{enter}'):
-                        logging.info("Executando comando: ENTER")
-                        pyautogui.press('enter')
-                        text_to_write = text_to_write[len('{enter}'):]
-                        commands_processed = True
-                        time.sleep(0.1)
-                    # Adicionar mais comandos aqui se necessário (ex: {F1}, {ESC})
-
-
-                # Digita o texto restante
-                if text_to_write:
-                    logging.info(f"Colando texto restante: '{text_to_write}'")
-                    # Copia para o clipboard
-                    pyperclip.copy(text_to_write) 
-                    # Simula Ctrl+V para colar
-                    pyautogui.hotkey('ctrl', 'v') 
+                # Verifica se a tarefa tem o campo 'sendtext' e digita o texto após o clique
+                if task.sendtext:
+                    logging.info(f"Processando sendtext: '{task.sendtext}'")
+
+                    # Comandos especiais ({ctrl}a, {del}, {tab}, {enter}) do início do texto,
+                    # já separados na compilação do plano
+                    with tracing.span("input", action="commands"):
+                        for label, method, args in task.keys:
+                            logging.info(f"Executando comando: {label}")
+                            getattr(INPUT, method)(*args)
+                            clock.sleep(0.1) # Pequena pausa
+
+                    # Digita o texto restante
+                    if task.paste_text:
+                        logging.info(f"Colando texto restante: '{task.paste_text}'")
+                        # Copia para o clipboard e simula Ctrl+V para colar
+                        with tracing.span("input", action="paste", chars=len(task.paste_text)):
+                            INPUT.paste(task.paste_text)
                 
-                time.sleep(0.5)  # Pequena pausa após processar sendtext
+                    wait_for_screen(task, 0.5)  # Pequena pausa após processar sendtext
             
-            # Aguarda o overlay finalizar, se necessário
-            overlay_thread.join()
-            time.sleep(delay)
-        else:
-            # Tarefa falhou após todas as tentativas
-            backtrack = task.get('backtrack', False)
+                # Enquanto aguarda o delay, adianta o OCR da próxima tarefa de texto
+                if LOOKAHEAD_OCR and i < len(tasks) and _can_prefetch(tasks[i]):
+                    lookahead = _Lookahead(lookahead_executor, i, tasks[i], delay)
             
-            # Se a tarefa tiver backtrack=True e não for a primeira tarefa
-            if backtrack and i > 0:
-                # Verifica se já tentamos muitas vezes este backtrack para evitar loops infinitos
-                task_failures.setdefault(i, 0)
-                task_failures[i] += 1
+                wait_for_screen(task, delay)
+            else:
+                # Tarefa falhou após todas as tentativas
+                backtrack = task.backtrack
+            
+                # Se a tarefa tiver backtrack=True e não for a primeira tarefa
+                if backtrack and i > 0:
+                    # Verifica se já tentamos muitas vezes este backtrack para evitar loops infinitos
+                    task_failures.setdefault(i, 0)
+                    task_failures[i] += 1
                 
-                if task_failures[i] <= 2:  # Limita a 2 tentativas de backtracking por tarefa
-                    # Volta para o passo anterior independentemente do valor de backtrack desse passo
-                    prev_task_name = tasks[i-1].get('text', tasks[i-1].get('image', f"Tarefa {i}"))
-                    logging.info(f"✗ Tarefa {i+1}/{len(tasks)}: '{task_name}' falhou. BACKTRACKING para tarefa {i}/{len(tasks)}: '{prev_task_name}'")
-                    i -= 1  # Volta para a tarefa anterior
+                    if task_failures[i] <= 2:  # Limita a 2 tentativas de backtracking por tarefa
+                        # Volta para o passo anterior independentemente do valor de backtrack desse passo
+                        prev_task_name = tasks[i-1].name
+                        logging.info(f"✗ Tarefa {i+1}/{len(tasks)}: '{task_name}' falhou. BACKTRACKING para tarefa {i}/{len(tasks)}: '{prev_task_name}'")
+                        i -= 1  # Volta para a tarefa anterior
+                    else:
+                        # Se já tentamos backtracking muitas vezes, avança
+                        logging.info(f"✗ Tarefa {i+1}/{len(tasks)}: '{task_name}' falhou após múltiplas tentativas de backtracking. Avançando para a próxima tarefa.")
+                        i += 1
                 else:
-                    # Se já tentamos backtracking muitas vezes, avança
-                    logging.info(f"✗ Tarefa {i+1}/{len(tasks)}: '{task_name}' falhou após múltiplas tentativas de backtracking. Avançando para a próxima tarefa.")
+                    # Se não tem backtrack ou é a primeira tarefa, avança
+                    if backtrack:
+                        logging.info(f"✗ Tarefa {i+1}/{len(tasks)}: '{task_name}' falhou mas é a primeira tarefa (não é possível fazer backtracking). Avançando.")
+                    else:
+                        logging.info(f"✗ Tarefa {i+1}/{len(tasks)}: '{task_name}' falhou e tem 'backtrack': False. Avançando para a próxima tarefa.")
                     i += 1
+    finally:
+        lookahead_executor.shutdown(wait=False, cancel_futures=True)
+        tracing.set_context(task=None, task_name=None, attempt=None)
+    return results
+
+def finish_run():
+    """
+    Encerra uma execução (uma ou mais chamadas ao click_images): registra o
+    resumo do rastreamento e do cache de OCR, grava o rastreamento e salva o
+    cache de OCR e o histórico de acertos em disco.
+    """
+    tracing.get_tracer().log_summary()
+    tracing.get_tracer().flush()
+    cache_stats = OCR_RESULT_CACHE.stats()
+    logging.info(f"Cache de OCR: {cache_stats['hits']} acerto(s), {cache_stats['misses']} falha(s) "
+                 f"({cache_stats['hit_rate']:.0%} de aproveitamento).")
+    if OCR_RESULT_CACHE.path:
+        OCR_RESULT_CACHE.save()
+    ocr_stats.get_stats().save()
+
+def run_task_file(path):
+    """
+    Executa um arquivo de tarefas declarativo (JSON ou YAML) como grafo de
+    dependências; ver task_graph.py. Retorna as saídas nomeadas dos passos.
+    """
+    graph = task_graph.load_task_graph(path)
+    # Todos os passos são validados aqui para que uma tarefa inválida não
+    # interrompa o grafo no meio: passos "read" só leem uma região, os demais
+    # são tarefas do click_images
+    screen, errors = screen_bounds(), []
+    for step in graph.steps:
+        try:
+            if step.action == "read":
+                task_plan.check_read_task(step.task, step.index, screen)
             else:
-                # Se não tem backtrack ou é a primeira tarefa, avança
-                if backtrack:
-                    logging.info(f"✗ Tarefa {i+1}/{len(tasks)}: '{task_name}' falhou mas é a primeira tarefa (não é possível fazer backtracking). Avançando.")
-                else:
-                    logging.info(f"✗ Tarefa {i+1}/{len(tasks)}: '{task_name}' falhou e tem 'backtrack': False. Avançando para a próxima tarefa.")
-                i += 1
+                task_plan.compile_task(step.task, step.index, screen)
+        except task_plan.TaskPlanError as e:
+            errors.extend(e.errors)
+    if errors:
+        raise task_plan.TaskPlanError(errors)
+    logging.info(f"Grafo de tarefas {path} compilado com {len(graph.steps)} passo(s).")
+    runner = task_graph.TaskGraphRunner(
+        graph,
+        click=click_images,
+        locate=locate_task_target,
+        read_text=read_region_text,
+        capture=lambda region: FRAME_GRABBER.region(region, max_age=0),
+    )
+    try:
+        return runner.run()
+    finally:
+        finish_run()
 
 # Execute apenas se o script for executado diretamente (não na importação)
 if __name__ == '__main__':
     # Import tasks from a.py (assuming a.py is in the same directory or Python path)
     # Check if tasks is a list and not empty
-    if isinstance(tasks, list) and tasks:
+    # Carrega as imagens de referência uma única vez antes de iniciar as tarefas
+    template_assets.get_store().preload(template_assets.default_images_folder())
+    
+    # Um arquivo de tarefas na linha de comando substitui as tarefas do planresult_tasks
+    if len(sys.argv) > 1:
+        outputs = run_task_file(sys.argv[1])
+        logging.info(f"Saídas: {outputs}")
+    elif isinstance(tasks, list) and tasks:
         # Check if the first element is also a list (indicating a list of lists)
         if isinstance(tasks[0], list):
             logging.info(f"Detected multiple task lists ({len(tasks)} lists). Executing sequentially.")
+            # Compila todas as listas antes do primeiro clique: uma lista inválida
+            # não pode interromper a execução depois que as anteriores já clicaram
+            plans, errors = {}, []
+            for i, task_list in enumerate(tasks):
+                if isinstance(task_list, list):
+                    try:
+                        plans[i] = compile_plan(task_list)
+                    except task_plan.TaskPlanError as e:
+                        errors.extend(f"Lista {i+1}: {error}" for error in e.errors)
+            if errors:
+                raise task_plan.TaskPlanError(errors)
             # Iterate through each list of tasks
             for i, task_list in enumerate(tasks):
                 if isinstance(task_list, list):
                     logging.info(f"--- Starting task list {i+1}/{len(tasks)} ({len(task_list)} tasks) ---")
-                    click_images(task_list) # Pass the individual list to the function
+                    click_images(plans[i]) # Pass the compiled list to the function
                     logging.info(f"--- Finished task list {i+1}/{len(tasks)} ---")
                 else:
                     logging.warning(f"Item {i} in the main list is not a list of tasks. Skipping.")
@@ -671,6 +1121,7 @@ if __name__ == '__main__':
             # Assume it's a single flat list of tasks
             logging.info("Detected a single task list. Executing.")
             click_images(tasks)
+        finish_run()
     elif isinstance(tasks, list) and not tasks:
         logging.info("The imported 'tasks' list is empty. Nothing to execute.")
     else:
@@ -0,0 +1,185 @@
+import time
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+# Quantos navegadores ficam aquecidos e quantos trabalhos cada um atende
+# antes de ser substituído por um novo
+DEFAULT_POOL_SIZE = 2
+DEFAULT_MAX_JOBS = 20
+# Tempo máximo (s) esperando um navegador livre
+ACQUIRE_TIMEOUT = 300
+# Tentativas de iniciar um navegador e espera (s) antes da primeira repetição,
+# dobrada a cada falha
+LAUNCH_ATTEMPTS = 3
+LAUNCH_BACKOFF = 2.0
+
+
+class BrowserSession:
+    """Navegador aberto do pool e quantos trabalhos ele já atendeu."""
+
+    def __init__(self, webbot):
+        self.webbot = webbot
+        self.jobs = 0
+
+
+class LaunchFailure:
+    """Marca na fila de livres de um navegador que não pôde ser iniciado."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+class BrowserPool:
+    """
+    Pool de navegadores já iniciados e configurados. factory(headless) cria e
+    inicia um WebBot (ex.: create_edge_bot em main.py); o pool mantém size
+    deles aquecidos e os entrega um por trabalho com session().
+
+    Entre usos o navegador volta ao estado limpo (uma aba, sem cookies,
+    cache nem storage de nenhuma origem visitada, em about:blank); navegadores
+    sem CDP, como o IE, não podem ser limpos por completo e são substituídos
+    a cada trabalho. Após max_jobs trabalhos, ou se o trabalho lançar uma
+    exceção, o navegador é fechado e um novo é iniciado em segundo plano,
+    então nenhum navegador vaza quando o fluxo falha.
+
+    Um navegador que não inicia após LAUNCH_ATTEMPTS tentativas faz o próximo
+    session() falhar na hora com o erro da factory, em vez de esperar o
+    ACQUIRE_TIMEOUT; uma nova tentativa de iniciar é feita em seguida.
+    """
+
+    def __init__(self, factory, size=DEFAULT_POOL_SIZE, max_jobs=DEFAULT_MAX_JOBS, headless=False):
+        self.factory = factory
+        self.size = size
+        self.max_jobs = max_jobs
+        self.headless = headless
+        self._idle = queue.Queue()
+        self._sessions = set()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def start(self):
+        """Inicia os navegadores do pool em paralelo, sem esperar que fiquem prontos."""
+        for _ in range(self.size):
+            self._launch_async()
+        return self
+
+    def _launch(self):
+        delay = LAUNCH_BACKOFF
+        for attempt in range(1, LAUNCH_ATTEMPTS + 1):
+            try:
+                session = BrowserSession(self.factory(self.headless))
+                break
+            except Exception as e:
+                logging.error(f"Falha ao iniciar navegador do pool (tentativa {attempt}/{LAUNCH_ATTEMPTS}): {e}")
+                if attempt == LAUNCH_ATTEMPTS or self._closed:
+                    if not self._closed:
+                        self._idle.put(LaunchFailure(e))
+                    return
+                time.sleep(delay)
+                delay *= 2
+        with self._lock:
+            if self._closed:
+                self._stop(session)
+                return
+            self._sessions.add(session)
+        self._idle.put(session)
+
+    def _launch_async(self):
+        threading.Thread(target=self._launch, name="browser-pool-launch", daemon=True).start()
+
+    @staticmethod
+    def _stop(session):
+        try:
+            session.webbot.stop_browser()
+        except Exception as e:
+            logging.debug(f"Erro ao fechar navegador: {e}")
+
+    def _recycle(self, session):
+        with self._lock:
+            self._sessions.discard(session)
+            closed = self._closed
+        self._stop(session)
+        if not closed:
+            self._launch_async()
+
+    @staticmethod
+    def _visited_origins(driver):
+        """Origens do histórico de navegação da aba atual (via CDP)."""
+        history = driver.execute_cdp_cmd("Page.getNavigationHistory", {})
+        origins = set()
+        for entry in history.get("entries", ()):
+            parts = urlsplit(entry.get("url", ""))
+            if parts.scheme in ("http", "https") and parts.netloc:
+                origins.add(f"{parts.scheme}://{parts.netloc}")
+        return origins
+
+    @classmethod
+    def reset(cls, webbot):
+        """
+        Fecha as abas extras e limpa cookies, cache e storage de todas as
+        origens visitadas pelas abas, via CDP. Retorna False, sem alterar o
+        navegador, quando ele não tem CDP (ex.: IE) e precisa ser substituído.
+        """
+        driver = webbot.driver
+        if not hasattr(driver, "execute_cdp_cmd"):
+            return False
+        handles = driver.window_handles
+        origins = set()
+        for handle in handles:
+            driver.switch_to.window(handle)
+            origins |= cls._visited_origins(driver)
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+        for origin in origins:
+            driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+        driver.get("about:blank")
+        return True
+
+    @contextmanager
+    def session(self, timeout=ACQUIRE_TIMEOUT):
+        """Entrega um WebBot aquecido para um trabalho e o devolve ao pool no final."""
+        try:
+            session = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"Nenhum navegador livre no pool após {timeout}s") from None
+        if isinstance(session, LaunchFailure):
+            self._launch_async()
+            raise RuntimeError(f"Não foi possível iniciar um navegador do pool: {session.error}") from session.error
+        try:
+            yield session.webbot
+        except BaseException:
+            logging.warning("Trabalho falhou; substituindo o navegador usado.")
+            self._recycle(session)
+            raise
+
+        session.jobs += 1
+        if session.jobs >= self.max_jobs:
+            logging.info(f"Navegador atingiu {session.jobs} trabalho(s); substituindo.")
+            self._recycle(session)
+            return
+        try:
+            clean = self.reset(session.webbot)
+        except Exception as e:
+            logging.warning(f"Falha ao limpar o navegador ({e}); substituindo.")
+            self._recycle(session)
+            return
+        if not clean:
+            logging.debug("Navegador sem CDP não pode ser limpo; substituindo.")
+            self._recycle(session)
+            return
+        self._idle.put(session)
+
+    def close(self):
+        """Fecha todos os navegadores do pool."""
+        with self._lock:
+            self._closed = True
+            sessions, self._sessions = list(self._sessions), set()
+        for session in sessions:
+            self._stop(session)
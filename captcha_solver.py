@@ -0,0 +1,112 @@
+import re
+import time
+import logging
+import threading
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import cv2
+
+import ocr_engine
+
+# Caracteres aceitos nos captchas (o site usa letras minúsculas e dígitos)
+CAPTCHA_WHITELIST = "abcdefghijklmnopqrstuvwxyz0123456789"
+# Configurações específicas para captcha: uma linha / uma palavra, com lista
+# de caracteres permitidos
+CAPTCHA_CONFIGS = (
+    f"--oem 3 --psm 7 -c tessedit_char_whitelist={CAPTCHA_WHITELIST}",
+    f"--oem 3 --psm 8 -c tessedit_char_whitelist={CAPTCHA_WHITELIST}",
+)
+# Fator de ampliação antes do OCR (captchas costumam ter poucos pixels de altura)
+UPSCALE = 3
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]")
+
+# Texto escolhido, votos que recebeu, total de candidatos válidos e tempo gasto
+CaptchaResult = namedtuple("CaptchaResult", "text votes candidates seconds")
+
+
+def decode_png(png_bytes):
+    """Decodifica os bytes PNG (ex.: element.screenshot_as_png) em escala de cinza, sem disco."""
+    img = cv2.imdecode(np.frombuffer(png_bytes, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        raise ValueError("Imagem do captcha inválida")
+    return img
+
+
+def captcha_variants(gray):
+    """Pré-processamentos para captcha: ampliação, Otsu (normal e invertido), mediana e adaptativo."""
+    big = cv2.resize(gray, None, fx=UPSCALE, fy=UPSCALE, interpolation=cv2.INTER_CUBIC)
+    _, otsu = cv2.threshold(big, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    denoised = cv2.medianBlur(big, 3)
+    _, denoised_otsu = cv2.threshold(denoised, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    adaptive = cv2.adaptiveThreshold(denoised, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10)
+    return {
+        "gray": big,
+        "otsu": otsu,
+        "otsu_inv": cv2.bitwise_not(otsu),
+        "median_otsu": denoised_otsu,
+        "adaptive": adaptive,
+    }
+
+
+def normalize(text):
+    """Mesma normalização do fluxo antigo (minúsculas, sem espaços), sem outros símbolos."""
+    return _NON_ALNUM.sub("", (text or "").lower())
+
+
+class CaptchaSolver:
+    """
+    Resolve captchas em memória: cada combinação (pré-processamento,
+    configuração) é lida em paralelo no pool de OCR já aquecido e o texto
+    mais votado é o escolhido. report() registra se o site aceitou a
+    resposta, para acompanhar a taxa de acerto e o tempo por captcha.
+    """
+
+    def __init__(self, configs=CAPTCHA_CONFIGS, length=None, engine=None):
+        self.configs = tuple(configs)
+        self.length = length
+        self.engine = engine
+        self.attempts = 0
+        self.solved = 0
+        self.total_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def _read(self, engine, img, config):
+        try:
+            return normalize(engine.image_to_string(img, config=config))
+        except Exception as e:
+            logging.debug(f"Erro no OCR do captcha: {e}")
+            return ""
+
+    def solve(self, png_bytes):
+        """Retorna o CaptchaResult com o candidato mais votado (texto vazio se nenhum)."""
+        started = time.monotonic()
+        engine = self.engine or ocr_engine.get_engine()
+        variants = captcha_variants(decode_png(png_bytes))
+        jobs = [(img, config) for img in variants.values() for config in self.configs]
+
+        with ThreadPoolExecutor(max_workers=min(len(jobs), engine.workers)) as executor:
+            texts = list(executor.map(lambda job: self._read(engine, *job), jobs))
+
+        candidates = [t for t in texts if t and (self.length is None or len(t) == self.length)]
+        votes = Counter(candidates)
+        # Em caso de empate vale o candidato que apareceu primeiro (variações mais simples)
+        text, count = max(votes.items(), key=lambda item: (item[1], -candidates.index(item[0])),
+                          default=("", 0))
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self.attempts += 1
+            self.total_seconds += elapsed
+        logging.info(f"Captcha lido como '{text}' ({count}/{len(candidates)} votos) em {elapsed:.2f}s")
+        return CaptchaResult(text, count, len(candidates), elapsed)
+
+    def report(self, accepted):
+        """Registra se a última resposta foi aceita e mostra a taxa de acerto no log."""
+        with self._lock:
+            self.solved += bool(accepted)
+            rate = self.solved / self.attempts if self.attempts else 0.0
+            mean = self.total_seconds / self.attempts if self.attempts else 0.0
+        logging.info(f"Captcha {'aceito' if accepted else 'recusado'}. Taxa de acerto: {self.solved}/{self.attempts} "
+                     f"({rate:.0%}), {mean:.2f}s por captcha.")
@@ -0,0 +1,67 @@
+import time
+import threading
+
+
+class SystemClock:
+    """Relógio real: time.monotonic() e time.sleep()."""
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(max(0.0, seconds))
+
+
+class VirtualClock:
+    """
+    Relógio da reprodução sem display: o tempo de processamento (OCR, busca
+    de imagens) passa normalmente, mas as pausas não esperam de verdade, só
+    avançam o relógio. Assim uma execução gravada é reproduzida muito mais
+    rápido que o tempo real, e monotonic() ainda mede o tempo que ela levaria.
+    Pausas feitas ao mesmo tempo por várias threads somam-se no relógio.
+    """
+
+    def __init__(self):
+        self._origin = time.monotonic()
+        self._skipped = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def skipped(self):
+        """Total de segundos de pausa pulados até agora."""
+        with self._lock:
+            return self._skipped
+
+    def monotonic(self):
+        with self._lock:
+            return time.monotonic() + self._skipped
+
+    def sleep(self, seconds):
+        with self._lock:
+            self._skipped += max(0.0, seconds)
+
+    def real_elapsed(self):
+        """Tempo real decorrido desde a criação do relógio."""
+        return time.monotonic() - self._origin
+
+
+_clock = SystemClock()
+
+
+def get_clock():
+    return _clock
+
+
+def set_clock(new_clock):
+    """Troca o relógio do processo (ex.: VirtualClock na reprodução). Retorna o anterior."""
+    global _clock
+    previous, _clock = _clock, new_clock
+    return previous
+
+
+def monotonic():
+    return _clock.monotonic()
+
+
+def sleep(seconds):
+    _clock.sleep(seconds)
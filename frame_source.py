@@ -0,0 +1,297 @@
+import os
+import time
+import logging
+import threading
+from collections import namedtuple
+
+import numpy as np
+import cv2
+
+import clock
+import overlay
+import tracing
+
+# Quadro capturado: pixels RGB (somente leitura), posição do canto superior
+# esquerdo em coordenadas de tela, instante da captura e número sequencial
+Frame = namedtuple("Frame", "pixels origin timestamp seq")
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+class FrameSource:
+    """
+    Interface das fontes de quadros. grab() retorna uma tupla (pixels, origem)
+    com um array RGB uint8 (altura, largura, 3) e a posição (x, y) do quadro
+    na tela.
+    """
+
+    # A fonte sabe capturar só uma região (grab_region)
+    partial = False
+
+    def grab(self):
+        raise NotImplementedError
+
+    def grab_region(self, region):
+        """
+        Captura só a região (x, y, largura, altura), em coordenadas de tela.
+        Retorna (pixels, origem), ou None quando não for possível (o
+        FrameGrabber então recorta um quadro inteiro).
+        """
+        return None
+
+    def close(self):
+        pass
+
+
+class ScreenFrameSource(FrameSource):
+    """
+    Captura a tela real. Usa o mss quando instalado (captura direta para um
+    buffer, sem passar por imagem PIL) e o pyautogui caso contrário. O mss
+    não pode ser compartilhado entre threads, então cada thread tem o seu.
+    Com o mss o quadro cobre a área de trabalho virtual (todos os monitores),
+    com origem no canto superior esquerdo dela, que pode ser negativo quando
+    há monitores à esquerda ou acima do principal.
+    """
+
+    partial = True
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _mss(self):
+        if not hasattr(self._local, "mss"):
+            try:
+                import mss
+                self._local.mss = mss.mss()
+            except Exception:
+                self._local.mss = None
+        return self._local.mss
+
+    def grab(self):
+        sct = self._mss()
+        if sct is not None:
+            monitor = sct.monitors[0]  # Área de trabalho virtual inteira
+            with overlay.hidden_for_capture():
+                shot = sct.grab(monitor)
+            pixels = cv2.cvtColor(np.asarray(shot), cv2.COLOR_BGRA2RGB)
+            return pixels, (monitor["left"], monitor["top"])
+
+        import pyautogui
+        with overlay.hidden_for_capture():
+            screenshot = pyautogui.screenshot()
+        return np.asarray(screenshot.convert("RGB")), (0, 0)
+
+    def grab_region(self, region):
+        sct = self._mss()
+        if sct is None:
+            return None
+        desktop = sct.monitors[0]
+        x, y, w, h = region
+        left, top = max(x, desktop["left"]), max(y, desktop["top"])
+        right = min(x + w, desktop["left"] + desktop["width"])
+        bottom = min(y + h, desktop["top"] + desktop["height"])
+        if right <= left or bottom <= top:
+            return None
+        with overlay.hidden_for_capture():
+            shot = sct.grab({"left": left, "top": top, "width": right - left, "height": bottom - top})
+        return cv2.cvtColor(np.asarray(shot), cv2.COLOR_BGRA2RGB), (left, top)
+
+    def close(self):
+        sct = getattr(self._local, "mss", None)
+        if sct is not None:
+            sct.close()
+
+
+class DirectoryFrameSource(FrameSource):
+    """
+    Reproduz quadros gravados em uma pasta (arquivos de imagem em ordem
+    alfabética). Cada grab() avança para o próximo quadro; ao final, repete
+    o último (ou volta ao início com loop=True). Permite executar a
+    detecção sem display, por exemplo em testes no Linux.
+    """
+
+    def __init__(self, folder, loop=False, origin=(0, 0)):
+        self.paths = [os.path.join(folder, name) for name in sorted(os.listdir(folder))
+                      if name.lower().endswith(IMAGE_EXTENSIONS)]
+        if not self.paths:
+            raise ValueError(f"Nenhum quadro encontrado em {folder}")
+        self.loop = loop
+        self.origin = tuple(origin)
+        self.position = 0
+        # A thread do OCR antecipado e a principal capturam ao mesmo tempo
+        self._lock = threading.Lock()
+
+    def grab(self):
+        with self._lock:
+            # Arquivos que não podem ser lidos são descartados com um aviso
+            while self.paths:
+                path = self.paths[self.position]
+                bgr = cv2.imread(path, cv2.IMREAD_COLOR)
+                if bgr is None:
+                    logging.warning(f"Quadro ilegível ignorado: {path}")
+                    del self.paths[self.position]
+                    if self.position >= len(self.paths):
+                        self.position = 0 if self.loop else max(0, len(self.paths) - 1)
+                    continue
+                if self.position + 1 < len(self.paths):
+                    self.position += 1
+                elif self.loop:
+                    self.position = 0
+                return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB), self.origin
+        raise ValueError("Nenhum quadro legível restante na pasta de quadros")
+
+
+class ArrayFrameSource(FrameSource):
+    """
+    Entrega sempre o mesmo quadro em memória (array RGB), trocado com set().
+    Usado no benchmark offline para avaliar capturas já carregadas.
+    """
+
+    def __init__(self, pixels=None, origin=(0, 0)):
+        self.pixels = pixels
+        self.origin = tuple(origin)
+
+    def set(self, pixels, origin=(0, 0)):
+        self.pixels = pixels
+        self.origin = tuple(origin)
+
+    def grab(self):
+        if self.pixels is None:
+            raise ValueError("Nenhum quadro definido")
+        return self.pixels, self.origin
+
+
+def default_source():
+    """
+    Fonte de quadros padrão: a pasta indicada em RPA_FRAME_SOURCE, quando
+    definida, ou a tela real.
+    """
+    folder = os.environ.get("RPA_FRAME_SOURCE")
+    if folder:
+        logging.info(f"Usando quadros gravados de {folder} como fonte de captura")
+        return DirectoryFrameSource(folder)
+    return ScreenFrameSource()
+
+
+def crop(frame, region):
+    """
+    Recorte (sem cópia) de uma região (x, y, largura, altura) em coordenadas
+    de tela, limitado às bordas do quadro. Retorna (pixels, origem do recorte).
+    """
+    ox, oy = frame.origin
+    if region is None:
+        return frame.pixels, (ox, oy)
+    x, y, w, h = region
+    height, width = frame.pixels.shape[:2]
+    left = min(max(0, x - ox), width)
+    top = min(max(0, y - oy), height)
+    right = min(max(0, x - ox + w), width)
+    bottom = min(max(0, y - oy + h), height)
+    return frame.pixels[top:bottom, left:right], (ox + left, oy + top)
+
+
+class FrameGrabber:
+    """
+    Serviço de captura compartilhado. Mantém o último quadro da tela e
+    entrega recortes dele (views NumPy, sem cópia) para OCR, busca de
+    imagens e capturas de região.
+
+    Modos de uso:
+      - sob demanda: frame()/region() capturam um novo quadro quando o atual
+        é mais antigo que max_age segundos (max_age=0 captura sempre);
+      - contínuo: start(fps) mantém o quadro atualizado em uma thread.
+
+    Os quadros são somente leitura e nunca são sobrescritos: um recorte
+    entregue continua válido mesmo após novas capturas.
+    """
+
+    def __init__(self, source=None, max_age=0.0):
+        self.source = source or default_source()
+        self.max_age = max_age
+        self._frame = None
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _read_only(pixels):
+        # View própria: a fonte pode continuar escrevendo no array original
+        pixels = np.ascontiguousarray(pixels).view()
+        pixels.flags.writeable = False
+        return pixels
+
+    def grab(self):
+        """Captura um novo quadro e o torna o quadro atual."""
+        with tracing.span("capture"):
+            pixels, origin = self.source.grab()
+            pixels = self._read_only(pixels)
+        with self._lock:
+            self._seq += 1
+            self._frame = Frame(pixels, tuple(origin), clock.monotonic(), self._seq)
+            return self._frame
+
+    def _fresh(self, max_age):
+        """Quadro atual se não for mais antigo que max_age, ou None."""
+        max_age = self.max_age if max_age is None else max_age
+        with self._lock:
+            current = self._frame
+        if current is None or clock.monotonic() - current.timestamp > max_age:
+            return None
+        return current
+
+    def frame(self, max_age=None):
+        """Quadro atual, capturando outro se for mais antigo que max_age."""
+        return self._fresh(max_age) or self.grab()
+
+    def capture(self, region=None, max_age=None):
+        """
+        Recorte (view sem cópia) da região (x, y, largura, altura) do quadro
+        atual, ou o quadro inteiro se region for None. Retorna (pixels, origem).
+        Sem quadro recente, captura só a região quando a fonte permite, em vez
+        da tela inteira; essa captura parcial não substitui o quadro atual.
+        """
+        current = self._fresh(max_age)
+        if current is not None:
+            return crop(current, region)
+        if region is not None and self.source.partial:
+            with tracing.span("capture", partial=True):
+                part = self.source.grab_region(region)
+            if part is not None:
+                return self._read_only(part[0]), tuple(part[1])
+        return crop(self.grab(), region)
+
+    def region(self, region, max_age=None):
+        """Pixels da região (x, y, largura, altura) do quadro atual, sem cópia."""
+        return self.capture(region, max_age)[0]
+
+    def start(self, fps=10.0):
+        """Inicia a captura contínua em segundo plano."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        interval = 1.0 / fps
+        # Com captura contínua o quadro atual sempre serve
+        self.max_age = max(self.max_age, 2 * interval)
+
+        def run():
+            while not self._stop.is_set():
+                started = time.monotonic()
+                try:
+                    self.grab()
+                except Exception as e:
+                    logging.debug(f"Erro na captura contínua: {e}")
+                self._stop.wait(max(0.0, interval - (time.monotonic() - started)))
+
+        self._thread = threading.Thread(target=run, name="frame-grabber", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        self.source.close()
@@ -0,0 +1,134 @@
+import os
+import shutil
+import logging
+import subprocess
+from collections import namedtuple
+
+# Mesmo formato do pyautogui.center
+Point = namedtuple("Point", "x y")
+
+
+def center(box):
+    """Centro de uma caixa (x, y, largura, altura)."""
+    x, y, w, h = box
+    return Point(int(x + w / 2), int(y + h / 2))
+
+
+class InputChannel:
+    """
+    Interface dos canais de entrada (mouse e teclado) usados pelas tarefas.
+    Cada sessão de automação usa o seu canal, ligado ao desktop dela.
+    """
+
+    def move_to(self, x, y, duration=0.0):
+        raise NotImplementedError
+
+    def click(self, button="left"):
+        raise NotImplementedError
+
+    def double_click(self):
+        raise NotImplementedError
+
+    def hotkey(self, *keys):
+        raise NotImplementedError
+
+    def press(self, key):
+        raise NotImplementedError
+
+    def paste(self, text):
+        """Cola o texto pela área de transferência (Ctrl+V)."""
+        raise NotImplementedError
+
+
+class PyAutoGuiInputChannel(InputChannel):
+    """Entrada no desktop atual com pyautogui e pyperclip (comportamento padrão)."""
+
+    def __init__(self):
+        import pyautogui
+        import pyperclip
+        self._gui = pyautogui
+        self._clipboard = pyperclip
+
+    def move_to(self, x, y, duration=0.0):
+        self._gui.moveTo(x, y, duration=duration)
+
+    def click(self, button="left"):
+        if button == "right":
+            self._gui.rightClick()
+        else:
+            self._gui.click()
+
+    def double_click(self):
+        self._gui.doubleClick()
+
+    def hotkey(self, *keys):
+        self._gui.hotkey(*keys)
+
+    def press(self, key):
+        self._gui.press(key)
+
+    def paste(self, text):
+        self._clipboard.copy(text)
+        self._gui.hotkey('ctrl', 'v')
+
+
+class XdotoolInputChannel(InputChannel):
+    """
+    Entrada em um display X específico (ex.: uma sessão Xvfb) com xdotool,
+    sem depender da variável DISPLAY do processo. A colagem usa o xclip
+    quando instalado e digita o texto com o xdotool caso contrário.
+    """
+
+    _KEYS = {"ctrl": "ctrl", "delete": "Delete", "tab": "Tab", "enter": "Return", "esc": "Escape"}
+    _BUTTONS = {"left": "1", "middle": "2", "right": "3"}
+
+    def __init__(self, display):
+        if shutil.which("xdotool") is None:
+            raise RuntimeError("xdotool não encontrado; necessário para a entrada em sessões Xvfb")
+        self.display = display
+        self._env = dict(os.environ, DISPLAY=display)
+        self._xclip = shutil.which("xclip")
+
+    def _run(self, *args, stdin=None):
+        subprocess.run(args, env=self._env, input=stdin, check=True, timeout=10)
+
+    def _key(self, key):
+        return self._KEYS.get(key.lower(), key)
+
+    def move_to(self, x, y, duration=0.0):
+        self._run("xdotool", "mousemove", str(int(x)), str(int(y)))
+
+    def click(self, button="left"):
+        self._run("xdotool", "click", self._BUTTONS.get(button, "1"))
+
+    def double_click(self):
+        self._run("xdotool", "click", "--repeat", "2", "1")
+
+    def hotkey(self, *keys):
+        self._run("xdotool", "key", "+".join(self._key(k) for k in keys))
+
+    def press(self, key):
+        self._run("xdotool", "key", self._key(key))
+
+    def paste(self, text):
+        if self._xclip:
+            self._run(self._xclip, "-selection", "clipboard", stdin=text.encode("utf-8"))
+            self.hotkey('ctrl', 'v')
+        else:
+            self._run("xdotool", "type", "--delay", "0", text)
+
+
+def default_channel():
+    """
+    Canal de entrada padrão: xdotool no display de RPA_INPUT_DISPLAY, quando
+    definido, ou pyautogui no desktop atual. Retorna None se nenhum estiver
+    disponível (ex.: Linux sem display), o que só impede as ações de clique.
+    """
+    display = os.environ.get("RPA_INPUT_DISPLAY")
+    try:
+        if display:
+            return XdotoolInputChannel(display)
+        return PyAutoGuiInputChannel()
+    except Exception as e:
+        logging.warning(f"Canal de entrada indisponível: {e}")
+        return None
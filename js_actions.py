@@ -0,0 +1,136 @@
+# Executor único para todos os lotes: o texto do script é sempre o mesmo e as
+# operações chegam como argumento (arguments[0], lista de objetos convertida
+# pelo driver), nunca concatenadas no código. ES5 e sem o objeto JSON, ausente
+# no modo de documento IE7; cada resultado volta como [ok, valor ou erro].
+_RUNNER = """
+var ops = arguments[0], results = [];
+var frameWindow = function (path) {
+    var w = window;
+    if (!path) { return w; }
+    var names = path.split('/');
+    for (var i = 0; i < names.length; i++) {
+        var next = w.frames[names[i]] || w[names[i]];
+        if (!next) { throw new Error('frame não encontrado: ' + names[i]); }
+        w = next;
+    }
+    return w;
+};
+var find = function (doc, op) {
+    var el = op.by === 'css' ? doc.querySelector(op.selector) : doc.getElementById(op.selector);
+    if (!el) { throw new Error('elemento não encontrado: ' + op.selector); }
+    return el;
+};
+for (var i = 0; i < ops.length; i++) {
+    var op = ops[i];
+    try {
+        var el = find(frameWindow(op.frame).document, op), value = null;
+        if (op.action === 'click') {
+            el.click();
+        } else if (op.action === 'set_value') {
+            if (op.click) { el.click(); }
+            el.value = op.value;
+        } else if (op.action === 'select_index') {
+            el.selectedIndex = op.value;
+        } else if (op.action === 'text') {
+            // innerText (texto visível, como o .text do WebDriver) existe em
+            // todos os modos do IE; textContent só a partir do IE9
+            value = el.innerText !== undefined ? el.innerText : el.textContent;
+        } else if (op.action === 'value') {
+            value = el.value;
+        }
+        results.push([true, value]);
+    } catch (e) {
+        results.push([false, String(e && e.message || e)]);
+        if (op.stop) { break; }
+    }
+}
+return results;
+"""
+
+
+class ActionBatch:
+    """
+    Lote de ações JavaScript (preencher, clicar, selecionar, ler) sobre
+    elementos de frames nomeados, executado em uma única chamada ao driver.
+
+        batch = ActionBatch()
+        batch.set_value('bizidE', employee).set_value('pcodeE', date)
+        batch.read_text('loadingE', name='otp')
+        result = batch.run(webbot)
+        result['otp']
+
+    Os elementos são localizados por id (by='id') ou seletor CSS (by='css').
+    frame é o nome do frame a partir da janela ativa ('mainFrame'), ou um
+    caminho para frames aninhados ('mainFrame/detalhe'). Por padrão o lote
+    para na primeira ação que falhar e run() lança RuntimeError.
+    """
+
+    def __init__(self, stop_on_error=True):
+        self.stop_on_error = stop_on_error
+        self.ops = []
+        self.names = []
+
+    def _add(self, action, selector, frame, by, name=None, **extra):
+        self.ops.append(dict(action=action, selector=selector, frame=frame, by=by,
+                             stop=self.stop_on_error, **extra))
+        self.names.append(name)
+        return self
+
+    def click(self, selector, frame=None, by="id"):
+        return self._add("click", selector, frame, by)
+
+    def set_value(self, selector, value, frame=None, by="id", click=True):
+        """Preenche o campo (clicando nele antes, como um usuário faria)."""
+        return self._add("set_value", selector, frame, by, value=value, click=click)
+
+    def select_index(self, selector, index, frame=None, by="id"):
+        return self._add("select_index", selector, frame, by, value=int(index))
+
+    def read_text(self, selector, frame=None, by="id", name=None):
+        """Lê o texto visível do elemento (innerText; textContent se não houver)."""
+        return self._add("text", selector, frame, by, name=name)
+
+    def read_value(self, selector, frame=None, by="id", name=None):
+        return self._add("value", selector, frame, by, name=name)
+
+    def run(self, webbot, raise_on_error=True):
+        """
+        Executa o lote na aba ativa. Retorna um BatchResult com o resultado de
+        cada ação, na ordem em que foram adicionadas.
+        """
+        if not self.ops:
+            return BatchResult([], [])
+        driver = getattr(webbot, "driver", webbot)
+        raw = driver.execute_script(_RUNNER, self.ops) or []
+        results = [{"ok": True, "value": payload} if ok else {"ok": False, "error": payload}
+                   for ok, payload in raw]
+        result = BatchResult(results, self.names)
+        if raise_on_error and result.error:
+            index, error = result.error
+            op = self.ops[index]
+            raise RuntimeError(f"Ação {op['action']} em '{op['selector']}'"
+                               f"{' (frame ' + op['frame'] + ')' if op['frame'] else ''} falhou: {error}")
+        return result
+
+
+class BatchResult:
+    """Resultados de um ActionBatch: lista por ação e leituras nomeadas por nome."""
+
+    def __init__(self, results, names):
+        self.results = results
+        self.values = {name: r.get("value") for name, r in zip(names, results) if name and r.get("ok")}
+
+    @property
+    def ok(self):
+        return all(r.get("ok") for r in self.results)
+
+    @property
+    def error(self):
+        """(índice, mensagem) da primeira ação que falhou, ou None."""
+        for index, r in enumerate(self.results):
+            if not r.get("ok"):
+                return index, r.get("error")
+        return None
+
+    def __getitem__(self, name):
+        return self.values[name]
@@ -1,39 +1,89 @@
 # Import necessary libraries and modules
 from botcity.web import WebBot, Browser, By
 import pytesseract
-import os
-from PIL import Image
 from botcity.web.browsers.ie import default_options
+from selenium.common.exceptions import StaleElementReferenceException
+
+from browser_pool import BrowserPool
+from sso_session import SsoSessionStore
+from web_wait import WebWaiter
+from js_actions import ActionBatch
+from captcha_solver import CaptchaSolver
+
+# Important: Change the path where your Tesseract-OCR is installed.
+pytesseract.pytesseract.tesseract_cmd = "C:/Users/matheus.pereira/AppData/Local/Programs/Tesseract-OCR/tesseract.exe"
+
+# Element that only exists in the portal after a successful SSO login
+PORTAL_MARKER = 'a[title="GQIS"]'
+
+
+def create_ie_bot(headless=False):
+    """
+    Create and start a WebBot configured for Internet Explorer (Edge in IE mode).
+    IE has no headless mode, so the flag is accepted only for pool compatibility.
+    """
+    webbot = WebBot()
+    webbot.headless = False
+    webbot.browser = Browser.IE
+    webbot.driver_path = "IEDriverServer.exe"
+
+    # Set additional options for Internet Explorer
+    ie_options = default_options()
+    ie_options.add_additional_option("ie.edgechromium", True)
+    ie_options.add_additional_option("ignoreProtectedModeSettings", True)
+    ie_options.add_additional_option("requireWindowFocus", True)
+    ie_options.add_additional_option("ignoreZoomSetting", True)
+    ie_options.add_additional_option("nativeEvents", True)
+    # Important: Change to the path where your Microsoft Edge is installed
+    ie_options.add_additional_option("ie.edgepath", "C:\\Program Files (x86)\\Microsoft\\Edge\\Application\\msedge.exe") 
+    webbot.options = ie_options
+    webbot.start_browser()
+    return webbot
 
 # Define a class named AutomationBot to encapsulate the automation logic
 class AutomationBot:
-    def __init__(self, url, credentials_file_path):
+    def __init__(self, url, credentials_file_path, pool=None, session_store=None):
         self.url = url
         self.credentials_file_path = credentials_file_path
         self.webbot = None
+        # IE cannot be fully cleaned between cycles, so the pool replaces it after
+        # every job; the second slot warms the replacement up while a cycle runs
+        self.pool = pool or BrowserPool(create_ie_bot, size=2)
+        # Authenticated SSO state saved after a login and restored in later cycles
+        self.session_store = session_store or SsoSessionStore()
+        # Upper bounds (s) for the event-driven waits; long ones cover report queries
+        self.web_timeout = 20
+        self.web_timeout_long = 60
+        # In-memory captcha OCR with voting; attempts are bounded, not recursive
+        self.captcha_solver = CaptchaSolver()
+        self.captcha_attempts = 5
 
     def open_website(self):
-        # Create a WebBot instance and configure it for Internet Explorer
-        self.webbot = WebBot()
-        self.webbot.headless = False
-        self.webbot.browser = Browser.IE
-        self.webbot.driver_path = "IEDriverServer.exe"
-
-        # Set additional options for Internet Explorer
-        ie_options = default_options()
-        ie_options.add_additional_option("ie.edgechromium", True)
-        ie_options.add_additional_option("ignoreProtectedModeSettings", True)
-        ie_options.add_additional_option("requireWindowFocus", True)
-        ie_options.add_additional_option("ignoreZoomSetting", True)
-        ie_options.add_additional_option("nativeEvents", True)
-        # Important: Change to the path where your Microsoft Edge is installed
-        ie_options.add_additional_option("ie.edgepath", "C:\\Program Files (x86)\\Microsoft\\Edge\\Application\\msedge.exe") 
-        self.webbot.options = ie_options
-
         # Open the specified URL and maximize the window
         self.webbot.browse(self.url)
         self.webbot.maximize_window()
 
+    @staticmethod
+    def is_authenticated(webbot):
+        # The portal link is only rendered for an authenticated session
+        return bool(webbot.driver.execute_script("return !!document.querySelector(arguments[0]);", PORTAL_MARKER))
+
+    def resume_session(self):
+        # Restore the saved SSO state; False means the full login chain is needed
+        if not self.session_store.resume(self.webbot, self.url, self.is_authenticated):
+            return False
+        self.webbot.maximize_window()
+        return True
+
+    def save_session(self, timeout=20000):
+        # Save the SSO state once the portal is loaded after the login chain
+        for _ in range(timeout // 500):
+            if self.is_authenticated(self.webbot):
+                self.session_store.save(self.webbot)
+                return True
+            self.webbot.wait(500)
+        return False
+
     def read_credentials(self):
         # Read credentials from a file and return them
         with open(self.credentials_file_path, "r") as file:
@@ -52,175 +102,147 @@ class AutomationBot:
             password_field = self.webbot.find_element(selector='LDAPPASSWORD', by=By.ID)
             password_field.click()
             password_field.send_keys(password)
-            findOTP = """document.getElementById('OTP').click();"""
-            self.webbot.execute_javascript(findOTP)
+            ActionBatch().click('OTP').run(self.webbot)
 
     def fill_otp_form(self, password):
         # Fill out the OTP form using JavaScript and switch to a new tab
         with self.webbot.wait_for_new_page(waiting_time=10000, activate=True):
             new_tab = self.webbot.get_tabs()[1]
             self.webbot.activate_tab(new_tab)
-            password_field = """document.getElementById('pw').click();
-            document.getElementById('pw').value = '""" + password + """';"""
-            self.webbot.execute_javascript(password_field)
-            mybtn = """document.getElementById('myButton').click();"""
-            self.webbot.execute_javascript(mybtn)
+            # One driver call; the password travels as a script argument, not as code
+            ActionBatch().set_value('pw', password).click('myButton').run(self.webbot)
             new_tab = self.webbot.get_tabs()[1]
             self.webbot.activate_tab(new_tab)
             self.webbot.close_page()
             self.webbot.create_tab("http://otpauth.lge.com:8090/selfservice/TempPasswordRequestPcode.jsp?lang=eng")
 
-    def fill_request_form(self, employee, date):
-        # Fill out the request form and handle CAPTCHA using Python and JavaScript
-        with self.webbot.wait_for_new_page(waiting_time=10000, activate=True):
-            employee_field = """document.getElementById('bizidE').click();
-            document.getElementById('bizidE').value = '""" + employee + """';"""
-            self.webbot.execute_javascript(employee_field)
-            employee_field = """document.getElementById('pcodeE').click();
-            document.getElementById('pcodeE').value = '""" + date + """';"""
-            self.webbot.execute_javascript(employee_field)
-
-            self.webbot.wait(3000)
+    def wait_captcha_image(self, previous=None):
+        # Wait for the captcha <img> to be visible and fully decoded; after a
+        # rejection, also wait until the page has swapped in a new image (a
+        # reloaded element or a new src)
+        waiter = WebWaiter(self.webbot, timeout=self.web_timeout)
+        for _ in range(self.web_timeout * 10):
+            elem_captcha = waiter.wait_for_element("//*[@id='photo_imageE']")
+            try:
+                src = self.webbot.driver.execute_script(
+                    "var img = arguments[0];"
+                    "return img.complete && img.naturalWidth > 0 ? img.src : null;", elem_captcha)
+            except StaleElementReferenceException:
+                src = None
+            if src is not None and (elem_captcha.id, src) != previous:
+                return elem_captcha, (elem_captcha.id, src)
+            self.webbot.wait(100)
+        if previous is None:
+            raise Exception("Captcha image did not load")
+        raise Exception("Captcha image was not refreshed after the rejected attempt")
 
-            if not os.path.exists('captchas'):
-                os.mkdir("captchas")
+    def wait_captcha_rejection(self, timeout=2000):
+        # A JS alert after submitting means the captcha was rejected
+        for _ in range(timeout // 100):
+            dialog = self.webbot.get_js_dialog()
+            if dialog is not None:
+                dialog.accept()
+                return True
+            self.webbot.wait(100)
+        return False
 
-            img_path = './captchas/img_screen.png'
-            selector_submit_captcha = "#form1 > div.eng > table > tbody > tr:nth-child(7) > td > input[type=button]:nth-child(1)"
+    def fill_request_form(self, employee, date):
+        # Fill out the request form and solve the CAPTCHA in memory, retrying a bounded number of times
+        selector_submit_captcha = "#form1 > div.eng > table > tbody > tr:nth-child(7) > td > input[type=button]:nth-child(1)"
+        with self.webbot.wait_for_new_page(waiting_time=10000, activate=True):
+            captcha = None
+            for attempt in range(1, self.captcha_attempts + 1):
+                ActionBatch().set_value('bizidE', employee).set_value('pcodeE', date).run(self.webbot)
 
-            self.webbot.wait(3000)
-            code = """document.getElementById('photo_imageE');"""
-            elem_captcha = self.webbot.execute_javascript(code)
-            elem_captcha = self.webbot.find_element("photo_imageE", By.ID)
-            recaptcha = """document.getElementById('answerE');"""
-            elem_recaptcha = self.webbot.execute_javascript(recaptcha)
-            elem_recaptcha = self.webbot.find_element("answerE", By.ID)
-            elem_captcha.screenshot(img_path)
+                # The image bytes come straight from the element; nothing is written to disk
+                elem_captcha, captcha = self.wait_captcha_image(captcha)
+                result = self.captcha_solver.solve(elem_captcha.screenshot_as_png)
 
-            # Use pytesseract to extract text from the CAPTCHA image
-            # Important: Change the path where your Tesseract-OCR is installed.
-            pytesseract.pytesseract.tesseract_cmd = "C:/Users/matheus.pereira/AppData/Local/Programs/Tesseract-OCR/tesseract.exe" 
-            resp_captcha = pytesseract.image_to_string(img_path)
-            resp_captcha = str(resp_captcha)
-            resp_captcha = resp_captcha.lower()
-            resp_captcha = resp_captcha.translate({ord(i): None for i in ' '})
+                # Clear the previous (rejected) answer before typing the new one
+                elem_recaptcha = self.webbot.find_element("answerE", By.ID)
+                elem_recaptcha.click()
+                elem_recaptcha.clear()
+                elem_recaptcha.send_keys(result.text)
+                self.webbot.find_element(selector_submit_captcha, By.CSS_SELECTOR).click()
 
-            self.webbot.wait(2000)
-            elem_recaptcha.click()
-            elem_recaptcha.send_keys(resp_captcha)
-            self.webbot.wait(1000)
-            self.webbot.find_element(selector_submit_captcha, By.CSS_SELECTOR).click()
-            self.webbot.wait(2000)
-
-            if self.webbot.get_js_dialog() is not None:
-                dialog = self.webbot.get_js_dialog()
-                dialog.accept()
-                self.fill_request_form(employee, date)
-            else:
-                self.webbot.close_page()
+                rejected = self.wait_captcha_rejection()
+                self.captcha_solver.report(not rejected)
+                if not rejected:
+                    self.webbot.close_page()
+                    return
+                print(f"Captcha rejected (attempt {attempt} of {self.captcha_attempts})")
+        raise Exception(f"Captcha not solved after {self.captcha_attempts} attempts")
 
     def temporary_otp_form(self):
         # Get the temporary OTP from the page and enter it into the form
         with self.webbot.wait_for_new_page(waiting_time=10000, activate=True):
             self.webbot.wait(1000)
-            getOTP = """document.getElementById('loadingE').textContent;"""
-            temporay = self.webbot.execute_javascript(getOTP)
-            temporay = self.webbot.find_element(selector='loadingE', by=By.ID).text
-            temporays = str(temporay)
+            temporays = ActionBatch().read_text('loadingE', name='otp').run(self.webbot)['otp'].strip()
             self.webbot.close_page()
 
         with self.webbot.wait_for_new_page(waiting_time=10000, activate=True):
             self.webbot.wait(1000)
             new_tabs = self.webbot.get_tabs()[0]
             self.webbot.activate_tab(new_tabs)
-            password_field = """document.getElementById('OTPPASSWORD').click();
-                document.getElementById('OTPPASSWORD').value = '""" + temporays + """';"""
-            self.webbot.execute_javascript(password_field)
+            ActionBatch().set_value('OTPPASSWORD', temporays).run(self.webbot)
             self.webbot.enter()
 
     def entrar_gqis(self):
         # Perform actions to enter the GQIS system
         with self.webbot.wait_for_new_page(waiting_time=10000, activate=True):
             self.webbot.wait(1000)
-            enter_gqis = """document.querySelector('a[title="GQIS"]').click();"""
-            self.webbot.execute_javascript(enter_gqis)
+            ActionBatch().click(PORTAL_MARKER, by='css').run(self.webbot)
             new_tab2 = self.webbot.get_tabs()[0]
             self.webbot.activate_tab(new_tab2)
     
     def entrar_cdrByProduct(self):
-        self.webbot.wait(1000)
-        with self.webbot.wait_for_new_page(waiting_time=10000, activate=True):
-            new_tab2 = self.webbot.get_tabs()[1]
-            self.webbot.activate_tab(new_tab2)
-            CDR_By_Product = """parent['topFrame'].document.getElementById('subItem0').click();"""
-            self.webbot.execute_javascript(CDR_By_Product)
-
-        self.webbot.wait(1000)
-        with self.webbot.wait_for_new_page(waiting_time=10000, activate=True):
-            Prod_Corp = """parent['mainFrame'].document.getElementById('PA').click();"""
-            self.webbot.execute_javascript(Prod_Corp)
-            self.webbot.wait(10000)
+        # Each step continues as soon as its tab, frame or element is ready
+        # (see web_wait.WebWaiter); the timeouts are only upper bounds
+        waiter = WebWaiter(self.webbot, timeout=self.web_timeout)
+        manaus = "//td[text()='Manaus']"
+        product = "//td[text()='*QP(D.1_SRAC_Inverter 인버터 벽걸이형)']"
+        btn_ok = '//a[@class="okBtn" and @onclick="onOkBtnClicked();"]'
+        btn_view = '//div[@class="dhx_toolbar_btn def" and @title="View Aggregation"]'
 
-        with self.webbot.wait_for_new_page(waiting_time=10000, activate=True):
-            new_tab2 = self.webbot.get_tabs()[2]
+        with waiter.step("Open CDR by Product"):
+            new_tab2 = waiter.wait_for_tab(2)[1]
             self.webbot.activate_tab(new_tab2)
+            waiter.wait_for_idle(frames=("topFrame",))
+            token = waiter.mark_frames(("mainFrame",))
+            ActionBatch().click('subItem0', frame='topFrame').run(self.webbot)
+            waiter.wait_for_frame_reload("mainFrame", token)
 
-            findProd_Corp = self.webbot.find_element("//td[text()='Manaus']", By.XPATH)
-            self.webbot.wait_for_element_visibility(element=findProd_Corp, visible=True, waiting_time=20000)
-            clickFindProd_Corp = self.webbot.find_element(selector="//td[text()='Manaus']", by=By.XPATH) 
-            clickFindProd_Corp.click()
-
-            btnOK = self.webbot.find_element('//a[@class="okBtn" and @onclick="onOkBtnClicked();"]', By.XPATH)
-            self.webbot.wait_for_element_visibility(element=btnOK, visible=True, waiting_time=20000)
-            clickBtnOK = self.webbot.find_element(selector='//a[@class="okBtn" and @onclick="onOkBtnClicked();"]', by=By.XPATH)
-            clickBtnOK.click()
+        with waiter.step("Select corporation (Manaus)"):
+            ActionBatch().click('PA', frame='mainFrame').run(self.webbot)
+            self.webbot.activate_tab(waiter.wait_for_tab(3)[2])
+            waiter.click(manaus, timeout=self.web_timeout_long)
+            waiter.click(btn_ok)
 
-        with self.webbot.wait_for_new_page(waiting_time=20000, activate=True):
-            new_tab = self.webbot.get_tabs()[1]
+        with waiter.step("Set month and RAC sales weight"):
+            new_tab = waiter.wait_for_tab(2)[1]
             self.webbot.activate_tab(new_tab)
-            changeDate = """parent['mainFrame'].document.getElementById('basicMonthFr').selectedIndex = 0;"""
-            self.webbot.execute_javascript(changeDate)
-            racWSales = """parent['mainFrame'].document.getElementById('racSalesWeight').click(); """
-            self.webbot.execute_javascript(racWSales)
+            waiter.wait_for_idle(frames=("mainFrame",))
+            (ActionBatch()
+                .select_index('basicMonthFr', 0, frame='mainFrame')
+                .click('racSalesWeight', frame='mainFrame')
+                .run(self.webbot))
         
         # Choose product or division
-        self.webbot.wait(1000)
-        with self.webbot.wait_for_new_page(waiting_time=10000, activate=True):
-            Prod_Corp = """parent['mainFrame'].document.getElementById('PR').click();"""
-            self.webbot.execute_javascript(Prod_Corp)
-            self.webbot.wait(10000)
-
-        with self.webbot.wait_for_new_page(waiting_time=10000, activate=True):
-            new_tab2 = self.webbot.get_tabs()[2]
-            self.webbot.activate_tab(new_tab2)
-
-        with self.webbot.wait_for_new_page(waiting_time=10000, activate=True):
-            btnView = self.webbot.find_element('//div[@class="dhx_toolbar_btn def" and @title="View Aggregation"]', By.XPATH)
-            self.webbot.wait_for_element_visibility(element=btnView, visible=True, waiting_time=20000)
-            clickbtnView = self.webbot.find_element(selector='//div[@class="dhx_toolbar_btn def" and @title="View Aggregation"]', by=By.XPATH)
-            clickbtnView.click()
-
-        with self.webbot.wait_for_new_page(waiting_time=20000, activate=True): 
-            self.webbot.wait(12000)
-            findProd_Corp = self.webbot.find_element("//td[text()='*QP(D.1_SRAC_Inverter 인버터 벽걸이형)']", By.XPATH)
-            self.webbot.wait_for_element_visibility(element=findProd_Corp, visible=True, waiting_time=20000)
-            clickFindProd_Corp = self.webbot.find_element(selector="//td[text()='*QP(D.1_SRAC_Inverter 인버터 벽걸이형)']", by=By.XPATH) 
-            clickFindProd_Corp.click()
-
-        with self.webbot.wait_for_new_page(waiting_time=10000, activate=True):
-            self.webbot.wait(2000)
-            btnOK = self.webbot.find_element('//a[@class="okBtn" and @onclick="onOkBtnClicked();"]', By.XPATH)
-            self.webbot.wait_for_element_visibility(element=btnOK, visible=True, waiting_time=20000)
-            clickBtnOK = self.webbot.find_element(selector='//a[@class="okBtn" and @onclick="onOkBtnClicked();"]', by=By.XPATH)
-            clickBtnOK.click()
+        with waiter.step("Select product"):
+            waiter.wait_for_idle(frames=("mainFrame",))
+            ActionBatch().click('PR', frame='mainFrame').run(self.webbot)
+            self.webbot.activate_tab(waiter.wait_for_tab(3)[2])
+            waiter.click(btn_view, timeout=self.web_timeout_long)
+            waiter.click(product, timeout=self.web_timeout_long)
+            waiter.click(btn_ok)
 
         # Search for the data
-        with self.webbot.wait_for_new_page(waiting_time=10000, activate=True):
-            new_tab = self.webbot.get_tabs()[1]
+        with waiter.step("Search"):
+            new_tab = waiter.wait_for_tab(2)[1]
             self.webbot.activate_tab(new_tab)
-            btnSearch = """parent['mainFrame'].document.getElementById('imgShow').click();"""
-            self.webbot.execute_javascript(btnSearch)
-            self.webbot.wait(10000)
+            waiter.wait_for_idle(frames=("mainFrame",))
+            ActionBatch().click('imgShow', frame='mainFrame').run(self.webbot)
+            waiter.wait_for_idle(frames=("mainFrame",), timeout=self.web_timeout_long)
 
     def openExcel(self):
         self.deskbot = DesktopBot()
@@ -231,26 +253,36 @@ class AutomationBot:
         input()
 
     def run(self):
-        while True:
-            try:
-                # Perform the automation steps in sequence
-                self.open_website()
-                username, password, employee, date = self.read_credentials()
-                self.login(username, password)
-                self.fill_otp_form(password)
-                self.fill_request_form(employee, date)
-                self.temporary_otp_form()
-                self.entrar_gqis()
+        self.pool.start()
+        try:
+            while True:
                 try:
-                    self.entrar_cdrByProduct()
-                    self.webbot.wait(4000)
-                    self.openExcel()
+                    # Each cycle borrows a warm browser; it is reset afterwards, or replaced on errors
+                    with self.pool.session() as webbot:
+                        self.webbot = webbot
+                        # Perform the automation steps in sequence, skipping the
+                        # OTP/captcha chain while a saved SSO session is still valid
+                        if not self.resume_session():
+                            self.open_website()
+                            username, password, employee, date = self.read_credentials()
+                            self.login(username, password)
+                            self.fill_otp_form(password)
+                            self.fill_request_form(employee, date)
+                            self.temporary_otp_form()
+                            self.save_session()
+                        self.entrar_gqis()
+                        try:
+                            self.entrar_cdrByProduct()
+                            self.webbot.wait(4000)
+                            self.openExcel()
+                        except Exception as e:
+                            raise Exception("Ocorreu um erro na função entrar_cdrByProduct:", e)
+                    continue
                 except Exception as e:
-                    raise Exception("Ocorreu um erro na função entrar_cdrByProduct:", e)
+                    raise Exception("Ocorreu um erro na função run:", e)
                 continue
-            except Exception as e:
-                raise Exception("Ocorreu um erro na função run:", e)
-            continue
+        finally:
+            self.pool.close()
 
 # Entry point of the script
 if __name__ == '__main__':
@@ -1,40 +1,50 @@
 from botcity.web import WebBot, Browser, By
 from botcity.web.browsers.edge import default_options
 
+from browser_pool import BrowserPool
+
+
+def create_edge_bot(headless=False):
+    """Cria e inicia um WebBot do Edge já configurado (usado pelo BrowserPool)."""
+    webbot = WebBot()
+    webbot.headless = headless
+    webbot.browser = Browser.EDGE
+    webbot.driver_path = "msedgedriver.exe"
+    
+    # Configure options BEFORE browsing
+    # Get default options
+    options = default_options(
+        headless=webbot.headless,
+        download_folder_path=webbot.download_folder_path,
+        user_data_dir=None
+    )
+    
+    # Add your custom arguments
+    options.add_argument("--disable-gpu")  # Evita erros gráficos
+    options.add_argument("--log-level=3")  # Reduz o nível de logs
+    
+    # Add this option to show the controlled by automation message
+    options.add_experimental_option("excludeSwitches", [])
+    
+    # Update the webbot options
+    webbot.options = options
+    webbot.start_browser()
+    return webbot
+
+
 class AutomationBot:
-    def __init__(self, url, credentials_file_path):
+    def __init__(self, url, credentials_file_path, pool=None):
         self.url = url
         self.credentials_file_path = credentials_file_path
         self.webbot = None
+        # Navegadores aquecidos: cada ciclo do run() usa um já aberto e configurado
+        self.pool = pool or BrowserPool(create_edge_bot)
 
     def open_website(self):
-        self.webbot = WebBot()
-        self.webbot.headless = False
-        self.webbot.browser = Browser.EDGE
-        self.webbot.driver_path = "msedgedriver.exe"
-        
-        # Configure options BEFORE browsing
-        # Get default options
-        options = default_options(
-            headless=self.webbot.headless,
-            download_folder_path=self.webbot.download_folder_path,
-            user_data_dir=None
-        )
-        
-        # Add your custom arguments
-        options.add_argument("--disable-gpu")  # Evita erros gráficos
-        options.add_argument("--log-level=3")  # Reduz o nível de logs
-        
-        # Add this option to show the controlled by automation message
-        options.add_experimental_option("excludeSwitches", [])
-        
-        # Update the webbot options
-        self.webbot.options = options
-        
-        # Now open the browser with these options
+        # Open the URL in the warm browser handed out by the pool
         self.webbot.browse(self.url)
         self.webbot.maximize_window()
-        # self.webbot.options.add_argument("--headless")  # Para rodar sem abrir o navegador
+        # Para rodar sem abrir o navegador: BrowserPool(create_edge_bot, headless=True)
 
     # def start(self):
     #     functions = PracticetestautomationFunctions(self.webbot)
@@ -47,16 +57,22 @@ class AutomationBot:
     #     main.click_images(main.tasks)
 
     def run(self):
-        while True:
-            try:
-                self.open_website()
-                self.start()
+        self.pool.start()
+        try:
+            while True:
+                try:
+                    with self.pool.session() as webbot:
+                        self.webbot = webbot
+                        self.open_website()
+                        self.start()
 
-                print("Terminou")
-                input()
-            except Exception as e:
-                raise Exception("Ocorreu um erro na função run:", e)
-            continue
+                        print("Terminou")
+                        input()
+                except Exception as e:
+                    raise Exception("Ocorreu um erro na função run:", e)
+                continue
+        finally:
+            self.pool.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,178 @@
+import os
+import json
+import base64
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import cv2
+
+# Largura da miniatura usada para comparar quadros quase idênticos
+THUMBNAIL_WIDTH = 128
+# Diferença mínima (0-255) para considerar que um pixel da miniatura mudou
+PIXEL_DELTA = 24
+# Quantos quadros diferentes são guardados para a mesma busca
+ENTRIES_PER_KEY = 4
+
+
+def _as_array(img):
+    return img if isinstance(img, np.ndarray) else np.asarray(img)
+
+
+def frame_digest(img):
+    """Hash exato dos pixels da imagem (inclui o formato do array)."""
+    pixels = np.ascontiguousarray(_as_array(img))
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(pixels.shape).encode())
+    digest.update(pixels.data)
+    return digest.hexdigest()
+
+
+def frame_thumbnail(img):
+    """Miniatura em escala de cinza usada para a comparação com tolerância."""
+    pixels = _as_array(img)
+    if pixels.ndim == 3:
+        pixels = cv2.cvtColor(pixels, cv2.COLOR_RGB2GRAY)
+    height, width = pixels.shape[:2]
+    if width > THUMBNAIL_WIDTH:
+        new_height = max(1, round(height * THUMBNAIL_WIDTH / width))
+        pixels = cv2.resize(pixels, (THUMBNAIL_WIDTH, new_height), interpolation=cv2.INTER_AREA)
+    return pixels
+
+
+def changed_fraction(thumb_a, thumb_b):
+    """Fração de pixels que mudaram entre duas miniaturas (1.0 se o tamanho difere)."""
+    if thumb_a.shape != thumb_b.shape:
+        return 1.0
+    delta = cv2.absdiff(thumb_a, thumb_b)
+    return float(np.count_nonzero(delta > PIXEL_DELTA)) / delta.size
+
+
+class OcrResultCache:
+    """
+    Cache LRU dos resultados de OCR, indexado por (região, texto alvo, filtro,
+    opções da busca) e pelos pixels capturados. options é uma tupla com as
+    opções que mudam o resultado da busca (ex.: limiar de confiança antecipada,
+    poda das variações, ordenação adaptativa), para que tarefas com opções
+    diferentes não compartilhem resultados. Um quadro idêntico (ou, com tolerância > 0,
+    quase idêntico) ao de uma busca anterior devolve o mesmo resultado sem
+    executar o OCR novamente.
+
+    tolerance é a fração máxima de pixels da miniatura que pode mudar para o
+    quadro ainda ser considerado o mesmo (ex.: 0.002 para ignorar um cursor
+    piscando). Com tolerance=0 apenas quadros idênticos são reaproveitados.
+    """
+
+    def __init__(self, max_entries=256, tolerance=0.0, path=None):
+        self.max_entries = max_entries
+        self.tolerance = tolerance
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load(path)
+
+    @staticmethod
+    def _key(region, target_text, filter_type, options=()):
+        return (tuple(region) if region else None, target_text, filter_type, tuple(options))
+
+    def lookup(self, region, target_text, filter_type, img, tolerance=None, options=()):
+        """Retorna o resultado guardado para o quadro, ou None em caso de falha."""
+        tolerance = self.tolerance if tolerance is None else tolerance
+        key = self._key(region, target_text, filter_type, options)
+        digest = frame_digest(img)
+        thumb = frame_thumbnail(img) if tolerance > 0 else None
+
+        with self._lock:
+            entries = self._entries.get(key)
+            if entries:
+                for entry in entries:
+                    if entry["digest"] == digest or (
+                        thumb is not None and changed_fraction(thumb, entry["thumb"]) <= tolerance
+                    ):
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                        return entry["result"]
+            self.misses += 1
+        return None
+
+    def store(self, region, target_text, filter_type, img, result, options=()):
+        """Guarda o resultado (caixas, confianças, detecção antecipada) do quadro."""
+        key = self._key(region, target_text, filter_type, options)
+        entry = {"digest": frame_digest(img), "thumb": frame_thumbnail(img), "result": result}
+        with self._lock:
+            entries = self._entries.setdefault(key, [])
+            entries.insert(0, entry)
+            del entries[ENTRIES_PER_KEY:]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+        }
+
+    def save(self, path=None):
+        """Persiste o cache em JSON (miniaturas em base64)."""
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            payload = [
+                {
+                    "key": [list(region) if region else None, text, filter_type, list(options)],
+                    "entries": [
+                        {
+                            "digest": entry["digest"],
+                            "thumb_shape": list(entry["thumb"].shape),
+                            "thumb": base64.b64encode(entry["thumb"].tobytes()).decode("ascii"),
+                            "result": entry["result"],
+                        }
+                        for entry in entries
+                    ],
+                }
+                for (region, text, filter_type, options), entries in self._entries.items()
+            ]
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(payload, file)
+        os.replace(temp_path, path)
+
+    def load(self, path=None):
+        """Carrega um cache salvo com save(). Arquivos inválidos são ignorados."""
+        path = path or self.path
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                payload = json.load(file)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Não foi possível carregar o cache de OCR em {path}: {e}")
+            return
+        with self._lock:
+            for item in payload:
+                if len(item["key"]) != 4:
+                    # Arquivo anterior às opções da busca: os resultados podem não valer
+                    continue
+                region, text, filter_type, options = item["key"]
+                entries = []
+                for entry in item["entries"]:
+                    thumb = np.frombuffer(base64.b64decode(entry["thumb"]), dtype=np.uint8)
+                    boxes, scores, early_match = entry["result"]
+                    entries.append({
+                        "digest": entry["digest"],
+                        "thumb": thumb.reshape(entry["thumb_shape"]),
+                        "result": ([tuple(box) for box in boxes], list(scores), early_match),
+                    })
+                self._entries[self._key(region, text, filter_type, options)] = entries
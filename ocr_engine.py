@@ -0,0 +1,258 @@
+import os
+import re
+import queue
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pytesseract
+from PIL import Image
+
+# tesserocr (dependência em requirements.txt) mantém a API do Tesseract carregada
+# em memória (sem spawn de processo nem arquivo PNG temporário por chamada). A
+# linha de comando do Tesseract não tem modo residente, então sem o tesserocr o
+# motor só pode cair para o pytesseract, limitando a concorrência, e avisa no log.
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+# Quantidade de workers do pool. Pode ser definida pela variável de ambiente
+# RPA_OCR_WORKERS; por padrão usa um worker por núcleo.
+DEFAULT_OCR_WORKERS = int(os.environ.get("RPA_OCR_WORKERS", 0)) or (os.cpu_count() or 1)
+DEFAULT_OCR_LANG = "eng"
+# Instalação padrão do Tesseract no Windows; RPA_TESSERACT_CMD e
+# TESSDATA_PREFIX, quando definidos, têm precedência
+WINDOWS_TESSERACT_DIR = r"C:\Program Files\Tesseract-OCR"
+
+_OEM_RE = re.compile(r"--oem\s+(\d+)")
+_PSM_RE = re.compile(r"--psm\s+(\d+)")
+_VAR_RE = re.compile(r"-c\s+(\w+)=(\S+)")
+
+
+def parse_tesseract_config(config):
+    """
+    Converte uma string de configuração no formato da linha de comando do
+    Tesseract (ex.: '--oem 3 --psm 7 -c tessedit_char_whitelist=0123456789')
+    em uma tupla (oem, psm, variaveis).
+    """
+    config = config or ""
+    oem = _OEM_RE.search(config)
+    psm = _PSM_RE.search(config)
+    variables = dict(_VAR_RE.findall(config))
+    return (
+        int(oem.group(1)) if oem else 3,
+        int(psm.group(1)) if psm else 3,
+        variables,
+    )
+
+
+def configure_tesseract():
+    """
+    Define o executável do Tesseract usado pelo pytesseract e o diretório
+    tessdata. Sem RPA_TESSERACT_CMD e TESSDATA_PREFIX, o Windows usa a
+    instalação padrão e os demais sistemas o tesseract do PATH com o tessdata
+    embutido. Um TESSDATA_PREFIX inexistente é descartado com um aviso, em vez
+    de fazer cada chamada de OCR falhar. Retorna o executável configurado.
+    """
+    cmd = os.environ.get("RPA_TESSERACT_CMD")
+    if not cmd:
+        if os.name == "nt":
+            cmd = os.path.join(WINDOWS_TESSERACT_DIR, "tesseract.exe")
+        else:
+            cmd = shutil.which("tesseract") or "tesseract"
+    pytesseract.pytesseract.tesseract_cmd = cmd
+    if os.name == "nt":
+        os.environ.setdefault("TESSDATA_PREFIX", os.path.join(WINDOWS_TESSERACT_DIR, "tessdata"))
+    tessdata = os.environ.get("TESSDATA_PREFIX")
+    if tessdata and not os.path.isdir(tessdata):
+        logging.warning(f"TESSDATA_PREFIX={tessdata} não existe; usando o tessdata padrão do Tesseract")
+        del os.environ["TESSDATA_PREFIX"]
+    return cmd
+
+
+def check_tesseract(lang=DEFAULT_OCR_LANG):
+    """Verifica se o Tesseract configurado funciona. Retorna a mensagem de erro, ou None."""
+    try:
+        if tesserocr is not None:
+            kwargs = {"lang": lang}
+            if os.environ.get("TESSDATA_PREFIX"):
+                kwargs["path"] = os.environ["TESSDATA_PREFIX"].rstrip("\\/") + os.sep
+            tesserocr.PyTessBaseAPI(**kwargs).End()
+        else:
+            pytesseract.get_tesseract_version()
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+def _as_pil(img):
+    """Aceita imagens PIL ou arrays NumPy sem passar por disco."""
+    if isinstance(img, np.ndarray):
+        return Image.fromarray(img)
+    return img
+
+
+class OcrEngine:
+    """
+    Pool de workers do Tesseract reutilizado entre chamadas.
+
+    Com tesserocr, cada worker é uma instância de PyTessBaseAPI já inicializada
+    (dados de idioma carregados uma única vez) que recebe a imagem em memória.
+    Sem tesserocr, as chamadas seguem para o pytesseract, com no máximo
+    `workers` processos do Tesseract em paralelo.
+    """
+
+    def __init__(self, workers=None, lang=DEFAULT_OCR_LANG, tessdata_path=None):
+        self.workers = max(1, workers or DEFAULT_OCR_WORKERS)
+        self.lang = lang
+        self.tessdata_path = tessdata_path or os.environ.get("TESSDATA_PREFIX")
+        self.backend = "tesserocr" if tesserocr is not None else "pytesseract"
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._idle = queue.LifoQueue()
+        self._all_apis = []
+        self._lock = threading.Lock()
+        if self.backend == "tesserocr":
+            logging.info(f"Motor OCR: tesserocr (API em memória) com {self.workers} worker(s)")
+        else:
+            logging.warning(f"Motor OCR: pytesseract com até {self.workers} processo(s) em paralelo; "
+                            "tesserocr não está instalado, então cada chamada inicia um processo do "
+                            "Tesseract e grava um PNG temporário (pip install -r requirements.txt)")
+
+    def _create_api(self):
+        kwargs = {"lang": self.lang}
+        if self.tessdata_path:
+            kwargs["path"] = self.tessdata_path.rstrip("\\/") + os.sep
+        api = tesserocr.PyTessBaseAPI(**kwargs)
+        with self._lock:
+            self._all_apis.append(api)
+        return api
+
+    @contextmanager
+    def _worker(self):
+        """Empresta um worker aquecido do pool (cria sob demanda até o limite)."""
+        with self._slots:
+            try:
+                api = self._idle.get_nowait()
+            except queue.Empty:
+                api = self._create_api()
+            try:
+                yield api
+            finally:
+                self._idle.put(api)
+
+    def image_to_data(self, img, config=""):
+        """
+        Equivalente a pytesseract.image_to_data(..., output_type=Output.DICT).
+        Retorna um dicionário com as chaves 'text', 'conf', 'left', 'top',
+        'width' e 'height'.
+        """
+        img = _as_pil(img)
+        if self.backend == "pytesseract":
+            with self._slots:
+                return pytesseract.image_to_data(img, output_type=pytesseract.Output.DICT, config=config)
+
+        _, psm, variables = parse_tesseract_config(config)
+        with self._worker() as api:
+            previous = {name: api.GetVariableAsString(name) or "" for name in variables}
+            try:
+                for name, value in variables.items():
+                    api.SetVariable(name, value)
+                api.SetPageSegMode(psm)
+                api.SetImage(img)
+                api.Recognize()
+                return self._collect_words(api)
+            finally:
+                for name, value in previous.items():
+                    api.SetVariable(name, value)
+                api.Clear()
+
+    def image_to_string(self, img, config=""):
+        """Equivalente a pytesseract.image_to_string usando o pool."""
+        img = _as_pil(img)
+        if self.backend == "pytesseract":
+            with self._slots:
+                return pytesseract.image_to_string(img, config=config)
+
+        _, psm, variables = parse_tesseract_config(config)
+        with self._worker() as api:
+            previous = {name: api.GetVariableAsString(name) or "" for name in variables}
+            try:
+                for name, value in variables.items():
+                    api.SetVariable(name, value)
+                api.SetPageSegMode(psm)
+                api.SetImage(img)
+                return api.GetUTF8Text()
+            finally:
+                for name, value in previous.items():
+                    api.SetVariable(name, value)
+                api.Clear()
+
+    @staticmethod
+    def _collect_words(api):
+        """
+        Percorre o resultado no nível de palavra. Uma linha vazia (conf -1) é
+        inserida a cada nova linha de texto, como no TSV do Tesseract, para que
+        buscas de várias palavras não atravessem linhas.
+        """
+        data = {"text": [], "conf": [], "left": [], "top": [], "width": [], "height": []}
+        iterator = api.GetIterator()
+        if iterator is None:
+            return data
+
+        word_level = tesserocr.RIL.WORD
+        line_level = tesserocr.RIL.TEXTLINE
+        for word in tesserocr.iterate_level(iterator, word_level):
+            box = word.BoundingBox(word_level)
+            if box is None:
+                continue
+            if word.IsAtBeginningOf(line_level):
+                for key in ("left", "top", "width", "height"):
+                    data[key].append(0)
+                data["text"].append("")
+                data["conf"].append(-1)
+            x1, y1, x2, y2 = box
+            data["text"].append(word.GetUTF8Text(word_level) or "")
+            data["conf"].append(word.Confidence(word_level))
+            data["left"].append(x1)
+            data["top"].append(y1)
+            data["width"].append(x2 - x1)
+            data["height"].append(y2 - y1)
+        return data
+
+    def close(self):
+        """Libera as instâncias do Tesseract mantidas pelo pool."""
+        with self._lock:
+            apis, self._all_apis = self._all_apis, []
+        for api in apis:
+            try:
+                api.End()
+            except Exception as e:
+                logging.debug(f"Erro ao finalizar worker do OCR: {e}")
+        self._idle = queue.LifoQueue()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Retorna o motor OCR compartilhado, criando-o na primeira chamada."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = OcrEngine()
+    return _engine
+
+
+def configure_engine(workers=None, lang=DEFAULT_OCR_LANG, tessdata_path=None):
+    """Recria o motor compartilhado com outro tamanho de pool ou idioma."""
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.close()
+        _engine = OcrEngine(workers=workers, lang=lang, tessdata_path=tessdata_path)
+    return _engine
@@ -0,0 +1,114 @@
+import os
+import json
+import atexit
+import logging
+import threading
+
+# Arquivo onde o histórico de acertos do OCR é mantido entre execuções.
+DEFAULT_STATS_PATH = os.environ.get("RPA_OCR_STATS", "ocr_stats.json")
+# Quantos registros novos acumular antes de regravar o arquivo; o restante é
+# gravado por save() no fim da execução (ou na saída do processo)
+SAVE_EVERY = 50
+
+
+def make_task_key(text, region, char_type):
+    """Chave do histórico para uma tarefa de texto (texto, região e filtro)."""
+    region_key = ",".join(str(v) for v in region) if region else ""
+    return f"{text}|{region_key}|{char_type}"
+
+
+def make_pair_key(variant_name, config):
+    """Identifica uma combinação (variação de pré-processamento, configuração OCR)."""
+    return f"{variant_name}|{config}"
+
+
+class OcrHitStats:
+    """
+    Histórico em disco de qual combinação (variação, configuração) produziu o
+    resultado vencedor para cada tarefa. Usado para reordenar as combinações
+    nas próximas execuções, tentando primeiro as que mais acertaram.
+
+    Os registros ficam em memória e o arquivo é regravado a cada SAVE_EVERY
+    registros e em save().
+
+    Formato do arquivo:
+        {"<tarefa>": {"runs": 12, "hits": {"<variação>|<config>": 10, ...}}, ...}
+    """
+
+    def __init__(self, path=DEFAULT_STATS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = self._load()
+        self._pending = 0
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Não foi possível ler o histórico de OCR em {self.path}: {e}")
+            return {}
+
+    def _save(self):
+        if not self.path:
+            return
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(self._data, file, ensure_ascii=False, indent=1)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logging.warning(f"Não foi possível salvar o histórico de OCR em {self.path}: {e}")
+
+    def record(self, task_key, pair_key=None):
+        """
+        Registra uma execução da tarefa. pair_key é a combinação vencedora,
+        ou None quando nenhuma combinação encontrou o texto.
+        """
+        with self._lock:
+            entry = self._data.setdefault(task_key, {"runs": 0, "hits": {}})
+            entry["runs"] += 1
+            if pair_key is not None:
+                entry["hits"][pair_key] = entry["hits"].get(pair_key, 0) + 1
+            self._pending += 1
+            if self._pending >= SAVE_EVERY:
+                self._save()
+                self._pending = 0
+
+    def save(self):
+        """Grava os registros ainda não salvos (nada a fazer se não houver)."""
+        with self._lock:
+            if self._pending:
+                self._save()
+                self._pending = 0
+
+    def ranked_pairs(self, task_key, default_pairs):
+        """
+        Reordena default_pairs (lista de pair_keys na ordem estática) pela taxa
+        de acerto observada. Retorna (aprendidas, restantes): as combinações que
+        já venceram para a tarefa, da mais para a menos frequente, e as demais
+        na ordem original.
+        """
+        with self._lock:
+            hits = dict(self._data.get(task_key, {}).get("hits", {}))
+        learned = [pair for pair in default_pairs if hits.get(pair)]
+        learned.sort(key=lambda pair: -hits[pair])
+        remaining = [pair for pair in default_pairs if not hits.get(pair)]
+        return learned, remaining
+
+
+_stats = None
+_stats_lock = threading.Lock()
+
+
+def get_stats():
+    """Retorna o histórico compartilhado, carregando-o na primeira chamada."""
+    global _stats
+    if _stats is None:
+        with _stats_lock:
+            if _stats is None:
+                _stats = OcrHitStats()
+                atexit.register(_stats.save)
+    return _stats
@@ -0,0 +1,201 @@
+import os
+import time
+import queue
+import ctypes
+import logging
+import threading
+from contextlib import contextmanager
+
+# Destaque visual dos cliques. Desative com RPA_OVERLAY=0 (ou set_enabled(False))
+# em execuções sem acompanhamento.
+OVERLAY_ENABLED = os.environ.get("RPA_OVERLAY", "1") != "0"
+
+# Intervalo (ms) em que a thread da interface verifica novos pedidos
+POLL_MS = 30
+# Afinidade de exibição do Windows 10 2004+ que esconde a janela das capturas
+WDA_EXCLUDEFROMCAPTURE = 0x11
+# Tempo máximo (s) esperando a interface esconder a janela antes de uma captura
+HIDE_TIMEOUT = 0.5
+
+
+class OverlayService:
+    """
+    Janela transparente de tela cheia, única e persistente, que desenha
+    retângulos de destaque. A janela pertence a uma thread de interface
+    dedicada e recebe os pedidos por uma fila, então show() nunca bloqueia
+    a thread da automação.
+
+    A janela precisa da cor transparente (-transparentcolor, só no Windows);
+    sem ela o overlay cobriria a tela toda e seria capturado junto, então o
+    serviço é desativado. Quando o Windows permite, a janela também é
+    excluída das capturas de tela; caso contrário hidden_for_capture()
+    esconde a janela durante cada captura e a mostra de novo em seguida, sem
+    apagar os destaques.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._unavailable = False
+        self._excluded = False
+        self._shown_until = 0.0
+        self._hide_lock = threading.Lock()
+        self._hiders = 0
+        self._hidden = None
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._unavailable:
+                return False
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="overlay-ui", daemon=True)
+                self._thread.start()
+            return True
+
+    def _disable(self, reason):
+        logging.warning(f"Overlay desativado: {reason}")
+        self._unavailable = True
+
+    def _exclude_from_capture(self, root):
+        """Esconde a janela das capturas de tela (SetWindowDisplayAffinity)."""
+        try:
+            user32 = ctypes.windll.user32
+            hwnd = user32.GetParent(root.winfo_id()) or root.winfo_id()
+            self._excluded = bool(user32.SetWindowDisplayAffinity(hwnd, WDA_EXCLUDEFROMCAPTURE))
+        except (AttributeError, OSError):
+            self._excluded = False
+        if not self._excluded:
+            logging.info("Overlay visível nas capturas; a janela será escondida durante cada captura.")
+
+    def _run(self):
+        import tkinter as tk
+
+        try:
+            root = tk.Tk()
+        except tk.TclError as e:
+            self._disable(f"sem display ({e})")
+            return
+        try:
+            # Atributo disponível apenas no Windows
+            root.attributes('-transparentcolor', 'black')
+        except tk.TclError:
+            root.destroy()
+            self._disable("janela transparente não suportada neste sistema")
+            return
+        root.overrideredirect(True)
+        root.attributes("-topmost", True)
+        root.config(bg='black')
+
+        screen_width = root.winfo_screenwidth()
+        screen_height = root.winfo_screenheight()
+        root.geometry(f"{screen_width}x{screen_height}+0+0")
+
+        canvas = tk.Canvas(root, width=screen_width, height=screen_height, bg='black', highlightthickness=0)
+        canvas.pack()
+        root.update_idletasks()
+        self._exclude_from_capture(root)
+
+        def drain():
+            while True:
+                try:
+                    command, args = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if command == "stop":
+                    root.destroy()
+                    return
+                if command == "show":
+                    (x, y, w, h), duration = args
+                    rect = canvas.create_rectangle(x, y, x + w, y + h, outline="red", width=4)
+                    root.after(duration, canvas.delete, rect)
+                elif command == "clear":
+                    canvas.delete("all")
+                elif command == "hide":
+                    # Transparência total mantém a janela, os destaques e seus
+                    # temporizadores; "restore" só devolve a opacidade
+                    root.attributes("-alpha", 0.0)
+                    root.update_idletasks()
+                    args.set()
+                elif command == "restore":
+                    root.attributes("-alpha", 1.0)
+            root.after(POLL_MS, drain)
+
+        root.after(0, drain)
+        root.mainloop()
+
+    def show(self, region, duration=1000):
+        """Destaca a região (x, y, w, h) por duration milissegundos, sem bloquear."""
+        if not OVERLAY_ENABLED or not self._ensure_started():
+            return
+        self._shown_until = max(self._shown_until, time.monotonic() + duration / 1000)
+        self._queue.put(("show", (tuple(int(v) for v in region), duration)))
+
+    def _alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def clear(self):
+        """Apaga os destaques."""
+        if not self._alive():
+            return
+        self._queue.put(("clear", None))
+        self._shown_until = 0.0
+
+    @contextmanager
+    def hidden_for_capture(self):
+        """
+        Esconde a janela enquanto o bloco captura a tela e a mostra de novo
+        ao sair, para que os destaques não apareçam na captura mas continuem
+        visíveis para quem acompanha. Capturas simultâneas compartilham o
+        mesmo intervalo escondido.
+        """
+        if self._excluded or not self._alive() or time.monotonic() >= self._shown_until:
+            yield
+            return
+        with self._hide_lock:
+            self._hiders += 1
+            if self._hiders == 1:
+                self._hidden = threading.Event()
+                self._queue.put(("hide", self._hidden))
+            hidden = self._hidden
+        hidden.wait(HIDE_TIMEOUT)
+        try:
+            yield
+        finally:
+            with self._hide_lock:
+                self._hiders -= 1
+                if self._hiders == 0:
+                    self._queue.put(("restore", None))
+
+    def stop(self):
+        """Fecha a janela do overlay e encerra a thread de interface."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._queue.put(("stop", None))
+            thread.join(timeout=2)
+
+
+_service = OverlayService()
+
+
+def set_enabled(enabled):
+    """Liga ou desliga o overlay para o processo inteiro."""
+    global OVERLAY_ENABLED
+    OVERLAY_ENABLED = bool(enabled)
+    if not enabled:
+        _service.clear()
+
+
+def show(region, duration=1000):
+    """Destaca a região no overlay compartilhado (não bloqueia)."""
+    _service.show(region, duration)
+
+
+def hidden_for_capture():
+    """Esconde o overlay compartilhado durante uma captura (se ele aparecer nela)."""
+    return _service.hidden_for_capture()
+
+
+def stop():
+    _service.stop()
@@ -0,0 +1,510 @@
+"""
+Gravação e reprodução de execuções do bot_vision.
+
+Gravação (desktop real): os quadros capturados e as ações de mouse/teclado
+vão para uma pasta, com os quadros guardados como diferenças compactadas
+em relação ao anterior:
+
+    RPA_RECORD=gravacoes/pedido python bot_vision.py tarefas.json
+    python recording.py record gravacoes/pedido tarefas.json
+
+Reprodução (sem display, ex.: Linux): a mesma lista de tarefas roda sobre
+os quadros gravados, com entrada simulada e relógio virtual (as pausas não
+esperam de verdade), muito mais rápido que o tempo real:
+
+    python recording.py run gravacoes/pedido tarefas.json
+    python recording.py info gravacoes/pedido
+
+Formato da pasta:
+  frames.bin    imagens PNG concatenadas (quadros-chave e recortes alterados)
+  events.jsonl  cabeçalho e um evento por linha, com o instante t em segundos:
+                {"type": "frame", "kind": "key" | "delta" | "same", "origin": [x, y],
+                 "shape": [h, w], "box": [x, y, w, h], "offset": n, "size": n}
+                {"type": "input", "action": "click", "args": ["left"]}
+
+Na reprodução os quadros avançam conforme as entradas: depois da k-ésima
+entrada simulada, a tela mostra o que foi gravado depois da k-ésima entrada
+gravada, no mesmo ritmo (em tempo virtual) da gravação, sem nunca adiantar
+quadros da entrada seguinte.
+"""
+import os
+import sys
+import json
+import atexit
+import bisect
+import hashlib
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+import numpy as np
+import cv2
+
+import clock
+import frame_source
+import input_channel
+import overlay
+
+FORMAT_VERSION = 1
+FRAMES_FILE = "frames.bin"
+EVENTS_FILE = "events.jsonl"
+# Grava um quadro completo a cada N quadros (limita o custo de decodificação)
+KEYFRAME_INTERVAL = 50
+# Acima desta fração da tela alterada, o quadro é gravado inteiro
+DELTA_MAX_AREA = 0.5
+# Diferença máxima (px) entre a posição do mouse gravada e a reproduzida
+MOVE_TOLERANCE = 3
+
+
+def _input_args(action, args):
+    """Argumentos gravados de uma ação. O texto colado é guardado só como resumo (pode ser senha)."""
+    if action == "move_to":
+        return [int(args[0]), int(args[1])]
+    if action == "paste":
+        text = args[0]
+        return [hashlib.sha256(text.encode("utf-8")).hexdigest()[:16], len(text)]
+    return list(args)
+
+
+def _encode_png(pixels):
+    ok, data = cv2.imencode(".png", cv2.cvtColor(pixels, cv2.COLOR_RGB2BGR))
+    if not ok:
+        raise ValueError("Falha ao codificar o quadro")
+    return data.tobytes()
+
+
+def _decode_png(data):
+    bgr = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+
+
+class SessionRecorder:
+    """Grava quadros (como diferenças) e entradas em uma pasta, com o instante de cada um."""
+
+    def __init__(self, folder, keyframe_interval=KEYFRAME_INTERVAL):
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.keyframe_interval = keyframe_interval
+        self.frames = 0
+        self._frames_file = open(os.path.join(folder, FRAMES_FILE), "wb")
+        self._events_file = open(os.path.join(folder, EVENTS_FILE), "w", encoding="utf-8")
+        self._offset = 0
+        self._previous = None
+        self._since_key = 0
+        self._lock = threading.Lock()
+        self._origin = clock.monotonic()
+        self._write({"type": "meta", "version": FORMAT_VERSION,
+                     "created": datetime.now().isoformat(timespec="seconds")})
+        logging.info(f"Gravando a execução em {folder}")
+
+    def _now(self):
+        return round(clock.monotonic() - self._origin, 4)
+
+    def _write(self, event):
+        self._events_file.write(json.dumps(event) + "\n")
+
+    def _store(self, data):
+        offset = self._offset
+        self._frames_file.write(data)
+        self._offset += len(data)
+        return offset, len(data)
+
+    def frame(self, pixels, origin):
+        """Registra um quadro capturado (quadro-chave, recorte alterado ou repetição)."""
+        pixels = np.asarray(pixels)
+        with self._lock:
+            if self._frames_file is None:
+                return
+            event = {"t": self._now(), "type": "frame", "origin": list(origin), "shape": list(pixels.shape[:2])}
+            previous = self._previous
+            box = None
+            if (previous is not None and previous.shape == pixels.shape
+                    and self._since_key < self.keyframe_interval):
+                changed = np.any(pixels != previous, axis=2)
+                rows, cols = np.flatnonzero(changed.any(axis=1)), np.flatnonzero(changed.any(axis=0))
+                if not len(rows):
+                    box = ()
+                else:
+                    box = (int(cols[0]), int(rows[0]), int(cols[-1] - cols[0] + 1), int(rows[-1] - rows[0] + 1))
+                    if box[2] * box[3] > DELTA_MAX_AREA * changed.size:
+                        box = None
+
+            if box is None:
+                event["kind"] = "key"
+                event["offset"], event["size"] = self._store(_encode_png(pixels))
+                self._since_key = 0
+            elif box:
+                x, y, w, h = box
+                event.update(kind="delta", box=list(box))
+                event["offset"], event["size"] = self._store(_encode_png(pixels[y:y + h, x:x + w]))
+                self._since_key += 1
+            else:
+                event["kind"] = "same"
+                self._since_key += 1
+            self._previous = pixels.copy()
+            self.frames += 1
+            self._write(event)
+
+    def input(self, action, *args):
+        """Registra uma ação de mouse ou teclado."""
+        with self._lock:
+            if self._events_file is not None:
+                self._write({"t": self._now(), "type": "input", "action": action,
+                             "args": _input_args(action, args)})
+
+    def close(self):
+        with self._lock:
+            if self._frames_file is None:
+                return
+            self._frames_file.close()
+            self._events_file.close()
+            self._frames_file = self._events_file = None
+        logging.info(f"Gravação encerrada: {self.frames} quadro(s) em {self.folder}")
+
+
+class RecordingFrameSource(frame_source.FrameSource):
+    """Fonte de quadros que repassa as capturas de outra fonte e as grava."""
+
+    def __init__(self, source, recorder):
+        self.source = source
+        self.recorder = recorder
+
+    def grab(self):
+        pixels, origin = self.source.grab()
+        self.recorder.frame(pixels, origin)
+        return pixels, origin
+
+    def close(self):
+        self.source.close()
+
+
+class RecordingInputChannel(input_channel.InputChannel):
+    """Canal de entrada que grava cada ação e a repassa ao canal real (se houver)."""
+
+    def __init__(self, channel, recorder):
+        self.channel = channel
+        self.recorder = recorder
+
+    def _do(self, action, *args):
+        self.recorder.input(action, *args)
+        if self.channel is not None:
+            getattr(self.channel, action)(*args)
+
+    def move_to(self, x, y, duration=0.0):
+        self._do("move_to", x, y, duration)
+
+    def click(self, button="left"):
+        self._do("click", button)
+
+    def double_click(self):
+        self._do("double_click")
+
+    def hotkey(self, *keys):
+        self._do("hotkey", *keys)
+
+    def press(self, key):
+        self._do("press", key)
+
+    def paste(self, text):
+        self._do("paste", text)
+
+
+class Recording:
+    """
+    Leitura de uma gravação. Os quadros são reconstruídos em sequência a
+    partir do quadro-chave anterior; só o último quadro decodificado fica em
+    memória.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.meta = {}
+        self.frames = []
+        self.inputs = []
+        with open(os.path.join(folder, EVENTS_FILE), "r", encoding="utf-8") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if event["type"] == "meta":
+                    self.meta = event
+                elif event["type"] == "frame":
+                    self.frames.append(event)
+                elif event["type"] == "input":
+                    self.inputs.append(event)
+        if self.meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Versão de gravação não suportada em {folder}: {self.meta.get('version')}")
+        if not self.frames:
+            raise ValueError(f"Gravação sem quadros: {folder}")
+        if self.frames[0]["kind"] != "key":
+            raise ValueError(f"Gravação sem quadro-chave inicial: {folder}")
+        self.frame_times = [event["t"] for event in self.frames]
+        self.keyframes = [i for i, event in enumerate(self.frames) if event["kind"] == "key"]
+        self._data = open(os.path.join(folder, FRAMES_FILE), "rb")
+        self._index = -1
+        self._pixels = None
+        self._lock = threading.Lock()
+
+    @property
+    def duration(self):
+        return max(self.frame_times[-1], self.inputs[-1]["t"] if self.inputs else 0.0)
+
+    def _read(self, event):
+        self._data.seek(event["offset"])
+        return _decode_png(self._data.read(event["size"]))
+
+    def frame(self, index):
+        """Pixels (somente leitura) e origem do quadro de número index."""
+        with self._lock:
+            key = self.keyframes[bisect.bisect_right(self.keyframes, index) - 1]
+            if index < self._index or key > self._index:
+                # Recomeça do quadro-chave anterior em vez de aplicar todas as diferenças
+                self._index = key - 1
+            while self._index < index:
+                self._index += 1
+                event = self.frames[self._index]
+                if event["kind"] == "key":
+                    self._pixels = self._read(event)
+                elif event["kind"] == "delta":
+                    x, y, w, h = event["box"]
+                    pixels = self._pixels.copy()
+                    pixels[y:y + h, x:x + w] = self._read(event)
+                    self._pixels = pixels
+                self._pixels.flags.writeable = False
+            return self._pixels, tuple(self.frames[index]["origin"])
+
+    def info(self):
+        kinds = {"key": 0, "delta": 0, "same": 0}
+        for event in self.frames:
+            kinds[event["kind"]] += 1
+        return {"created": self.meta.get("created"), "duration": self.duration, "frames": len(self.frames),
+                **kinds, "inputs": len(self.inputs),
+                "bytes": os.path.getsize(os.path.join(self.folder, FRAMES_FILE))}
+
+    def close(self):
+        self._data.close()
+
+
+class ReplaySession:
+    """
+    Reprodução de uma gravação: fornece a fonte de quadros e o canal de
+    entrada simulado e compara cada entrada com a gravada.
+    """
+
+    def __init__(self, folder):
+        self.recording = Recording(folder)
+        self.divergences = []
+        self.frames_served = 0
+        self._inputs = 0
+        self._last_index = 0
+        self._lock = threading.Lock()
+        self._started = clock.monotonic()
+        # Início do trecho atual: instante da última entrada na reprodução e na gravação
+        self._segment_replay = self._started
+        self._segment_recorded = 0.0
+        logging.info(f"Reproduzindo a gravação {folder} ({len(self.recording.frames)} quadro(s), "
+                     f"{len(self.recording.inputs)} entrada(s))")
+
+    def frame_source(self):
+        return ReplayFrameSource(self)
+
+    def input_channel(self):
+        return SimulatedInputChannel(self)
+
+    def grab(self):
+        """Quadro gravado correspondente ao instante atual do trecho."""
+        with self._lock:
+            inputs = self.recording.inputs
+            recorded = self._segment_recorded + (clock.monotonic() - self._segment_replay)
+            if self._inputs < len(inputs):
+                # Quadros posteriores à próxima entrada só aparecem depois dela
+                recorded = min(recorded, inputs[self._inputs]["t"] - 1e-6)
+            index = bisect.bisect_right(self.recording.frame_times, recorded) - 1
+            index = max(index, self._last_index)
+            self._last_index = index
+            self.frames_served += 1
+        return self.recording.frame(index)
+
+    def on_input(self, action, *args):
+        """Registra a entrada simulada, compara com a gravada e avança para o próximo trecho."""
+        args = _input_args(action, args)
+        divergence = None
+        with self._lock:
+            inputs = self.recording.inputs
+            position = self._inputs
+            if position >= len(inputs):
+                divergence = f"entrada extra {action}{args}"
+            else:
+                expected = inputs[position]
+                if not self._same_input(action, args, expected):
+                    divergence = f"{action}{args} em vez de {expected['action']}{expected['args']}"
+                self._segment_recorded = expected["t"]
+                self._segment_replay = clock.monotonic()
+            self._inputs += 1
+            if divergence:
+                self.divergences.append(divergence)
+        if divergence:
+            logging.warning(f"Reprodução divergiu na entrada {position + 1}: {divergence}")
+
+    @staticmethod
+    def _same_input(action, args, expected):
+        if action != expected["action"]:
+            return False
+        if action == "move_to":
+            return all(abs(a - b) <= MOVE_TOLERANCE for a, b in zip(args, expected["args"]))
+        return args == expected["args"]
+
+    def report(self):
+        """Tempos e contagens da reprodução até agora."""
+        current = clock.get_clock()
+        virtual = clock.monotonic() - self._started
+        real = current.real_elapsed() if isinstance(current, clock.VirtualClock) else virtual
+        missing = max(0, len(self.recording.inputs) - self._inputs)
+        return {
+            "recorded_seconds": self.recording.duration,
+            "virtual_seconds": virtual,
+            "real_seconds": real,
+            "speedup": virtual / real if real else 0.0,
+            "frames_served": self.frames_served,
+            "inputs": self._inputs,
+            "missing_inputs": missing,
+            "divergences": list(self.divergences),
+        }
+
+    def log_report(self):
+        r = self.report()
+        logging.info(f"Reprodução: {r['virtual_seconds']:.2f}s em tempo virtual (gravação: "
+                     f"{r['recorded_seconds']:.2f}s) executados em {r['real_seconds']:.2f}s reais "
+                     f"({r['speedup']:.1f}x); {r['inputs']} entrada(s), {r['frames_served']} captura(s).")
+        if r["missing_inputs"]:
+            logging.warning(f"Reprodução terminou com {r['missing_inputs']} entrada(s) gravada(s) não executada(s).")
+        if r["divergences"]:
+            logging.warning(f"Reprodução com {len(r['divergences'])} divergência(s) em relação à gravação.")
+
+
+class ReplayFrameSource(frame_source.FrameSource):
+    def __init__(self, session):
+        self.session = session
+
+    def grab(self):
+        return self.session.grab()
+
+    def close(self):
+        self.session.recording.close()
+
+
+class SimulatedInputChannel(input_channel.InputChannel):
+    """Entrada simulada: nada é enviado ao sistema, só avança a reprodução."""
+
+    def __init__(self, session):
+        self.session = session
+
+    def move_to(self, x, y, duration=0.0):
+        self.session.on_input("move_to", x, y, duration)
+
+    def click(self, button="left"):
+        self.session.on_input("click", button)
+
+    def double_click(self):
+        self.session.on_input("double_click")
+
+    def hotkey(self, *keys):
+        self.session.on_input("hotkey", *keys)
+
+    def press(self, key):
+        self.session.on_input("press", key)
+
+    def paste(self, text):
+        self.session.on_input("paste", text)
+
+
+_session = None
+
+
+def get_session():
+    """Gravação (SessionRecorder) ou reprodução (ReplaySession) ativa no processo, ou None."""
+    return _session
+
+
+def from_environment(source_factory, channel_factory):
+    """
+    Fonte de quadros e canal de entrada do processo. RPA_REPLAY=pasta
+    reproduz a gravação (sem criar a captura nem a entrada reais) com o
+    relógio virtual; RPA_RECORD=pasta grava a execução real. Retorna
+    (fonte, canal).
+    """
+    global _session
+    replay_folder = os.environ.get("RPA_REPLAY")
+    record_folder = os.environ.get("RPA_RECORD")
+    if replay_folder:
+        clock.set_clock(clock.VirtualClock())
+        overlay.set_enabled(False)
+        _session = ReplaySession(replay_folder)
+        atexit.register(_session.log_report)
+        return _session.frame_source(), _session.input_channel()
+
+    source, channel = source_factory(), channel_factory()
+    if record_folder:
+        _session = SessionRecorder(record_folder)
+        atexit.register(_session.close)
+        return RecordingFrameSource(source, _session), RecordingInputChannel(channel, _session)
+    return source, channel
+
+
+def _run_tasks(path):
+    """
+    Importa o bot_vision (já com RPA_RECORD/RPA_REPLAY definidos), executa as
+    tarefas e retorna a sessão de gravação ou reprodução criada por ele.
+    """
+    import bot_vision
+    if path:
+        bot_vision.run_task_file(path)
+    else:
+        bot_vision.click_images(bot_vision.tasks)
+        bot_vision.finish_run()
+    # Executado como script, este arquivo é o __main__; a sessão fica no módulo importado
+    return bot_vision.recording.get_session()
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Gravação e reprodução de execuções do bot_vision.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("record", "Executa as tarefas no desktop real gravando quadros e entradas"),
+                            ("run", "Reproduz as tarefas sobre uma gravação, sem display")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("folder")
+        command.add_argument("tasks", nargs="?", help="Arquivo de tarefas (padrão: tarefas do planresult_tasks)")
+    info = commands.add_parser("info", help="Mostra o conteúdo de uma gravação")
+    info.add_argument("folder")
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        recording = Recording(args.folder)
+        for key, value in recording.info().items():
+            print(f"{key}: {value}")
+        recording.close()
+        return 0
+
+    if args.command == "run":
+        # A reprodução costuma rodar fora do Windows: usa o Tesseract deste sistema
+        # e avisa logo se ele não funciona, em vez de cada passo de texto falhar
+        import ocr_engine
+        ocr_engine.configure_tesseract()
+        error = ocr_engine.check_tesseract()
+        if error:
+            logging.error(f"Tesseract indisponível ({error}); os passos de texto vão falhar na reprodução. "
+                          "Configure RPA_TESSERACT_CMD/TESSDATA_PREFIX.")
+    os.environ["RPA_RECORD" if args.command == "record" else "RPA_REPLAY"] = args.folder
+    session = _run_tasks(args.tasks)
+    if args.command == "run":
+        report = session.report()
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return 1 if report["divergences"] or report["missing_inputs"] else 0
+    session.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
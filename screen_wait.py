@@ -0,0 +1,62 @@
+import logging
+
+import clock
+from ocr_cache import frame_thumbnail, changed_fraction
+
+# Intervalo entre capturas durante a espera
+POLL_INTERVAL = 0.05
+# Fração de pixels da miniatura que pode mudar sem contar como alteração
+CHANGE_TOLERANCE = 0.001
+# Tempo que a região precisa ficar sem mudanças para ser considerada estável
+STABLE_FOR = 0.25
+
+
+def wait_until_stable(grabber, region=None, timeout=1.0, stable_for=STABLE_FOR,
+                      poll=POLL_INTERVAL, tolerance=CHANGE_TOLERANCE):
+    """
+    Espera até a região (ou a tela inteira, se region for None) ficar sem
+    mudanças por stable_for segundos. timeout é o limite superior da espera.
+    Retorna True se a tela estabilizou e False se o tempo acabou.
+    """
+    started = clock.monotonic()
+    deadline = started + timeout
+    stable_for = min(stable_for, timeout)
+    previous = frame_thumbnail(grabber.region(region, max_age=0))
+    stable_since = clock.monotonic()
+
+    while True:
+        now = clock.monotonic()
+        if now - stable_since >= stable_for:
+            logging.debug(f"Tela estável após {now - started:.2f}s")
+            return True
+        if now >= deadline:
+            logging.debug(f"Tela não estabilizou em {timeout:.2f}s")
+            return False
+        clock.sleep(min(poll, max(0.0, deadline - now)))
+        current = frame_thumbnail(grabber.region(region, max_age=0))
+        if changed_fraction(previous, current) > tolerance:
+            stable_since = clock.monotonic()
+        previous = current
+
+
+def wait_for_change(grabber, region=None, reference=None, timeout=1.0,
+                    poll=POLL_INTERVAL, tolerance=CHANGE_TOLERANCE):
+    """
+    Espera até a região mudar em relação a reference (pixels de uma captura
+    anterior; se None, usa o quadro atual do grabber). timeout é o limite
+    superior da espera. Retorna True se houve mudança e False se o tempo acabou.
+    """
+    started = clock.monotonic()
+    deadline = started + timeout
+    if reference is None:
+        reference = grabber.region(region, max_age=float("inf"))
+    reference = frame_thumbnail(reference)
+
+    while True:
+        now = clock.monotonic()
+        if now >= deadline:
+            return False
+        clock.sleep(min(poll, max(0.0, deadline - now)))
+        if changed_fraction(reference, frame_thumbnail(grabber.region(region, max_age=0))) > tolerance:
+            logging.debug(f"Região {region} mudou após {clock.monotonic() - started:.2f}s")
+            return True
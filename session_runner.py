@@ -0,0 +1,400 @@
+"""
+Execução de vários bots ao mesmo tempo, cada um em uma sessão de desktop
+isolada, consumindo uma fila central de itens de trabalho.
+
+Modos:
+  - Xvfb (Linux): o coordenador cria N displays virtuais e um processo
+    trabalhador por display, cada um com sua captura de tela e entrada:
+        python session_runner.py run --xvfb 4 tarefas/*.json
+  - RDP (Windows): o coordenador só publica a fila; em cada sessão RDP da VM
+    (docker-compose.yml permite várias conexões) roda um trabalhador:
+        python session_runner.py serve --host 0.0.0.0 --port 50000 tarefas/*.json
+        python session_runner.py worker --address host:50000 --name rdp-1
+
+O coordenador aceita objetos serializados com pickle de quem conhece a chave,
+então serve e worker exigem RPA_SESSION_AUTHKEY (a mesma nos dois lados) e o
+coordenador escuta só em 127.0.0.1 salvo --host explícito. O modo run, em que
+coordenador e trabalhadores são processos locais, gera uma chave aleatória.
+
+Cada item de trabalho é um arquivo de tarefas (ver task_graph.py), executado
+com bot_vision.run_task_file na sessão do trabalhador.
+"""
+import os
+import sys
+import time
+import queue
+import shutil
+import logging
+import secrets
+import threading
+import argparse
+import subprocess
+import multiprocessing
+from multiprocessing.managers import BaseManager, DictProxy
+
+DEFAULT_PORT = 50000
+AUTHKEY_ENV = "RPA_SESSION_AUTHKEY"
+# Primeiro número de display usado pelas sessões Xvfb (:99, :100, ...)
+FIRST_DISPLAY = 99
+SCREEN_SIZE = "1920x1080x24"
+# Intervalo dos batimentos dos trabalhadores e tempo sem batimento para
+# considerar a sessão travada
+HEARTBEAT_INTERVAL = 2.0
+HEARTBEAT_TIMEOUT = 30.0
+# Duração máxima (s) de um item; além dela a sessão é considerada travada
+# mesmo que continue enviando batimentos
+ITEM_TIMEOUT = float(os.environ.get("RPA_ITEM_TIMEOUT", 1800))
+# Quantas vezes um item é devolvido à fila após falhas da sessão
+MAX_ITEM_RETRIES = 2
+# Intervalo entre os relatórios de métricas do coordenador
+METRICS_INTERVAL = 30.0
+
+_work_queue = queue.Queue()
+_result_queue = queue.Queue()
+_sessions = {}
+
+
+class SessionManager(BaseManager):
+    """Fila central de trabalho, fila de resultados e estado das sessões."""
+
+
+def _get_work_queue():
+    return _work_queue
+
+
+def _get_result_queue():
+    return _result_queue
+
+
+def _get_sessions():
+    return _sessions
+
+
+SessionManager.register("work_queue", callable=_get_work_queue)
+SessionManager.register("result_queue", callable=_get_result_queue)
+SessionManager.register("sessions", callable=_get_sessions, proxytype=DictProxy)
+
+
+def _parse_address(address):
+    host, _, port = address.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+def get_authkey(required=True):
+    """
+    Chave de autenticação do coordenador, lida de RPA_SESSION_AUTHKEY. Sem a
+    variável, lança RuntimeError se required, ou gera uma chave aleatória
+    (só serve quando coordenador e trabalhadores são processos locais).
+    """
+    key = os.environ.get(AUTHKEY_ENV)
+    if key:
+        return key.encode()
+    if required:
+        raise RuntimeError(f"Defina {AUTHKEY_ENV} com a mesma chave no coordenador e nos trabalhadores")
+    return secrets.token_hex(32).encode()
+
+
+def connect(address, authkey=None):
+    """Conecta a um coordenador já iniciado."""
+    authkey = authkey or get_authkey()
+    manager = SessionManager(address=address, authkey=authkey)
+    manager.connect()
+    return manager
+
+
+class XvfbSession:
+    """Display virtual do Xvfb usado por uma sessão no Linux."""
+
+    def __init__(self, number, size=SCREEN_SIZE):
+        self.number = number
+        self.display = f":{number}"
+        self.size = size
+        self.process = None
+
+    def start(self, timeout=10.0):
+        if shutil.which("Xvfb") is None:
+            raise RuntimeError("Xvfb não encontrado; instale-o para usar sessões virtuais")
+        self.process = subprocess.Popen(
+            ["Xvfb", self.display, "-screen", "0", self.size, "-nolisten", "tcp"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        socket_path = f"/tmp/.X11-unix/X{self.number}"
+        deadline = time.monotonic() + timeout
+        while not os.path.exists(socket_path):
+            if self.process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"Xvfb não iniciou no display {self.display}")
+            time.sleep(0.1)
+        return self
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        if self.alive():
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+def _health_check(bot_vision):
+    """A sessão está saudável se consegue capturar um quadro da tela."""
+    frame = bot_vision.FRAME_GRABBER.grab()
+    return frame.pixels.size > 0
+
+
+def worker_main(address, name, display=None, authkey=None):
+    """
+    Laço do trabalhador: retira itens da fila central, executa-os na sessão
+    atual e publica resultados e batimentos. Com display, a captura e a
+    entrada são direcionadas a esse display X antes de importar o bot_vision.
+    """
+    if display:
+        os.environ["DISPLAY"] = display
+        if shutil.which("xdotool"):
+            os.environ["RPA_INPUT_DISPLAY"] = display
+    # O overlay não tem utilidade em sessões sem acompanhamento
+    os.environ.setdefault("RPA_OVERLAY", "0")
+    import bot_vision
+
+    manager = connect(address, authkey)
+    work, results, sessions = manager.work_queue(), manager.result_queue(), manager.sessions()
+    state = {"state": "idle", "item": None, "item_started": None, "heartbeat": time.time(),
+             "done": 0, "failed": 0, "pid": os.getpid()}
+    lock = threading.Lock()
+
+    def beat(**changes):
+        with lock:
+            state.update(changes, heartbeat=time.time())
+            sessions[name] = dict(state)
+
+    def beat_while(stop):
+        # Batimentos durante a execução de um item, que pode levar bem mais
+        # que HEARTBEAT_TIMEOUT
+        while not stop.wait(HEARTBEAT_INTERVAL):
+            try:
+                beat()
+            except Exception as e:
+                logging.debug(f"[{name}] Falha ao enviar batimento: {e}")
+
+    beat()
+    while True:
+        try:
+            item = work.get(timeout=HEARTBEAT_INTERVAL)
+        except queue.Empty:
+            beat()
+            continue
+        if item is None:
+            beat(state="stopped", item=None)
+            return
+
+        try:
+            healthy = _health_check(bot_vision)
+        except Exception as e:
+            logging.error(f"[{name}] Falha na verificação de saúde: {e}")
+            healthy = False
+        if not healthy:
+            beat(state="unhealthy")
+            work.put(item)
+            return
+
+        beat(state="busy", item=item["id"], item_started=time.time())
+        started = time.monotonic()
+        error = None
+        stop = threading.Event()
+        beater = threading.Thread(target=beat_while, args=(stop,), name="heartbeat", daemon=True)
+        beater.start()
+        try:
+            outputs = bot_vision.run_task_file(item["path"])
+        except Exception as e:
+            logging.error(f"[{name}] Erro no item {item['id']}: {e}")
+            outputs, error = None, str(e)
+        finally:
+            stop.set()
+            beater.join()
+        elapsed = time.monotonic() - started
+        ok = error is None
+        beat(state="idle", item=None, item_started=None,
+             done=state["done"] + ok, failed=state["failed"] + (not ok))
+        results.put({"id": item["id"], "session": name, "ok": ok, "seconds": elapsed,
+                     "error": error, "outputs": outputs})
+
+
+class SessionMetrics:
+    """Métricas agregadas de todas as sessões (vazão, duração, falhas)."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.completed = 0
+        self.failed = 0
+        self.total_seconds = 0.0
+        self.per_session = {}
+
+    def record(self, result):
+        counts = self.per_session.setdefault(result["session"], {"done": 0, "failed": 0})
+        if result["ok"]:
+            self.completed += 1
+            counts["done"] += 1
+        else:
+            self.failed += 1
+            counts["failed"] += 1
+        self.total_seconds += result["seconds"]
+
+    def summary(self):
+        elapsed = max(1e-9, time.monotonic() - self.started)
+        finished = self.completed + self.failed
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "elapsed": elapsed,
+            "items_per_minute": 60.0 * finished / elapsed,
+            "mean_item_seconds": self.total_seconds / finished if finished else 0.0,
+            "sessions": dict(self.per_session),
+        }
+
+    def log(self):
+        s = self.summary()
+        logging.info(f"Sessões: {s['completed']} item(ns) concluído(s), {s['failed']} com falha, "
+                     f"{s['items_per_minute']:.1f} item(ns)/min, média de {s['mean_item_seconds']:.1f}s por item.")
+
+
+class SessionRunner:
+    """
+    Coordenador: publica os itens na fila central, acompanha os batimentos
+    das sessões, devolve à fila os itens de sessões travadas ou mortas e
+    agrega as métricas. Com xvfb > 0 também cria e reinicia as sessões Xvfb
+    locais; sem elas, espera trabalhadores externos (ex.: sessões RDP).
+    """
+
+    def __init__(self, paths, xvfb=0, address=("127.0.0.1", DEFAULT_PORT), authkey=None):
+        # Sem chave definida, só trabalhadores locais (Xvfb) podem se conectar
+        authkey = authkey or get_authkey(required=not xvfb)
+        self.items = {f"item-{n + 1}": {"id": f"item-{n + 1}", "path": path} for n, path in enumerate(paths)}
+        self.xvfb = xvfb
+        self.address = address
+        self.authkey = authkey
+        self.manager = SessionManager(address=address, authkey=authkey)
+        self.metrics = SessionMetrics()
+        self.retries = {}
+        self.workers = {}
+
+    def _spawn(self, index):
+        name = f"xvfb-{index + 1}"
+        session = XvfbSession(FIRST_DISPLAY + index).start()
+        # spawn: o trabalhador importa o bot_vision já com o DISPLAY da sessão
+        process = multiprocessing.get_context("spawn").Process(
+            target=worker_main, args=(self.address, name, session.display, self.authkey), name=name, daemon=True)
+        process.start()
+        self.workers[name] = (index, session, process)
+        logging.info(f"Sessão {name} iniciada no display {session.display}.")
+
+    def _requeue(self, work, item_id, reason):
+        if item_id is None or item_id not in self.items:
+            return
+        self.retries[item_id] = self.retries.get(item_id, 0) + 1
+        if self.retries[item_id] > MAX_ITEM_RETRIES:
+            logging.error(f"Item {item_id} descartado após {MAX_ITEM_RETRIES} falhas de sessão ({reason}).")
+            self.metrics.record({"id": item_id, "session": "-", "ok": False, "seconds": 0.0})
+            self.items.pop(item_id)
+            return
+        logging.warning(f"Devolvendo o item {item_id} à fila: {reason}.")
+        work.put(self.items[item_id])
+
+    def _check_sessions(self, work, sessions):
+        now = time.time()
+        for name, state in list(sessions.items()):
+            if state.get("state") == "stopped":
+                continue
+            stale = now - state.get("heartbeat", now) > HEARTBEAT_TIMEOUT
+            started = state.get("item_started")
+            overdue = started is not None and now - started > ITEM_TIMEOUT
+            local = self.workers.get(name)
+            dead = local is not None and (not local[2].is_alive() or not local[1].alive())
+            if not (stale or overdue or dead or state.get("state") == "unhealthy"):
+                continue
+            if overdue:
+                logging.warning(f"Item {state.get('item')} na sessão {name} passou de {ITEM_TIMEOUT:.0f}s.")
+            if state.get("item"):
+                self._requeue(work, state["item"], f"sessão {name} sem resposta")
+            sessions[name] = dict(state, state="stopped", item=None)
+            if local is not None:
+                index, session, process = local
+                process.terminate()
+                session.stop()
+                logging.warning(f"Reiniciando a sessão {name}.")
+                self._spawn(index)
+
+    def run(self):
+        """Processa todos os itens e retorna o resumo das métricas."""
+        self.manager.start()
+        work, results, sessions = self.manager.work_queue(), self.manager.result_queue(), self.manager.sessions()
+        for item in self.items.values():
+            work.put(item)
+        try:
+            for index in range(self.xvfb):
+                self._spawn(index)
+            if not self.xvfb:
+                logging.info(f"Aguardando trabalhadores em {self.address[0]}:{self.address[1]}.")
+
+            pending = set(self.items)
+            last_report = time.monotonic()
+            while pending & set(self.items):
+                try:
+                    result = results.get(timeout=HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    result = None
+                if result is not None and result["id"] in pending:
+                    pending.discard(result["id"])
+                    self.metrics.record(result)
+                    status = "ok" if result["ok"] else f"falha: {result['error']}"
+                    logging.info(f"Item {result['id']} ({result['session']}) em {result['seconds']:.1f}s: {status}")
+                self._check_sessions(work, sessions)
+                if time.monotonic() - last_report >= METRICS_INTERVAL:
+                    self.metrics.log()
+                    last_report = time.monotonic()
+        finally:
+            for _ in range(max(len(self.workers), len(sessions.keys()))):
+                work.put(None)
+            for _, session, process in self.workers.values():
+                process.join(timeout=10)
+                session.stop()
+            self.manager.shutdown()
+        self.metrics.log()
+        return self.metrics.summary()
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Executa arquivos de tarefas em várias sessões de desktop.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="coordenador com sessões Xvfb locais")
+    run.add_argument("paths", nargs="+")
+    run.add_argument("--xvfb", type=int, default=2)
+    run.add_argument("--port", type=int, default=DEFAULT_PORT)
+
+    serve = commands.add_parser("serve", help="coordenador para trabalhadores externos (ex.: RDP)")
+    serve.add_argument("paths", nargs="+")
+    serve.add_argument("--host", default="127.0.0.1",
+                       help="interface de escuta (0.0.0.0 para aceitar trabalhadores de outras máquinas)")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+
+    worker = commands.add_parser("worker", help="trabalhador na sessão atual")
+    worker.add_argument("--address", default=f"127.0.0.1:{DEFAULT_PORT}")
+    worker.add_argument("--name", default=f"{os.environ.get('COMPUTERNAME', 'sessao')}-{os.getpid()}")
+    worker.add_argument("--display")
+
+    args = parser.parse_args(argv)
+    if args.command != "run" and not os.environ.get(AUTHKEY_ENV):
+        parser.error(f"defina {AUTHKEY_ENV} com a mesma chave no coordenador e nos trabalhadores")
+    if args.command == "worker":
+        worker_main(_parse_address(args.address), args.name, args.display)
+        return 0
+    host = "127.0.0.1" if args.command == "run" else args.host
+    runner = SessionRunner(args.paths, xvfb=args.xvfb if args.command == "run" else 0, address=(host, args.port))
+    summary = runner.run()
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
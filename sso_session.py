@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import logging
+import threading
+from urllib.parse import urlsplit
+
+# Arquivo com o estado autenticado (cookies e storage) do SSO. Contém
+# credenciais de sessão: não deve ser versionado nem compartilhado.
+DEFAULT_SESSION_PATH = os.environ.get("RPA_SSO_SESSION", "sso_session.json")
+# Validade máxima de um estado salvo, mesmo que os cookies durem mais
+DEFAULT_TTL = float(os.environ.get("RPA_SSO_TTL", 4 * 3600))
+# Campos dos cookies aceitos pelo driver.add_cookie
+COOKIE_FIELDS = ("name", "value", "path", "domain", "secure", "httpOnly", "expiry", "sameSite")
+
+_DUMP_STORAGE = """
+try {
+    var dump = function (s) { var o = {}; for (var i = 0; i < s.length; i++) { var k = s.key(i); o[k] = s.getItem(k); } return o; };
+    return JSON.stringify({local: dump(window.localStorage), session: dump(window.sessionStorage)});
+} catch (e) { return '{}'; }
+"""
+
+_LOAD_STORAGE = """
+try {
+    var data = JSON.parse(arguments[0]);
+    for (var k in (data.local || {})) { window.localStorage.setItem(k, data.local[k]); }
+    for (var k in (data.session || {})) { window.sessionStorage.setItem(k, data.session[k]); }
+} catch (e) {}
+"""
+
+
+def origin_of(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class SsoSessionStore:
+    """
+    Estado autenticado do SSO salvo em disco: cookies, localStorage e
+    sessionStorage de cada origem aberta no navegador, com a data de
+    expiração (a menor entre a dos cookies e saved_at + ttl).
+
+    Formato do arquivo:
+        {"saved_at": ..., "expires_at": ...,
+         "origins": {"https://sso.exemplo.com": {"cookies": [...], "storage": {...}}}}
+    """
+
+    def __init__(self, path=DEFAULT_SESSION_PATH, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Estado salvo ainda válido, ou None se não existe ou expirou."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if time.time() >= state.get("expires_at", 0):
+            logging.info("Sessão SSO salva expirou.")
+            return None
+        return state
+
+    def clear(self):
+        with self._lock:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _capture_origin(driver):
+        cookies = [{k: c[k] for k in COOKIE_FIELDS if k in c} for c in driver.get_cookies()]
+        try:
+            storage = json.loads(driver.execute_script(_DUMP_STORAGE) or "{}")
+        except Exception:
+            storage = {}
+        return {"cookies": cookies, "storage": storage}
+
+    def save(self, webbot):
+        """Salva o estado de todas as abas abertas (uma entrada por origem)."""
+        driver = webbot.driver
+        current = driver.current_window_handle
+        origins = {}
+        try:
+            for handle in driver.window_handles:
+                driver.switch_to.window(handle)
+                url = driver.current_url
+                if url.startswith("http") and origin_of(url) not in origins:
+                    origins[origin_of(url)] = self._capture_origin(driver)
+        finally:
+            driver.switch_to.window(current)
+
+        saved_at = time.time()
+        expires_at = saved_at + self.ttl
+        for entry in origins.values():
+            for cookie in entry["cookies"]:
+                if "expiry" in cookie:
+                    expires_at = min(expires_at, cookie["expiry"])
+        state = {"saved_at": saved_at, "expires_at": expires_at, "origins": origins}
+
+        with self._lock:
+            tmp_path = self.path + ".tmp"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(state, file)
+            os.replace(tmp_path, self.path)
+        logging.info(f"Sessão SSO salva para {len(origins)} origem(ns), válida até "
+                     f"{time.strftime('%H:%M:%S', time.localtime(expires_at))}.")
+        return state
+
+    def restore(self, webbot, state=None):
+        """
+        Aplica o estado salvo no navegador: abre cada origem, recria os cookies
+        e o storage. Retorna False se não há estado válido.
+        """
+        state = state or self.load()
+        if state is None:
+            return False
+        driver = webbot.driver
+        for origin, entry in state["origins"].items():
+            # Cookies só podem ser criados com uma página da própria origem aberta
+            driver.get(origin + "/")
+            for cookie in entry["cookies"]:
+                try:
+                    driver.add_cookie(cookie)
+                except Exception:
+                    # Alguns drivers (ex.: IE) rejeitam o domínio explícito
+                    try:
+                        driver.add_cookie({k: v for k, v in cookie.items() if k != "domain"})
+                    except Exception as e:
+                        logging.debug(f"Cookie {cookie.get('name')} não restaurado em {origin}: {e}")
+            if entry.get("storage"):
+                driver.execute_script(_LOAD_STORAGE, json.dumps(entry["storage"]))
+        logging.info(f"Sessão SSO restaurada em {len(state['origins'])} origem(ns).")
+        return True
+
+    def resume(self, webbot, url, validate, timeout=10.0):
+        """
+        Restaura o estado salvo, abre url e confirma com validate(webbot) que
+        a sessão ainda está autenticada (tentando até timeout segundos).
+        Se a validação falhar, o estado salvo é descartado e retorna False.
+        """
+        if not self.restore(webbot):
+            return False
+        webbot.browse(url)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                if validate(webbot):
+                    logging.info("Sessão SSO reaproveitada; login completo não é necessário.")
+                    return True
+            except Exception as e:
+                logging.debug(f"Validação da sessão SSO: {e}")
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(0.5)
+        logging.info("Sessão SSO salva não é mais válida; refazendo o login.")
+        self.clear()
+        return False
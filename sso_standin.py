@@ -0,0 +1,99 @@
+"""
+Página de SSO substituta, local, para testar o SsoSessionStore sem o SSO real.
+
+    python sso_standin.py --port 8765 --ttl 600
+
+GET /        sem sessão: formulário de login (campos USER e LDAPPASSWORD, os
+             mesmos ids do SSO real); com sessão: portal com o link GQIS
+POST /login  cria a sessão (cookie SSO_TOKEN + token no localStorage)
+GET /logout  encerra a sessão no servidor, invalidando o cookie salvo
+"""
+import time
+import secrets
+import argparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from http.cookies import SimpleCookie
+
+LOGIN_PAGE = """<html><body>
+<form method="post" action="/login">
+  <input id="USER" name="USER"><input id="LDAPPASSWORD" name="LDAPPASSWORD" type="password">
+  <button id="OTP" type="submit">OTP</button>
+</form></body></html>"""
+
+PORTAL_PAGE = """<html><body>
+<script>window.localStorage.setItem('sso_token', '{token}');</script>
+<a title="GQIS" href="/gqis">GQIS</a>
+</body></html>"""
+
+
+class StandInSso:
+    """Sessões do SSO substituto: token -> instante de expiração."""
+
+    def __init__(self, ttl=600):
+        self.ttl = ttl
+        self.sessions = {}
+
+    def create(self):
+        token = secrets.token_hex(16)
+        self.sessions[token] = time.time() + self.ttl
+        return token
+
+    def valid(self, token):
+        return token is not None and self.sessions.get(token, 0) > time.time()
+
+
+def make_handler(sso):
+    class Handler(BaseHTTPRequestHandler):
+        def _token(self):
+            cookie = SimpleCookie(self.headers.get("Cookie", ""))
+            return cookie["SSO_TOKEN"].value if "SSO_TOKEN" in cookie else None
+
+        def _send(self, body, status=200, headers=()):
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            token = self._token()
+            if self.path == "/logout":
+                sso.sessions.pop(token, None)
+                self._send("", 302, [("Location", "/")])
+            elif sso.valid(token):
+                self._send(PORTAL_PAGE.format(token=token))
+            else:
+                self._send(LOGIN_PAGE)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            token = sso.create()
+            self._send("", 302, [("Set-Cookie", f"SSO_TOKEN={token}; Max-Age={sso.ttl}; Path=/"),
+                                 ("Location", "/")])
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(port=8765, ttl=600):
+    """Inicia o SSO substituto em 127.0.0.1:port (bloqueia). Retorna o servidor ao encerrar."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(StandInSso(ttl)))
+    print(f"SSO substituto em http://127.0.0.1:{port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="SSO substituto para testes da sessão salva.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttl", type=int, default=600)
+    args = parser.parse_args()
+    serve(args.port, args.ttl)
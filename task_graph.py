@@ -0,0 +1,379 @@
+import os
+import re
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import ocr_cache
+
+# Ações dos passos. "click" localiza e clica (como as tarefas do click_images);
+# "find" apenas localiza o alvo e "read" lê o texto de uma região. Os passos
+# somente leitura não alteram a tela e rodam em paralelo entre si.
+READ_ONLY_ACTIONS = ("find", "read")
+ACTIONS = ("click",) + READ_ONLY_ACTIONS
+
+# Limite de backtrackings por passo, como no click_images
+MAX_BACKTRACKS = 2
+# Passos somente leitura executados ao mesmo tempo
+DEFAULT_READ_WORKERS = 4
+
+# Chaves do passo que pertencem ao grafo e não à tarefa
+GRAPH_KEYS = ("id", "depends_on", "when", "output", "action", "backtrack")
+
+PENDING, DONE, FAILED, SKIPPED = "pending", "done", "failed", "skipped"
+FINISHED = (DONE, FAILED, SKIPPED)
+
+# Referência a uma saída nomeada dentro de 'text' ou 'sendtext': ${nome}
+_OUTPUT_REF = re.compile(r"\$\{(\w+)\}")
+
+
+def _as_region(value):
+    return tuple(value) if isinstance(value, list) else value
+
+
+class Step:
+    """
+    Passo do grafo: uma tarefa no formato do click_images mais as chaves do
+    grafo (id, depends_on, when, output, action, backtrack).
+    """
+
+    def __init__(self, spec, index):
+        self.index = index
+        self.id = str(spec["id"])
+        depends_on = spec.get("depends_on", [])
+        self.depends_on = [depends_on] if isinstance(depends_on, str) else list(depends_on)
+        self.when = spec.get("when")
+        self.output = spec.get("output")
+        self.action = spec.get("action", "click")
+        self.backtrack = spec.get("backtrack", False)
+        self.task = {key: value for key, value in spec.items() if key not in GRAPH_KEYS}
+        if "region" in self.task:
+            self.task["region"] = _as_region(self.task["region"])
+        # O click_images interpreta 'backtrack' ao rodar a tarefa isolada
+        self.task["backtrack"] = False
+        self.signature = json.dumps(self.task, sort_keys=True, default=str)
+
+    @property
+    def read_only(self):
+        return self.action in READ_ONLY_ACTIONS
+
+    @property
+    def name(self):
+        return self.task.get("text", self.task.get("image", self.id))
+
+
+class TaskGraph:
+    """
+    Grafo de tarefas compilado a partir do formato declarativo. Valida ids,
+    dependências, condições e ciclos e mantém os passos em ordem topológica
+    (estável em relação à ordem do arquivo).
+    """
+
+    def __init__(self, specs):
+        steps = [Step(spec, index) for index, spec in enumerate(specs)]
+        self.by_id = {}
+        for step in steps:
+            if step.id in self.by_id:
+                raise ValueError(f"Passo duplicado no grafo de tarefas: {step.id}")
+            if step.action not in ACTIONS:
+                raise ValueError(f"Ação desconhecida no passo {step.id}: {step.action}")
+            self.by_id[step.id] = step
+        for step in steps:
+            for dep in step.depends_on:
+                if dep not in self.by_id:
+                    raise ValueError(f"O passo {step.id} depende de um passo inexistente: {dep}")
+
+        self.steps = self._topological_order(steps)
+        self.producers = {step.output: step.id for step in self.steps if step.output}
+        for step in self.steps:
+            self._validate_references(step)
+
+    @staticmethod
+    def _topological_order(steps):
+        remaining = {step.id: len(step.depends_on) for step in steps}
+        dependents = {step.id: [] for step in steps}
+        for step in steps:
+            for dep in step.depends_on:
+                dependents[dep].append(step)
+        ready = [step for step in steps if remaining[step.id] == 0]
+        order = []
+        while ready:
+            ready.sort(key=lambda s: s.index)
+            step = ready.pop(0)
+            order.append(step)
+            for child in dependents[step.id]:
+                remaining[child.id] -= 1
+                if remaining[child.id] == 0:
+                    ready.append(child)
+        if len(order) != len(steps):
+            cycle = sorted(step_id for step_id, count in remaining.items() if count > 0)
+            raise ValueError(f"Ciclo de dependências no grafo de tarefas: {', '.join(cycle)}")
+        return order
+
+    def _validate_references(self, step):
+        """Condições e ${saídas} só podem usar saídas de passos dos quais o passo depende."""
+        names = []
+        if step.when is not None:
+            names.append(_condition_output(step.when))
+        for key in ("text", "sendtext"):
+            if isinstance(step.task.get(key), str):
+                names.extend(_OUTPUT_REF.findall(step.task[key]))
+        ancestors = self.ancestors(step.id)
+        for name in names:
+            producer = self.producers.get(name)
+            if producer is None:
+                raise ValueError(f"O passo {step.id} usa a saída '{name}', que nenhum passo produz")
+            if producer not in ancestors:
+                raise ValueError(f"O passo {step.id} usa a saída '{name}' sem depender do passo {producer}")
+        if isinstance(step.backtrack, (str, list)):
+            targets = [step.backtrack] if isinstance(step.backtrack, str) else step.backtrack
+            for target in targets:
+                if target not in ancestors:
+                    raise ValueError(f"O backtrack do passo {step.id} aponta para {target}, que não é dependência dele")
+
+    def ancestors(self, step_id):
+        """Ids de todos os passos dos quais o passo depende, direta ou indiretamente."""
+        found = set()
+        stack = list(self.by_id[step_id].depends_on)
+        while stack:
+            current = stack.pop()
+            if current not in found:
+                found.add(current)
+                stack.extend(self.by_id[current].depends_on)
+        return found
+
+    def descendants(self, step_id):
+        """Ids de todos os passos que dependem do passo, direta ou indiretamente."""
+        return {step.id for step in self.steps if step_id in self.ancestors(step.id)}
+
+    def backtrack_targets(self, step):
+        """
+        Passos para onde o backtracking volta. Com 'backtrack': true são as
+        dependências diretas; dependências somente leitura são trocadas pelos
+        passos de clique dos quais elas dependem, já que reler a mesma tela
+        não muda o resultado. Um id (ou lista de ids) escolhe o destino.
+        """
+        if isinstance(step.backtrack, str):
+            return [step.backtrack]
+        if isinstance(step.backtrack, list):
+            return list(step.backtrack)
+        targets = []
+        stack = list(step.depends_on)
+        seen = set()
+        while stack:
+            current = self.by_id[stack.pop(0)]
+            if current.id in seen:
+                continue
+            seen.add(current.id)
+            if current.read_only:
+                stack.extend(current.depends_on)
+            elif current.id not in targets:
+                targets.append(current.id)
+        return targets
+
+
+def _condition_output(condition):
+    if isinstance(condition, str):
+        return condition.lstrip("!")
+    return condition["output"]
+
+
+def _condition_met(condition, outputs):
+    """
+    Avalia a condição 'when' de um passo. Formatos aceitos:
+      "nome" / "!nome"                      saída presente / ausente
+      {"output": "nome", "found": false}    mesma ideia, explícita
+      {"output": "nome", "equals": valor}
+      {"output": "nome", "contains": "abc"}
+      {"output": "nome", "matches": "regex"}
+    """
+    if isinstance(condition, str):
+        value = outputs.get(condition.lstrip("!"))
+        return not value if condition.startswith("!") else bool(value)
+    value = outputs.get(condition["output"])
+    if "equals" in condition:
+        return value == condition["equals"]
+    if "contains" in condition:
+        return value is not None and str(condition["contains"]) in str(value)
+    if "matches" in condition:
+        return value is not None and re.search(condition["matches"], str(value)) is not None
+    return bool(value) == bool(condition.get("found", True))
+
+
+def load_task_graph(path):
+    """
+    Lê um arquivo de tarefas (JSON, ou YAML se o PyYAML estiver instalado) e
+    compila o grafo. O arquivo pode ser {"steps": [...]} ou apenas a lista de
+    passos. Uma lista de tarefas sem 'id' (formato antigo) vira uma cadeia em
+    que cada tarefa depende da anterior.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        if os.path.splitext(path)[1].lower() in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("PyYAML é necessário para ler arquivos de tarefas YAML") from None
+            data = yaml.safe_load(file)
+        else:
+            data = json.load(file)
+    steps = data.get("steps", []) if isinstance(data, dict) else data
+    return TaskGraph(_with_ids(steps))
+
+
+def _with_ids(specs):
+    if all("id" in spec for spec in specs):
+        return specs
+    chained = []
+    for index, spec in enumerate(specs):
+        spec = dict(spec)
+        spec.setdefault("id", f"passo_{index + 1}")
+        if index > 0 and "depends_on" not in spec:
+            spec["depends_on"] = [chained[-1]["id"]]
+        chained.append(spec)
+    return chained
+
+
+class TaskGraphRunner:
+    """
+    Executa um TaskGraph. Os passos de clique rodam um de cada vez, na thread
+    que chamou run(), e só quando nenhum passo somente leitura está em
+    andamento (um clique pode mudar a tela). Os passos somente leitura cujas
+    dependências terminaram rodam em paralelo em um pool de threads.
+
+    Os resultados dos passos somente leitura ficam em cache, associados ao
+    hash da captura da região: se a tela não mudou desde a última execução
+    do passo, o resultado é reaproveitado sem OCR nem busca de imagem.
+
+    As funções que tocam a tela são recebidas no construtor:
+      click(tasks)              -> lista de posições (como click_images)
+      locate(task)              -> caixa ou None (como locate_task_target)
+      read_text(region, config) -> texto lido
+      capture(region)           -> pixels da região (region None = tela inteira)
+    """
+
+    def __init__(self, graph, click, locate, read_text, capture, workers=DEFAULT_READ_WORKERS):
+        self.graph = graph
+        self.click = click
+        self.locate = locate
+        self.read_text = read_text
+        self.capture = capture
+        self.workers = workers
+        self.cache = {}
+        self.outputs = {}
+        self.status = {}
+
+    def _resolve(self, step):
+        """Tarefa do passo com as referências ${saída} substituídas."""
+        task = dict(step.task)
+        for key in ("text", "sendtext"):
+            if isinstance(task.get(key), str):
+                task[key] = _OUTPUT_REF.sub(lambda m: str(self.outputs.get(m.group(1)) or ""), task[key])
+        return task
+
+    def _run_read(self, step):
+        task = self._resolve(step)
+        region = task.get("region")
+        search_region = region if (step.action == "read" or "text" in task or task.get("specific", True)) else None
+        digest = ocr_cache.frame_digest(self.capture(search_region))
+        signature = (json.dumps(task, sort_keys=True, default=str), digest)
+        cached = self.cache.get(step.id)
+        if cached is not None and cached[0] == signature:
+            logging.info(f"Passo '{step.id}': tela inalterada, reutilizando o resultado anterior.")
+            return cached[1]
+
+        if step.action == "read":
+            value = self.read_text(region, task.get("config", "--psm 6")) or None
+        else:
+            value = self.locate(task)
+        self.cache[step.id] = (signature, value)
+        return value
+
+    def _run_click(self, step):
+        return self.click([self._resolve(step)])[0]
+
+    def _ready(self, step, running):
+        return (self.status[step.id] == PENDING and step.id not in running
+                and all(self.status[dep] in FINISHED for dep in step.depends_on))
+
+    def _finish(self, step, value, backtracks):
+        if value is not None:
+            self.status[step.id] = DONE
+            if step.output:
+                self.outputs[step.output] = value
+            logging.info(f"✓ Passo '{step.id}' ({step.name}) concluído.")
+            return
+
+        targets = self.graph.backtrack_targets(step) if step.backtrack else []
+        backtracks[step.id] = backtracks.get(step.id, 0) + 1
+        if targets and backtracks[step.id] <= MAX_BACKTRACKS:
+            # Refaz os destinos e os passos entre eles e este passo, seguindo as arestas
+            ancestors = self.graph.ancestors(step.id)
+            redo = {step.id}
+            for target in targets:
+                redo.add(target)
+                redo.update(self.graph.descendants(target) & ancestors)
+            for step_id in redo:
+                self.status[step_id] = PENDING
+            logging.info(f"✗ Passo '{step.id}' ({step.name}) falhou. BACKTRACKING para: {', '.join(targets)}")
+            return
+
+        self.status[step.id] = FAILED
+        if step.output:
+            self.outputs[step.output] = None
+        if step.backtrack and not targets:
+            logging.info(f"✗ Passo '{step.id}' ({step.name}) falhou e não tem passo anterior para backtracking. Avançando.")
+        else:
+            logging.info(f"✗ Passo '{step.id}' ({step.name}) falhou. Avançando.")
+
+    def run(self):
+        """Executa o grafo e retorna o dicionário de saídas nomeadas."""
+        self.outputs = {}
+        self.status = {step.id: PENDING for step in self.graph.steps}
+        backtracks = {}
+        in_flight = {}
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="task-graph") as pool:
+            while True:
+                running = {step.id for step in in_flight.values()}
+                next_click = None
+                for step in self.graph.steps:
+                    if not self._ready(step, running):
+                        continue
+                    if step.when is not None and not _condition_met(step.when, self.outputs):
+                        self.status[step.id] = SKIPPED
+                        if step.output:
+                            self.outputs[step.output] = None
+                        logging.info(f"Passo '{step.id}' ignorado: condição não atendida.")
+                    elif step.read_only:
+                        in_flight[pool.submit(self._run_read, step)] = step
+                        running.add(step.id)
+                    elif next_click is None:
+                        next_click = step
+
+                if in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        step = in_flight.pop(future)
+                        try:
+                            value = future.result()
+                        except Exception as e:
+                            logging.error(f"Erro no passo '{step.id}': {e}")
+                            value = None
+                        self._finish(step, value, backtracks)
+                    continue
+                if next_click is None:
+                    if any(status == PENDING for status in self.status.values()):
+                        continue
+                    break
+
+                logging.info(f"Iniciando passo '{next_click.id}' ({next_click.name})")
+                try:
+                    value = self._run_click(next_click)
+                except Exception as e:
+                    logging.error(f"Erro no passo '{next_click.id}': {e}")
+                    value = None
+                self._finish(next_click, value, backtracks)
+
+        done = sum(1 for status in self.status.values() if status == DONE)
+        logging.info(f"Grafo de tarefas concluído: {done}/{len(self.status)} passo(s) com sucesso.")
+        return dict(self.outputs)
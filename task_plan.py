@@ -0,0 +1,278 @@
+"""
+Compilação das listas de tarefas do click_images em planos imutáveis.
+
+Cada tarefa (dicionário) é validada e interpretada uma única vez antes da
+execução: filtro e palavras do texto alvo já limpos, sequência de teclas do
+sendtext já separada, imagem de referência já carregada e região recortada
+aos limites da tela. Uma tarefa inválida interrompe a compilação com
+TaskPlanError, listando todos os problemas, antes de qualquer clique.
+"""
+import os
+import logging
+from numbers import Number
+
+import ocr_stats
+import template_assets
+from text_filters import clean_target
+
+FILTER_TYPES = ("numbers", "letters", "both")
+MOUSE_BUTTONS = ("left", "right", "double", "double left")
+WAIT_MODES = ("stable", "fixed")
+
+# Comandos aceitos no início do sendtext: texto, descrição no log, método do
+# canal de entrada e argumentos
+KEY_COMMANDS = (
+    ("{ctrl}a", "CTRL+A (Selecionar Tudo)", "hotkey", ("ctrl", "a")),
+    ("{del}", "DEL (Deletar)", "press", ("delete",)),
+    ("{tab}", "TAB", "press", ("tab",)),
+    ("{enter}", "ENTER", "press", ("enter",)),
+)
+
+# Menor dimensão (px) aceita para uma região depois de recortada à tela
+MIN_REGION_SIZE = 2
+
+
+class TaskPlanError(ValueError):
+    """Tarefas inválidas; errors traz uma mensagem por problema encontrado."""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        super().__init__("Tarefas inválidas:\n  " + "\n  ".join(self.errors))
+
+
+def tokenize_sendtext(sendtext):
+    """
+    Separa os comandos do início do sendtext ({ctrl}a, {del}, {tab}, {enter},
+    sem diferenciar maiúsculas) do texto a colar. Retorna (teclas, texto), com
+    teclas como tuplas (descrição, método, argumentos).
+    """
+    keys = []
+    rest = sendtext
+    while True:
+        lower = rest.lower()
+        for command, label, method, args in KEY_COMMANDS:
+            if lower.startswith(command):
+                keys.append((label, method, args))
+                rest = rest[len(command):]
+                break
+        else:
+            return tuple(keys), rest
+
+
+def clip_region(region, screen):
+    """Interseção da região (x, y, largura, altura) com a tela, ou None se ficar vazia."""
+    x, y, w, h = region
+    sx, sy, sw, sh = screen
+    left, top = max(x, sx), max(y, sy)
+    right, bottom = min(x + w, sx + sw), min(y + h, sy + sh)
+    if right - left < MIN_REGION_SIZE or bottom - top < MIN_REGION_SIZE:
+        return None
+    return (left, top, right - left, bottom - top)
+
+
+class CompiledTask:
+    """
+    Tarefa já interpretada. Os atributos têm os mesmos nomes das chaves do
+    dicionário original, com os valores padrão do click_images já aplicados;
+    source guarda o dicionário original.
+    """
+
+    __slots__ = (
+        "index", "name", "kind", "text", "char_type", "target_words", "stats_key", "image", "region", "confidence", "specific", "coarse_to_fine", "early_confidence", "best_confidence",
+        "occurrence", "parallel_ocr", "prune_ocr_variants", "lookahead", "cache_tolerance", "mouse_button",
+        "sendtext", "keys", "paste_text", "delay", "wait_mode", "backtrack", "source",
+    )
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            object.__setattr__(self, name, values.get(name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CompiledTask é imutável")
+
+    def __repr__(self):
+        return f"CompiledTask({self.index + 1}, {self.kind}, {self.name!r})"
+
+
+class TaskPlan:
+    """Sequência imutável de CompiledTask, na ordem da lista de tarefas."""
+
+    __slots__ = ("tasks", "screen")
+
+    def __init__(self, tasks, screen=None):
+        self.tasks = tuple(tasks)
+        self.screen = screen
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def __getitem__(self, index):
+        return self.tasks[index]
+
+    def __iter__(self):
+        return iter(self.tasks)
+
+
+def _number(task, key, default, errors, minimum=None, maximum=None):
+    value = task.get(key, default)
+    if value is None and default is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, Number):
+        errors.append(f"'{key}' deve ser um número (recebido {value!r})")
+        return default
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        limits = f"estar entre {minimum} e {maximum}" if maximum is not None else f"ser maior ou igual a {minimum}"
+        errors.append(f"'{key}' deve {limits} (recebido {value})")
+    return value
+
+
+def _choice(task, key, default, options, errors):
+    value = task.get(key, default)
+    if not isinstance(value, str) or value.lower() not in options:
+        errors.append(f"'{key}' deve ser um de {', '.join(options)} (recebido {value!r})")
+        return default
+    return value.lower()
+
+
+def _region(task, screen, errors):
+    region = task.get("region")
+    if region is None:
+        return None
+    if (not isinstance(region, (list, tuple)) or len(region) != 4
+            or not all(isinstance(v, Number) and not isinstance(v, bool) for v in region)):
+        errors.append(f"'region' deve ser [x, y, largura, altura] (recebido {region!r})")
+        return None
+    region = tuple(int(v) for v in region)
+    if region[2] <= 0 or region[3] <= 0:
+        errors.append(f"'region' com largura e altura positivas (recebido {region})")
+        return None
+    if screen is None:
+        return region
+    clipped = clip_region(region, screen)
+    if clipped is None:
+        errors.append(f"'region' {region} fora da tela {tuple(screen)}")
+    elif clipped != region:
+        logging.warning(f"Região {region} recortada aos limites da tela: {clipped}")
+    return clipped
+
+
+def compile_task(task, index=0, screen=None, default_confidence=0.9, store=None):
+    """
+    Compila uma tarefa. screen (x, y, largura, altura) recorta a região aos
+    limites da tela; store é o cache de imagens de referência (o compartilhado
+    por padrão). Lança TaskPlanError se a tarefa for inválida.
+    """
+    if not isinstance(task, dict):
+        raise TaskPlanError([f"Tarefa {index + 1}: deve ser um dicionário (recebido {type(task).__name__})"])
+    errors = []
+    has_text, has_image = "text" in task, "image" in task
+    name = task.get("text", task.get("image", f"Tarefa {index + 1}"))
+    values = dict(index=index, name=name, source=task)
+
+    if not has_text and not has_image:
+        errors.append("deve ter 'text' ou 'image'")
+    elif has_text and has_image:
+        # Como no click_images original, o texto tem precedência sobre a imagem
+        logging.warning(f"Tarefa {index + 1} ('{name}') tem 'text' e 'image'; a imagem será ignorada")
+        has_image = False
+    values["region"] = _region(task, screen, errors)
+
+    if has_text:
+        text = task["text"]
+        # Filtros fora de FILTER_TYPES seguem o comportamento padrão de text_filters
+        char_type = task.get("char_type", "both")
+        if not isinstance(char_type, str):
+            errors.append(f"'char_type' deve ser um texto (recebido {char_type!r})")
+            char_type = "both"
+        values["char_type"] = char_type.lower()
+        if not isinstance(text, str) or not text.strip():
+            errors.append(f"'text' deve ser um texto não vazio (recebido {text!r})")
+        else:
+            values["text"] = text
+            values["target_words"] = tuple(clean_target(text, values["char_type"]))
+            # Referências ${saída} do grafo de tarefas só são resolvidas na execução
+            if not values["target_words"] and "${" not in text:
+                errors.append(f"'text' {text!r} não tem palavras válidas para o filtro '{values['char_type']}'")
+        if task.get("region") is None:
+            errors.append("tarefas de texto precisam de 'region'")
+        elif values["region"] is not None and values.get("text") is not None:
+            values["stats_key"] = ocr_stats.make_task_key(text, values["region"], values["char_type"])
+    elif has_image:
+        image = task["image"]
+        if not isinstance(image, str) or not image:
+            errors.append(f"'image' deve ser o caminho de um arquivo (recebido {image!r})")
+        else:
+            values["image"] = os.path.abspath(image)
+            try:
+                # Valida a imagem e já a deixa no cache usado pelo TemplateMatcher
+                (store or template_assets.get_store()).get(values["image"])
+            except (OSError, ValueError) as e:
+                errors.append(f"imagem de referência inválida: {e}")
+        values["specific"] = bool(task.get("specific", True))
+        values["coarse_to_fine"] = task.get("coarse_to_fine")
+
+    values["confidence"] = _number(task, "confidence", default_confidence, errors, 0.0, 1.0)
+    values["early_confidence"] = _number(task, "early_confidence", 75.0, errors)
+    values["best_confidence"] = bool(task.get("best_confidence", True))
+    occurrence = _number(task, "occurrence", 1, errors, 1)
+    values["occurrence"] = int(occurrence) if occurrence is not None else 1
+    values["parallel_ocr"] = bool(task.get("parallel_ocr", False))
+    values["prune_ocr_variants"] = bool(task.get("prune_ocr_variants", False))
+    values["lookahead"] = bool(task.get("lookahead", True))
+    values["cache_tolerance"] = _number(task, "cache_tolerance", None, errors, 0.0, 1.0)
+    values["mouse_button"] = _choice(task, "mouse_button", "left", MOUSE_BUTTONS, errors)
+    values["delay"] = _number(task, "delay", 0, errors, 0)
+    values["wait_mode"] = _choice(task, "wait_mode", "stable", WAIT_MODES, errors)
+    values["backtrack"] = bool(task.get("backtrack", False))
+
+    sendtext = task.get("sendtext")
+    if sendtext:
+        if not isinstance(sendtext, str):
+            errors.append(f"'sendtext' deve ser um texto (recebido {sendtext!r})")
+        else:
+            values["sendtext"] = sendtext
+            values["keys"], values["paste_text"] = tokenize_sendtext(sendtext)
+    values.setdefault("keys", ())
+
+    if errors:
+        raise TaskPlanError(f"Tarefa {index + 1} ('{name}'): {error}" for error in errors)
+    values["kind"] = "text" if has_text else "image"
+    return CompiledTask(**values)
+
+
+def check_read_task(task, index=0, screen=None):
+    """
+    Valida uma tarefa de leitura (passo "read" do grafo de tarefas), que só
+    usa 'region' e 'config'. Lança TaskPlanError se a tarefa for inválida.
+    """
+    if not isinstance(task, dict):
+        raise TaskPlanError([f"Tarefa {index + 1}: deve ser um dicionário (recebido {type(task).__name__})"])
+    errors = []
+    if task.get("region") is None:
+        errors.append("tarefas de leitura precisam de 'region'")
+    else:
+        _region(task, screen, errors)
+    config = task.get("config", "--psm 6")
+    if not isinstance(config, str):
+        errors.append(f"'config' deve ser um texto (recebido {config!r})")
+    if errors:
+        raise TaskPlanError(f"Tarefa {index + 1} (leitura): {error}" for error in errors)
+
+
+def compile_tasks(tasks, screen=None, default_confidence=0.9, store=None):
+    """
+    Compila uma lista de tarefas em um TaskPlan. Um TaskPlan recebido é
+    retornado como está. Lança TaskPlanError com os problemas de todas as
+    tarefas inválidas.
+    """
+    if isinstance(tasks, TaskPlan):
+        return tasks
+    compiled, errors = [], []
+    for index, task in enumerate(tasks):
+        try:
+            compiled.append(compile_task(task, index, screen, default_confidence, store))
+        except TaskPlanError as e:
+            errors.extend(e.errors)
+    if errors:
+        raise TaskPlanError(errors)
+    return TaskPlan(compiled, screen)
@@ -0,0 +1,133 @@
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+import cv2
+
+# Escalas pré-calculadas para cada imagem de referência
+DEFAULT_SCALES = (1.0, 0.95, 1.05)
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+def default_images_folder(config_path="rpa_config.json"):
+    """Pasta de imagens definida em rpa_config.json (vision.images_folder) ou 'images'."""
+    try:
+        with open(config_path, "r", encoding="utf-8") as file:
+            folder = json.load(file).get("vision", {}).get("images_folder")
+        if folder and os.path.isdir(folder):
+            return folder
+    except (OSError, ValueError):
+        pass
+    return "images"
+
+
+class TemplateAsset:
+    """
+    Imagem de referência decodificada, com as versões colorida (RGB), em
+    cinza e de bordas em cada escala. Escalas fora das pré-calculadas são
+    geradas na primeira vez que forem pedidas.
+    """
+
+    KINDS = ("color", "gray", "edges")
+
+    def __init__(self, path, mtime, scales=DEFAULT_SCALES):
+        bgr = cv2.imread(path, cv2.IMREAD_COLOR)
+        if bgr is None:
+            raise FileNotFoundError(f"Imagem de referência não encontrada: {path}")
+        self.path = path
+        self.mtime = mtime
+        self._color = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+        self._variants = {}
+        self._lock = threading.Lock()
+        for scale in scales:
+            self._build(scale)
+
+    def _build(self, scale):
+        color = self._color
+        if scale != 1.0:
+            new_width = max(1, int(color.shape[1] * scale))
+            new_height = max(1, int(color.shape[0] * scale))
+            interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+            color = cv2.resize(color, (new_width, new_height), interpolation=interpolation)
+        gray = cv2.cvtColor(color, cv2.COLOR_RGB2GRAY)
+        variants = {"color": color, "gray": gray, "edges": cv2.Canny(gray, 50, 150)}
+        self._variants[scale] = variants
+        return variants
+
+    def variant(self, scale=1.0, kind="color"):
+        """Versão da imagem na escala e no tipo ('color', 'gray' ou 'edges') pedidos."""
+        with self._lock:
+            variants = self._variants.get(scale) or self._build(scale)
+        return variants[kind]
+
+    @property
+    def size(self):
+        return self._color.shape[1], self._color.shape[0]
+
+
+class TemplateAssetStore:
+    """
+    Cache LRU das imagens de referência. Cada imagem é decodificada uma única
+    vez (com as escalas de DEFAULT_SCALES já calculadas) e recarregada apenas
+    quando o arquivo for alterado em disco (mtime diferente).
+    """
+
+    def __init__(self, max_entries=512, scales=DEFAULT_SCALES):
+        self.max_entries = max_entries
+        self.scales = tuple(scales)
+        self.loads = 0
+        self._assets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """Retorna o TemplateAsset do arquivo, carregando ou recarregando se necessário."""
+        key = os.path.abspath(path)
+        mtime = os.stat(key).st_mtime
+        with self._lock:
+            asset = self._assets.get(key)
+            if asset is not None and asset.mtime == mtime:
+                self._assets.move_to_end(key)
+                return asset
+
+        asset = TemplateAsset(key, mtime, self.scales)
+        with self._lock:
+            self.loads += 1
+            self._assets[key] = asset
+            self._assets.move_to_end(key)
+            while len(self._assets) > self.max_entries:
+                self._assets.popitem(last=False)
+        return asset
+
+    def preload(self, folder):
+        """Carrega todas as imagens da pasta. Retorna quantas foram carregadas."""
+        if not folder or not os.path.isdir(folder):
+            logging.warning(f"Pasta de imagens não encontrada para pré-carregamento: {folder}")
+            return 0
+        count = 0
+        for name in sorted(os.listdir(folder)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                try:
+                    self.get(os.path.join(folder, name))
+                    count += 1
+                except Exception as e:
+                    logging.warning(f"Não foi possível carregar a imagem {name}: {e}")
+        logging.info(f"{count} imagem(ns) de referência pré-carregada(s) de {folder}")
+        return count
+
+    def invalidate(self, path=None):
+        """Remove uma imagem (ou todas) do cache."""
+        with self._lock:
+            if path is None:
+                self._assets.clear()
+            else:
+                self._assets.pop(os.path.abspath(path), None)
+
+
+_store = TemplateAssetStore()
+
+
+def get_store():
+    """Retorna o cache de imagens de referência compartilhado do processo."""
+    return _store
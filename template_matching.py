@@ -0,0 +1,170 @@
+import logging
+from collections import namedtuple
+
+import numpy as np
+import cv2
+
+import template_assets
+import tracing
+
+# Mesmo formato de caixa retornado pelo pyautogui.locateOnScreen
+Box = namedtuple("Box", "left top width height")
+
+# Busca grosseira: fatores de redução testados (do mais agressivo ao mais suave),
+# tamanho mínimo da referência reduzida e quantos picos são refinados
+COARSE_FACTORS = (0.25, 0.5)
+MIN_COARSE_NEEDLE = 12
+COARSE_TOP_K = 5
+
+
+def _to_gray(img):
+    return img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+
+
+class TemplateMatcher:
+    """
+    Localização de imagens na tela com cv2.matchTemplate, sem arquivos
+    temporários. As imagens de referência vêm do TemplateAssetStore (em
+    memória, com as escalas pré-calculadas) e todas as escalas e níveis de
+    confiança são avaliados sobre a mesma captura.
+
+    A instância pode ser compartilhada entre threads: o cache das imagens de
+    referência é protegido por lock e as buscas não alteram estado.
+    """
+
+    def __init__(self, store=None):
+        self.store = store or template_assets.get_store()
+
+    def needle(self, image_path, scale=1.0, grayscale=False):
+        """Imagem de referência na escala pedida, vinda do cache de imagens."""
+        return self.store.get(image_path).variant(scale, "gray" if grayscale else "color")
+
+    @staticmethod
+    def best_match(haystack, needle):
+        """
+        Retorna (score, (x, y)) do melhor casamento da referência na captura,
+        ou (-1.0, None) quando a referência é maior que a captura.
+        """
+        if needle.shape[0] > haystack.shape[0] or needle.shape[1] > haystack.shape[1] or needle.size == 0:
+            return -1.0, None
+        result = cv2.matchTemplate(haystack, needle, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        return float(max_val), max_loc
+
+    @staticmethod
+    def coarse_factor(needle):
+        """
+        Fator de redução para a busca grosseira: o menor de COARSE_FACTORS que
+        mantém o lado menor da referência com pelo menos MIN_COARSE_NEEDLE
+        pixels. Retorna None quando a referência é pequena demais para reduzir.
+        """
+        min_side = min(needle.shape[:2])
+        for factor in COARSE_FACTORS:
+            if min_side * factor >= MIN_COARSE_NEEDLE:
+                return factor
+        return None
+
+    def best_match_coarse_to_fine(self, haystack, needle, coarse_haystacks, top_k=COARSE_TOP_K):
+        """
+        Busca em duas etapas: casa a referência reduzida na captura reduzida
+        para obter os top_k picos candidatos e refina cada um em resolução
+        original, numa janela pequena ao redor do pico. O score retornado é o
+        da resolução original, com a mesma semântica de best_match.
+        """
+        factor = self.coarse_factor(needle)
+        if factor is None:
+            return self.best_match(haystack, needle)
+        if needle.shape[0] > haystack.shape[0] or needle.shape[1] > haystack.shape[1]:
+            return -1.0, None
+
+        small_haystack = coarse_haystacks.get(factor)
+        if small_haystack is None:
+            small_haystack = cv2.resize(haystack, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+            coarse_haystacks[factor] = small_haystack
+        small_needle = cv2.resize(needle, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+        if small_needle.shape[0] > small_haystack.shape[0] or small_needle.shape[1] > small_haystack.shape[1]:
+            return self.best_match(haystack, needle)
+
+        result = cv2.matchTemplate(small_haystack, small_needle, cv2.TM_CCOEFF_NORMED)
+        needle_h, needle_w = needle.shape[:2]
+        small_h, small_w = small_needle.shape[:2]
+        pad = int(np.ceil(2 / factor)) + 2
+
+        best_score, best_loc = -1.0, None
+        for _ in range(top_k):
+            _, peak, _, (px, py) = cv2.minMaxLoc(result)
+            if peak <= -1.0:
+                break
+            # Suprime a vizinhança do pico para que o próximo seja outro candidato
+            result[max(0, py - small_h // 2):py + small_h // 2 + 1,
+                   max(0, px - small_w // 2):px + small_w // 2 + 1] = -1.0
+
+            x0 = max(0, int(px / factor) - pad)
+            y0 = max(0, int(py / factor) - pad)
+            x1 = min(haystack.shape[1], int(px / factor) + needle_w + pad)
+            y1 = min(haystack.shape[0], int(py / factor) + needle_h + pad)
+            score, loc = self.best_match(haystack[y0:y1, x0:x1], needle)
+            if loc is not None and score > best_score:
+                best_score, best_loc = score, (x0 + loc[0], y0 + loc[1])
+        return best_score, best_loc
+
+    def locate(self, image_path, haystack, confidence, scales=(1.0,), fallback_confidence=None,
+               offset=(0, 0), grayscale=False, coarse_to_fine=False):
+        """
+        Procura a referência em todas as escalas sobre a mesma captura.
+
+        Retorna a caixa (em coordenadas de tela, somando offset) da primeira
+        escala, na ordem informada, cujo score atinge confidence. Se nenhuma
+        atingir e fallback_confidence for informado, aceita a escala original
+        com esse limiar reduzido. Retorna None se nada for encontrado.
+        Com coarse_to_fine=True usa a busca em duas etapas, indicada para
+        capturas grandes (tela inteira, vários monitores).
+        """
+        with tracing.span("template_match", image=image_path, coarse_to_fine=coarse_to_fine) as span:
+            box = self._locate(image_path, haystack, confidence, scales, fallback_confidence,
+                               offset, grayscale, coarse_to_fine)
+            span.set(found=box is not None)
+        return box
+
+    def _locate(self, image_path, haystack, confidence, scales, fallback_confidence,
+                offset, grayscale, coarse_to_fine):
+        haystack = np.asarray(haystack)
+        if grayscale:
+            haystack = _to_gray(haystack)
+        elif haystack.ndim == 3 and haystack.shape[2] == 4:
+            haystack = cv2.cvtColor(haystack, cv2.COLOR_RGBA2RGB)
+
+        scores = {}
+        coarse_haystacks = {}
+        accepted = [(scale, confidence) for scale in scales]
+        if fallback_confidence is not None:
+            accepted.append((1.0, fallback_confidence))
+
+        # Cada escala é avaliada no máximo uma vez, e só se as anteriores falharem
+        for scale, threshold in accepted:
+            if scale not in scores:
+                scores[scale] = None
+                try:
+                    needle = self.needle(image_path, scale, grayscale)
+                    if coarse_to_fine:
+                        match = self.best_match_coarse_to_fine(haystack, needle, coarse_haystacks)
+                    else:
+                        match = self.best_match(haystack, needle)
+                    scores[scale] = (match, needle.shape)
+                except cv2.error as e:
+                    logging.debug(f"Erro ao buscar imagem com escala {scale}: {e}")
+            if scores[scale] is None:
+                continue
+            (score, loc), shape = scores[scale]
+            if loc is not None and score >= threshold:
+                logging.debug(f"Imagem {image_path} encontrada na escala {scale} com score {score:.3f}")
+                return Box(offset[0] + loc[0], offset[1] + loc[1], shape[1], shape[0])
+        return None
+
+
+_matcher = TemplateMatcher()
+
+
+def get_matcher():
+    """Retorna o TemplateMatcher compartilhado do processo."""
+    return _matcher
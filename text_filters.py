@@ -0,0 +1,57 @@
+import re
+
+# Padrões pré-compilados usados na limpeza e filtragem das palavras do OCR
+_CLEAN_PATTERNS = {
+    "numbers": re.compile(r"[^\d]"),
+    "letters": re.compile(r"[^A-Za-zÀ-ÖØ-öø-ÿ]"),
+    # Permite letras e números
+    "both": re.compile(r"[^A-Za-zÀ-ÖØ-öø-ÿ0-9]"),
+}
+_EDGE_PATTERN = re.compile(r'^[\W_]+|[\W_]+$')
+_FILTER_PATTERNS = {
+    "numbers": re.compile(r"\d+"),
+    "letters": re.compile(r"[A-Za-zÀ-ÖØ-öø-ÿ]+"),
+    "both": re.compile(r"[A-Za-zÀ-ÖØ-öø-ÿ0-9]+"),
+}
+
+
+def limpar_texto(texto, filter_type="both"):
+    """
+    Remove caracteres do texto conforme o filtro desejado:
+      - "numbers": remove tudo, exceto dígitos.
+      - "letters": remove tudo, exceto letras (incluindo acentuadas).
+      - "both": remove todos os caracteres que não sejam letras ou dígitos.
+      - Caso outro valor seja informado, remove apenas caracteres especiais do início e fim.
+    """
+    texto = texto.strip()
+    pattern = _CLEAN_PATTERNS.get(filter_type, _EDGE_PATTERN)
+    return pattern.sub("", texto)
+
+
+def matches_filter(word, filter_type):
+    """
+    Verifica se a palavra corresponde ao filtro desejado:
+      - Se filter_type == "numbers": apenas dígitos entre 1 e 31.
+      - Se filter_type == "letters": apenas letras (incluindo acentuadas).
+      - Se filter_type == "both": apenas letras e números.
+      - Caso contrário, retorna True.
+    """
+    filter_type = filter_type.lower()
+    pattern = _FILTER_PATTERNS.get(filter_type)
+    if pattern is None:
+        return True
+    if pattern.fullmatch(word) is None:
+        return False
+    if filter_type == "numbers":
+        try:
+            num = int(word)
+            return 1 <= num <= 31
+        except ValueError:
+            return False
+    return True
+
+
+def clean_target(text, filter_type="both"):
+    """Palavras do texto alvo, limpas e filtradas como as palavras do OCR."""
+    words = [limpar_texto(word, filter_type) for word in text.split()]
+    return [word for word in words if matches_filter(word, filter_type)]
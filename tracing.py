@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import defaultdict
+
+# Arquivo de saída do rastreamento. Termina em .jsonl: uma linha JSON por
+# trecho; outra extensão (ex.: .json): arquivo de eventos do Chrome, aberto
+# em chrome://tracing ou ui.perfetto.dev. Sem a variável o rastreamento fica
+# desligado e os trechos não custam quase nada.
+TRACE_PATH = os.environ.get("RPA_TRACE")
+
+# Atributos herdados por todos os trechos abertos no mesmo contexto (tarefa,
+# tentativa...). Usa contextvars para acompanhar as threads de wrap().
+_context = contextvars.ContextVar("rpa_trace_context", default={})
+
+
+class _NullSpan:
+    """Trecho usado com o rastreamento desligado."""
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """Trecho em andamento; set() acrescenta atributos antes de ele terminar."""
+
+    __slots__ = ("tracer", "name", "attrs", "start")
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.start = 0.0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer._record(self.name, self.start, end, self.attrs)
+        return False
+
+
+class Tracer:
+    """
+    Coleta trechos (nome, início, duração, thread e atributos) e grava em
+    JSON-lines ou no formato de eventos do Chrome. Também agrega contagem e
+    tempo por nome de trecho e por combinação de OCR para a tabela final.
+    """
+
+    def __init__(self, path=None, enabled=None):
+        self.path = path
+        # enabled=True sem path mantém os trechos só em memória (ex.: para summary())
+        self.enabled = bool(path) if enabled is None else enabled
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._events = []
+        self._file = None
+        self._totals = defaultdict(lambda: [0, 0.0])
+        self._ocr = defaultdict(lambda: [0, 0.0, 0])
+        if self.enabled and path and path.endswith(".jsonl"):
+            self._file = open(path, "w", encoding="utf-8")
+
+    def span(self, name, **attrs):
+        """Context manager que mede o trecho. Herda os atributos de context()."""
+        if not self.enabled:
+            return _NULL_SPAN
+        inherited = _context.get()
+        return Span(self, name, {**inherited, **attrs} if inherited else attrs)
+
+    @contextmanager
+    def context(self, **attrs):
+        """Define atributos (ex.: task, attempt) para todos os trechos internos."""
+        token = _context.set({**_context.get(), **attrs})
+        try:
+            yield
+        finally:
+            _context.reset(token)
+
+    def set_context(self, **attrs):
+        """Atualiza os atributos do contexto atual (ex.: número da tentativa)."""
+        _context.set({**_context.get(), **attrs})
+
+    def _record(self, name, start, end, attrs):
+        ts = (start - self.origin) * 1e6
+        dur = (end - start) * 1e6
+        event = {"name": name, "ts": round(ts, 1), "dur": round(dur, 1),
+                 "tid": threading.get_ident(), "args": attrs}
+        with self._lock:
+            total = self._totals[name]
+            total[0] += 1
+            total[1] += dur
+            # "ocr" mede a chamada ao Tesseract; "ocr_match", se a combinação achou o alvo
+            if name == "ocr":
+                pair = self._ocr[(attrs.get("variant"), attrs.get("config"))]
+                pair[0] += 1
+                pair[1] += dur
+            elif name == "ocr_match" and attrs.get("hit"):
+                self._ocr[(attrs.get("variant"), attrs.get("config"))][2] += 1
+            if self._file is not None:
+                self._file.write(json.dumps(event, default=str) + "\n")
+            else:
+                self._events.append(event)
+
+    def summary(self):
+        """Tempo total, contagem e média por trecho, e custo/acertos por combinação de OCR."""
+        with self._lock:
+            spans = {name: {"count": c, "total_ms": t / 1000, "mean_ms": t / 1000 / c}
+                     for name, (c, t) in self._totals.items()}
+            ocr = {pair: {"count": c, "total_ms": t / 1000, "hits": h}
+                   for pair, (c, t, h) in self._ocr.items()}
+        return spans, ocr
+
+    def summary_table(self, top=20):
+        """Tabela de texto com os trechos mais caros e as combinações de OCR."""
+        spans, ocr = self.summary()
+        lines = [f"{'trecho':<24}{'qtd':>8}{'total (ms)':>14}{'média (ms)':>14}"]
+        for name, s in sorted(spans.items(), key=lambda item: -item[1]["total_ms"]):
+            lines.append(f"{name:<24}{s['count']:>8}{s['total_ms']:>14.1f}{s['mean_ms']:>14.2f}")
+        if ocr:
+            lines.append("")
+            lines.append(f"{'variação | configuração':<48}{'qtd':>6}{'total (ms)':>12}{'acertos':>9}")
+            for (variant, config), s in sorted(ocr.items(), key=lambda item: -item[1]["total_ms"])[:top]:
+                label = f"{variant} | {config}"[:47]
+                lines.append(f"{label:<48}{s['count']:>6}{s['total_ms']:>12.1f}{s['hits']:>9}")
+        return "\n".join(lines)
+
+    def log_summary(self):
+        if self.enabled:
+            logging.info("Resumo do rastreamento:\n" + self.summary_table())
+
+    def flush(self):
+        """Grava o arquivo de eventos do Chrome (no JSON-lines a gravação é contínua)."""
+        if not self.enabled or not self.path:
+            return
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                return
+            pid = os.getpid()
+            events = [{"name": e["name"], "cat": e["name"], "ph": "X", "ts": e["ts"], "dur": e["dur"],
+                       "pid": pid, "tid": e["tid"], "args": e["args"]} for e in self._events]
+        with open(self.path, "w", encoding="utf-8") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file, default=str)
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self.enabled = False
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_tracer = Tracer(TRACE_PATH)
+
+
+@atexit.register
+def _close_at_exit():
+    _tracer.close()
+
+
+def get_tracer():
+    """Retorna o Tracer do processo (configurado por RPA_TRACE)."""
+    return _tracer
+
+
+def configure(path, enabled=None):
+    """Troca o destino do rastreamento (None desliga). Retorna o novo Tracer."""
+    global _tracer
+    _tracer.close()
+    _tracer = Tracer(path, enabled)
+    return _tracer
+
+
+def set_tracer(tracer):
+    """
+    Troca o Tracer do processo sem fechar o atual (ex.: para medir um trecho
+    isolado e depois reinstalar o original). Retorna o anterior.
+    """
+    global _tracer
+    previous, _tracer = _tracer, tracer
+    return previous
+
+
+def span(name, **attrs):
+    return _tracer.span(name, **attrs)
+
+
+def context(**attrs):
+    return _tracer.context(**attrs)
+
+
+def set_context(**attrs):
+    _tracer.set_context(**attrs)
+
+
+def wrap(fn):
+    """Executa fn em outra thread com o contexto de rastreamento atual."""
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
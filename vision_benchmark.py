@@ -0,0 +1,419 @@
+"""
+Benchmark offline dos caminhos críticos do bot_vision (pré-processamento,
+busca de texto por OCR e busca de imagens), sem display.
+
+    python vision_benchmark.py generate bench_corpus
+    python vision_benchmark.py run bench_corpus --repeat 5 --save-baseline
+    python vision_benchmark.py run bench_corpus --repeat 5
+
+O corpus é uma pasta com manifest.json e as imagens gravadas:
+
+    {"cases": [
+      {"name": "...", "kind": "text", "image": "regions/x.png", "text": "482",
+       "char_type": "numbers", "expect": [x, y, w, h]},
+      {"name": "...", "kind": "image", "frame": "frames/y.png", "template": "templates/t.png",
+       "region": null, "confidence": 0.9, "expect": [cx, cy], "tolerance": 6}
+    ]}
+
+Casos "text" usam recortes de região (expect é a caixa do texto, relativa
+ao recorte, opcional); casos "image" usam quadros da tela inteira (expect é
+o centro esperado em coordenadas de tela). O relatório traz percentis de
+latência, vazão, acerto por tipo de caso e a taxa de acerto de cada
+variação de pré-processamento. --save-baseline grava baseline.json no
+corpus; as execuções seguintes são comparadas com ela e o comando termina
+com código 1 se houver regressão.
+"""
+import io
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+from datetime import datetime
+from contextlib import redirect_stdout
+from collections import defaultdict
+
+import numpy as np
+import cv2
+
+import bot_vision
+import frame_source
+import ocr_engine
+import tracing
+
+MANIFEST = "manifest.json"
+BASELINE = "baseline.json"
+# Piora aceitável de latência (fração) antes de acusar regressão
+LATENCY_TOLERANCE = 0.2
+# Queda aceitável de acerto (fração de casos) antes de acusar regressão
+ACCURACY_TOLERANCE = 0.0
+PERCENTILES = (50, 90, 99)
+
+
+def load_rgb(path):
+    bgr = cv2.imread(path, cv2.IMREAD_COLOR)
+    if bgr is None:
+        raise ValueError(f"Imagem inválida: {path}")
+    return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+
+
+def save_rgb(path, pixels):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    cv2.imwrite(path, cv2.cvtColor(pixels, cv2.COLOR_RGB2BGR))
+
+
+def load_corpus(folder):
+    """Lê o manifest.json e carrega as imagens de cada caso (caminhos relativos à pasta)."""
+    with open(os.path.join(folder, MANIFEST), "r", encoding="utf-8") as file:
+        cases = json.load(file)["cases"]
+    for case in cases:
+        if case["kind"] == "text":
+            case["pixels"] = load_rgb(os.path.join(folder, case["image"]))
+        elif case["kind"] == "image":
+            case["pixels"] = load_rgb(os.path.join(folder, case["frame"]))
+            case["template_path"] = os.path.abspath(os.path.join(folder, case["template"]))
+        else:
+            raise ValueError(f"Tipo de caso desconhecido em {case.get('name')}: {case['kind']}")
+    return cases
+
+
+def _inside(point, box):
+    x, y, w, h = box
+    return x <= point[0] <= x + w and y <= point[1] <= y + h
+
+
+def _run_text(case):
+    """Pré-processamento e busca de texto do caso; retorna {etapa: segundos} e se acertou."""
+    img = case["pixels"]
+    started = time.perf_counter()
+    bot_vision.preprocess_image_for_ocr(img)
+    preprocess = time.perf_counter() - started
+
+    started = time.perf_counter()
+    boxes, _, _ = bot_vision.find_text_with_multiple_preprocessing(
+        img, case["text"], case.get("char_type", "both"), case.get("early_confidence", 75.0),
+        parallel=case.get("parallel_ocr", False))
+    search = time.perf_counter() - started
+
+    correct = bool(boxes)
+    if correct and case.get("expect"):
+        correct = _inside(bot_vision.input_channel.center(boxes[0]), case["expect"])
+    return {"preprocess": preprocess, "text": search}, correct
+
+
+def _run_image(case, source):
+    """Busca da referência no quadro do caso; retorna {etapa: segundos} e se acertou."""
+    source.set(case["pixels"], case.get("origin", (0, 0)))
+    started = time.perf_counter()
+    location = bot_vision.locate_image_with_retry(
+        case["template_path"], region=case.get("region"), confidence=case.get("confidence", 0.9),
+        max_attempts=case.get("max_attempts", 1), coarse_to_fine=case.get("coarse_to_fine"))
+    elapsed = time.perf_counter() - started
+
+    correct = location is not None
+    if correct and case.get("expect"):
+        x, y = bot_vision.input_channel.center(location)
+        ex, ey = case["expect"]
+        correct = max(abs(x - ex), abs(y - ey)) <= case.get("tolerance", 6)
+    return {"image": elapsed}, correct
+
+
+def run_benchmark(cases, repeat=3, warmup=1, trace_path=None):
+    """
+    Executa os casos repeat vezes (mais warmup rodadas descartadas) sobre o
+    bot_vision, com a captura trocada por um quadro em memória. Retorna o
+    relatório como dicionário.
+    """
+    source = frame_source.ArrayFrameSource()
+    original_grabber = bot_vision.FRAME_GRABBER
+    bot_vision.FRAME_GRABBER = frame_source.FrameGrabber(source, max_age=0.0)
+    # As rodadas de aquecimento não entram no rastreamento nem na contagem por variação
+    tracer = tracing.Tracer(None)
+    previous_tracer = tracing.set_tracer(tracer)
+
+    timings = defaultdict(list)
+    outcomes = defaultdict(list)
+    failures = set()
+    wall = 0.0
+    try:
+        for round_index in range(warmup + repeat):
+            measured = round_index >= warmup
+            if round_index == warmup:
+                tracer.close()
+                tracer = tracing.Tracer(trace_path, enabled=True)
+                tracing.set_tracer(tracer)
+            for case in cases:
+                with redirect_stdout(io.StringIO()):
+                    started = time.perf_counter()
+                    if case["kind"] == "text":
+                        stages, correct = _run_text(case)
+                    else:
+                        stages, correct = _run_image(case, source)
+                    elapsed = time.perf_counter() - started
+                if not measured:
+                    continue
+                wall += elapsed
+                for stage, seconds in stages.items():
+                    timings[stage].append(seconds)
+                outcomes[case["kind"]].append(correct)
+                if not correct:
+                    failures.add(case["name"])
+    finally:
+        bot_vision.FRAME_GRABBER = original_grabber
+        spans, ocr = tracer.summary()
+        tracer.close()
+        tracing.set_tracer(previous_tracer)
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "machine": platform.node(),
+        "cases": len(cases),
+        "repeat": repeat,
+        "throughput": (len(cases) * repeat / wall) if wall else 0.0,
+        "stages": {stage: _latency_stats(values) for stage, values in timings.items()},
+        "accuracy": {kind: sum(values) / len(values) for kind, values in outcomes.items()},
+        "failures": sorted(failures),
+        "variants": _variant_hit_rates(ocr),
+        "spans": {name: round(s["total_ms"], 1) for name, s in spans.items()},
+    }
+
+
+def _latency_stats(values):
+    ms = np.asarray(values) * 1000
+    stats = {f"p{q}_ms": float(np.percentile(ms, q)) for q in PERCENTILES}
+    stats.update(count=len(ms), mean_ms=float(ms.mean()), per_second=float(len(ms) / ms.sum() * 1000))
+    return stats
+
+
+def _variant_hit_rates(ocr):
+    """Chamadas de OCR, acertos e taxa de acerto por variação (somando as configurações)."""
+    per_variant = defaultdict(lambda: [0, 0, 0.0])
+    for (variant, _), s in ocr.items():
+        totals = per_variant[variant]
+        totals[0] += s["count"]
+        totals[1] += s["hits"]
+        totals[2] += s["total_ms"]
+    return {variant: {"calls": calls, "hits": hits, "hit_rate": hits / calls if calls else 0.0,
+                      "total_ms": round(total_ms, 1)}
+            for variant, (calls, hits, total_ms) in per_variant.items()}
+
+
+def compare(report, baseline, latency_tolerance=LATENCY_TOLERANCE, accuracy_tolerance=ACCURACY_TOLERANCE):
+    """Lista de regressões (texto) do relatório em relação à baseline."""
+    regressions = []
+    for stage, base in baseline.get("stages", {}).items():
+        current = report["stages"].get(stage)
+        if current is None:
+            continue
+        for key in ("p50_ms", "p90_ms"):
+            limit = base[key] * (1 + latency_tolerance)
+            if current[key] > limit:
+                regressions.append(f"{stage} {key}: {current[key]:.1f} ms (baseline {base[key]:.1f} ms)")
+    for kind, base in baseline.get("accuracy", {}).items():
+        current = report["accuracy"].get(kind)
+        if current is not None and current < base - accuracy_tolerance:
+            regressions.append(f"acerto {kind}: {current:.0%} (baseline {base:.0%})")
+    return regressions
+
+
+def format_report(report):
+    lines = [f"{report['cases']} caso(s) x {report['repeat']} rodada(s), "
+             f"{report['throughput']:.2f} caso(s)/s",
+             "",
+             f"{'etapa':<14}{'qtd':>6}{'p50 (ms)':>11}{'p90 (ms)':>11}{'p99 (ms)':>11}{'média (ms)':>12}{'por s':>9}"]
+    for stage, s in sorted(report["stages"].items()):
+        lines.append(f"{stage:<14}{s['count']:>6}{s['p50_ms']:>11.1f}{s['p90_ms']:>11.1f}{s['p99_ms']:>11.1f}"
+                     f"{s['mean_ms']:>12.1f}{s['per_second']:>9.1f}")
+    lines.append("")
+    for kind, rate in sorted(report["accuracy"].items()):
+        lines.append(f"Acerto {kind}: {rate:.0%}")
+    if report["failures"]:
+        lines.append(f"Casos com erro: {', '.join(report['failures'])}")
+    if report["variants"]:
+        lines.append("")
+        lines.append(f"{'variação':<32}{'OCR':>7}{'acertos':>9}{'taxa':>7}{'total (ms)':>12}")
+        for variant, s in sorted(report["variants"].items(), key=lambda item: -item[1]["hit_rate"]):
+            lines.append(f"{str(variant)[:31]:<32}{s['calls']:>7}{s['hits']:>9}{s['hit_rate']:>7.0%}"
+                         f"{s['total_ms']:>12.1f}")
+    return "\n".join(lines)
+
+
+# --- Corpus sintético -------------------------------------------------------
+
+_FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+def _draw_text(img, text, origin, color, scale=0.7, thickness=2):
+    """Escreve o texto com a base em origin; retorna a caixa (x, y, w, h) ocupada."""
+    (w, h), baseline = cv2.getTextSize(text, _FONT, scale, thickness)
+    cv2.putText(img, text, origin, _FONT, scale, color, thickness, cv2.LINE_AA)
+    return [origin[0], origin[1] - h, w, h + baseline]
+
+
+def _digit_cells(rng, color):
+    """Linha de células coloridas com números; o alvo é o número de uma das células."""
+    cell_w, cell_h, cells = 90, 40, 4
+    img = np.full((cell_h, cell_w * cells, 3), 255, np.uint8)
+    numbers = [str(rng.integers(10, 9999)) for _ in range(cells)]
+    target = int(rng.integers(cells))
+    boxes = []
+    for i, number in enumerate(numbers):
+        x = i * cell_w
+        cv2.rectangle(img, (x, 0), (x + cell_w - 1, cell_h - 1), color, -1)
+        cv2.rectangle(img, (x, 0), (x + cell_w - 1, cell_h - 1), (120, 120, 120), 1)
+        boxes.append(_draw_text(img, number, (x + 12, 28), (0, 0, 0)))
+    return img, numbers[target], boxes[target]
+
+
+def _word_line(rng, words, background, foreground):
+    """Linha de palavras sobre um fundo liso; o alvo é uma das palavras."""
+    chosen = list(rng.choice(words, size=3, replace=False))
+    img = np.full((44, 420, 3), background, np.uint8)
+    x, boxes = 10, []
+    for word in chosen:
+        boxes.append(_draw_text(img, word, (x, 30), foreground))
+        x += boxes[-1][2] + 24
+    target = int(rng.integers(len(chosen)))
+    return img, chosen[target], boxes[target]
+
+
+def _button(label):
+    img = np.full((32, 110, 3), (225, 230, 240), np.uint8)
+    cv2.rectangle(img, (0, 0), (109, 31), (60, 90, 160), 2)
+    cv2.circle(img, (16, 16), 8, (40, 140, 60), -1)
+    _draw_text(img, label, (30, 22), (20, 20, 20), scale=0.5, thickness=1)
+    return img
+
+
+def _screen(rng, size=(720, 1280)):
+    """Quadro de tela com janelas e textos de fundo."""
+    height, width = size
+    img = np.full((height, width, 3), (236, 236, 236), np.uint8)
+    for _ in range(6):
+        x, y = int(rng.integers(0, width - 300)), int(rng.integers(0, height - 200))
+        shade = tuple(int(v) for v in rng.integers(180, 250, 3))
+        cv2.rectangle(img, (x, y), (x + int(rng.integers(200, 300)), y + int(rng.integers(100, 200))), shade, -1)
+        _draw_text(img, f"Janela {int(rng.integers(100))}", (x + 8, y + 24), (60, 60, 60), scale=0.5, thickness=1)
+    return img
+
+
+def generate_corpus(folder, seed=0, per_kind=4):
+    """
+    Gera um corpus sintético com alvos conhecidos: números em células
+    coloridas, palavras em fundo claro, texto claro em fundo escuro e
+    referências coladas na tela em escalas de 0.95 a 1.05. Serve de ponto de
+    partida; capturas reais podem ser acrescentadas ao manifest.json.
+    """
+    rng = np.random.default_rng(seed)
+    cases = []
+    colors = [(255, 230, 120), (170, 220, 150), (180, 210, 240), (245, 190, 200)]
+    letters = ["Salvar", "Pesquisar", "Confirmar", "Cancelar", "Pedido", "Cliente", "Produto", "Enviar"]
+    mixed = ["Pedido", "Lote", "Item", "A123", "B77", "OK", "Status", "X9"]
+
+    for i in range(per_kind):
+        img, text, box = _digit_cells(rng, colors[i % len(colors)])
+        path = f"regions/digits_{i}.png"
+        save_rgb(os.path.join(folder, path), img)
+        cases.append({"name": f"digits_{i}", "kind": "text", "image": path, "text": text,
+                      "char_type": "numbers", "expect": box})
+
+        img, text, box = _word_line(rng, letters, (255, 255, 255), (0, 0, 0))
+        path = f"regions/letters_{i}.png"
+        save_rgb(os.path.join(folder, path), img)
+        cases.append({"name": f"letters_{i}", "kind": "text", "image": path, "text": text,
+                      "char_type": "letters", "expect": box})
+
+        img, text, box = _word_line(rng, mixed, (40, 40, 48), (230, 230, 230))
+        path = f"regions/dark_{i}.png"
+        save_rgb(os.path.join(folder, path), img)
+        cases.append({"name": f"dark_{i}", "kind": "text", "image": path, "text": text,
+                      "char_type": "both", "expect": box})
+
+        template = _button(letters[i % len(letters)])
+        template_path = f"templates/button_{i}.png"
+        save_rgb(os.path.join(folder, template_path), template)
+        scale = (1.0, 0.95, 1.05)[i % 3]
+        pasted = cv2.resize(template, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        screen = _screen(rng)
+        h, w = pasted.shape[:2]
+        x, y = int(rng.integers(0, screen.shape[1] - w)), int(rng.integers(0, screen.shape[0] - h))
+        screen[y:y + h, x:x + w] = pasted
+        frame_path = f"frames/screen_{i}.png"
+        save_rgb(os.path.join(folder, frame_path), screen)
+        center = [x + w // 2, y + h // 2]
+        cases.append({"name": f"template_{i}_x{scale}", "kind": "image", "frame": frame_path,
+                      "template": template_path, "region": None, "expect": center})
+        # A mesma referência procurada dentro de uma região ao redor do alvo
+        region = [max(0, x - 150), max(0, y - 100), 400, 260]
+        cases.append({"name": f"template_{i}_region", "kind": "image", "frame": frame_path,
+                      "template": template_path, "region": region, "expect": center})
+
+    with open(os.path.join(folder, MANIFEST), "w", encoding="utf-8") as file:
+        json.dump({"seed": seed, "cases": cases}, file, indent=2)
+    return cases
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline de OCR e busca de imagens.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="Gera um corpus sintético")
+    generate.add_argument("folder")
+    generate.add_argument("--seed", type=int, default=0)
+    generate.add_argument("--per-kind", type=int, default=4)
+
+    run = commands.add_parser("run", help="Executa o benchmark sobre um corpus")
+    run.add_argument("folder")
+    run.add_argument("--repeat", type=int, default=3)
+    run.add_argument("--warmup", type=int, default=1)
+    run.add_argument("--baseline", help=f"Arquivo da baseline (padrão: <corpus>/{BASELINE})")
+    run.add_argument("--save-baseline", action="store_true", help="Grava o resultado como nova baseline")
+    run.add_argument("--tolerance", type=float, default=LATENCY_TOLERANCE,
+                     help="Piora de latência aceitável (fração)")
+    run.add_argument("--report", help="Grava o relatório completo em JSON")
+    run.add_argument("--trace", help="Grava o rastreamento das rodadas medidas (ver tracing.py)")
+    run.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        cases = generate_corpus(args.folder, args.seed, args.per_kind)
+        print(f"{len(cases)} caso(s) gravados em {args.folder}")
+        return 0
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    cases = load_corpus(args.folder)
+    # Sem Tesseract cada caso de texto falharia em silêncio e o relatório não valeria nada
+    error = ocr_engine.check_tesseract()
+    if error and any(case["kind"] == "text" for case in cases):
+        print(f"Tesseract indisponível ({error}); configure RPA_TESSERACT_CMD/TESSDATA_PREFIX.", file=sys.stderr)
+        return 2
+    report = run_benchmark(cases, args.repeat, args.warmup, args.trace)
+    print(format_report(report))
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+    baseline_path = args.baseline or os.path.join(args.folder, BASELINE)
+    if args.save_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        print(f"\nBaseline gravada em {baseline_path}")
+        return 0
+    if os.path.exists(baseline_path):
+        with open(baseline_path, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        regressions = compare(report, baseline, latency_tolerance=args.tolerance)
+        print(f"\nComparação com a baseline de {baseline.get('created')} ({baseline.get('machine')}):")
+        for regression in regressions:
+            print(f"  REGRESSÃO {regression}")
+        if regressions:
+            return 1
+        print("  sem regressões")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,262 @@
+import os
+import time
+import logging
+from contextlib import contextmanager
+
+from selenium.common.exceptions import NoSuchFrameException, TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+
+# Tempo máximo padrão de cada espera (s); as esperas terminam assim que a
+# condição é atendida
+DEFAULT_TIMEOUT = float(os.environ.get("RPA_WEB_TIMEOUT", 20))
+# Tempo sem mutações no DOM e sem requisições pendentes para considerar a
+# página ociosa
+QUIET_MS = 300
+# Maior intervalo entre duas verificações quando nada muda na página
+MAX_WAKE_MS = 1000
+# Timeout de scripts assíncronos do Selenium, restaurado após cada espera
+# quando o driver não informa o valor atual
+DEFAULT_SCRIPT_TIMEOUT = 30
+
+# Instrumentação instalada em cada documento (janela ou frame): conta as
+# requisições XHR/fetch em andamento e registra o instante da última
+# atividade (requisição ou mutação do DOM). ES5 para funcionar no modo IE.
+# Sem addEventListener no XHR (IE7/8), as requisições ficam em uma lista e
+# sweep() encerra as que chegaram a readyState 4 a cada verificação, pois a
+# página pode trocar o onreadystatechange depois do send().
+_INSTRUMENT = """
+var w = window;
+if (!w.__rpaWait) {
+    var state = {pending: 0, last: new Date().getTime(), token: null, xhrs: []};
+    var touch = function () { state.last = new Date().getTime(); };
+    state.sweep = function () {
+        for (var i = state.xhrs.length - 1; i >= 0; i--) {
+            var done = true;
+            try { done = state.xhrs[i].readyState === 4; } catch (e) {}
+            if (done) { state.xhrs.splice(i, 1); state.pending--; touch(); }
+        }
+    };
+    var XHR = w.XMLHttpRequest;
+    if (XHR && XHR.prototype) {
+        var send = XHR.prototype.send;
+        XHR.prototype.send = function () {
+            var xhr = this, finished = false;
+            var end = function () { if (!finished) { finished = true; state.pending--; touch(); } };
+            state.pending++; touch();
+            if (xhr.addEventListener) {
+                xhr.addEventListener('loadend', end, false);
+            } else {
+                state.xhrs.push(xhr);
+            }
+            return send.apply(xhr, arguments);
+        };
+    }
+    if (w.fetch) {
+        var fetch = w.fetch;
+        w.fetch = function () {
+            state.pending++; touch();
+            var end = function (v) { state.pending--; touch(); return v; };
+            return fetch.apply(w, arguments).then(end, function (e) { end(); throw e; });
+        };
+    }
+    if (w.MutationObserver && document.documentElement) {
+        new MutationObserver(touch).observe(document.documentElement,
+            {childList: true, subtree: true, attributes: true, characterData: true});
+    }
+    w.__rpaWait = state;
+}
+"""
+
+_STATUS = _INSTRUMENT + """
+var s = window.__rpaWait;
+s.sweep();
+return {ready: document.readyState, pending: s.pending, quiet: new Date().getTime() - s.last, token: s.token};
+"""
+
+_MARK = _INSTRUMENT + "window.__rpaWait.token = arguments[0];"
+
+# Resolve na próxima mutação do DOM ou após arguments[0] ms, o que vier antes
+_NEXT_MUTATION = """
+var done = arguments[arguments.length - 1], wait = arguments[0], finished = false, observer = null;
+var finish = function () {
+    if (finished) { return; }
+    finished = true;
+    if (observer) { observer.disconnect(); }
+    done(true);
+};
+if (window.MutationObserver && document.documentElement) {
+    observer = new MutationObserver(finish);
+    observer.observe(document.documentElement, {childList: true, subtree: true, attributes: true, characterData: true});
+}
+setTimeout(finish, wait);
+"""
+
+
+class WebWaiter:
+    """
+    Esperas orientadas a eventos para o WebBot. Em vez de pausas fixas, cada
+    espera observa a página dentro do navegador (MutationObserver, XHR/fetch
+    em andamento, readyState dos frames) e termina assim que o elemento ou o
+    frame está pronto. timeout é só o limite superior; step() registra o
+    tempo gasto em cada passo do fluxo.
+
+    Frames são indicados pelo nome (ex.: 'topFrame', 'mainFrame') a partir
+    do documento principal da aba ativa.
+    """
+
+    def __init__(self, webbot, timeout=DEFAULT_TIMEOUT, quiet_ms=QUIET_MS):
+        self.webbot = webbot
+        self.timeout = timeout
+        self.quiet_ms = quiet_ms
+        self.timings = []
+
+    @property
+    def driver(self):
+        return self.webbot.driver
+
+    @contextmanager
+    def step(self, name):
+        """Registra o tempo gasto no passo (também em caso de falha)."""
+        started = time.monotonic()
+        ok = False
+        try:
+            yield self
+            ok = True
+        finally:
+            elapsed = time.monotonic() - started
+            self.timings.append((name, elapsed, ok))
+            logging.info(f"[web] Passo '{name}' {'concluído' if ok else 'falhou'} em {elapsed:.2f}s")
+
+    def _enter(self, frame):
+        self.driver.switch_to.default_content()
+        if frame:
+            self.driver.switch_to.frame(frame)
+
+    def _sleep_until_mutation(self, deadline):
+        """Dorme até a próxima mutação do DOM no contexto atual (no máximo MAX_WAKE_MS)."""
+        wait_ms = int(max(0.0, min(deadline - time.monotonic(), MAX_WAKE_MS / 1000)) * 1000)
+        if wait_ms <= 0:
+            return
+        try:
+            previous = self.driver.timeouts.script
+        except (AttributeError, WebDriverException):
+            previous = DEFAULT_SCRIPT_TIMEOUT
+        try:
+            self.driver.set_script_timeout(wait_ms / 1000 + 5)
+            self.driver.execute_async_script(_NEXT_MUTATION, wait_ms)
+        except WebDriverException:
+            # Documento trocado durante a espera (navegação): basta verificar de novo
+            time.sleep(0.05)
+        finally:
+            try:
+                self.driver.set_script_timeout(previous)
+            except WebDriverException as e:
+                logging.debug(f"[web] Não foi possível restaurar o timeout de scripts: {e}")
+
+    def _wait_in(self, frame, deadline):
+        """Espera a próxima mutação dentro do frame (ou um instante, se ele ainda não existe)."""
+        try:
+            self._enter(frame)
+        except (NoSuchFrameException, WebDriverException):
+            time.sleep(0.05)
+            return
+        self._sleep_until_mutation(deadline)
+
+    def _status(self, frame):
+        try:
+            self._enter(frame)
+            return self.driver.execute_script(_STATUS)
+        except (NoSuchFrameException, WebDriverException):
+            return None
+
+    def _idle(self, status):
+        return (status is not None and status["ready"] == "complete"
+                and status["pending"] <= 0 and status["quiet"] >= self.quiet_ms)
+
+    def wait_for_idle(self, frames=(None,), timeout=None):
+        """
+        Espera o documento principal (None) e os frames indicados terminarem
+        de carregar, sem requisições pendentes e sem mutações por quiet_ms.
+        """
+        deadline = time.monotonic() + (timeout or self.timeout)
+        try:
+            while True:
+                pending = [frame for frame in frames if not self._idle(self._status(frame))]
+                if not pending:
+                    return
+                if time.monotonic() >= deadline:
+                    raise TimeoutException(f"Página não ficou ociosa (frames: {pending})")
+                self._wait_in(pending[0], deadline)
+        finally:
+            self.driver.switch_to.default_content()
+
+    def mark_frames(self, frames):
+        """Marca o documento atual dos frames, para wait_for_frame_reload detectar a troca."""
+        token = str(time.monotonic())
+        for frame in frames:
+            self._enter(frame)
+            self.driver.execute_script(_MARK, token)
+        self.driver.switch_to.default_content()
+        return token
+
+    def wait_for_frame_reload(self, frame, token, timeout=None):
+        """Espera o frame carregar um novo documento (sem a marca) e ficar ocioso."""
+        deadline = time.monotonic() + (timeout or self.timeout)
+        try:
+            while True:
+                status = self._status(frame)
+                if status is not None and status["token"] != token and self._idle(status):
+                    return
+                if time.monotonic() >= deadline:
+                    raise TimeoutException(f"Frame {frame} não recarregou")
+                self._wait_in(frame, deadline)
+        finally:
+            self.driver.switch_to.default_content()
+
+    def wait_for_tab(self, count, timeout=None):
+        """Espera existirem pelo menos count abas/janelas e retorna a lista de abas."""
+        deadline = time.monotonic() + (timeout or self.timeout)
+        while True:
+            handles = self.driver.window_handles
+            if len(handles) >= count:
+                return handles
+            if time.monotonic() >= deadline:
+                raise TimeoutException(f"Esperava {count} aba(s), há {len(handles)}")
+            time.sleep(0.05)
+
+    def wait_for_element(self, xpath, frame=None, visible=True, timeout=None):
+        """
+        Espera o elemento (XPath) aparecer, e ficar visível se visible=True,
+        acordando a cada mutação do DOM. Retorna o elemento com o driver já
+        dentro do frame indicado.
+        """
+        deadline = time.monotonic() + (timeout or self.timeout)
+        while True:
+            try:
+                self._enter(frame)
+                for element in self.driver.find_elements(By.XPATH, xpath):
+                    if not visible or element.is_displayed():
+                        return element
+            except (NoSuchFrameException, WebDriverException) as e:
+                logging.debug(f"[web] Aguardando {xpath}: {e}")
+            if time.monotonic() >= deadline:
+                raise TimeoutException(f"Elemento não encontrado: {xpath}")
+            self._sleep_until_mutation(deadline)
+
+    def click(self, xpath, frame=None, timeout=None):
+        """Espera o elemento ficar visível e clica nele, localizando-o uma única vez."""
+        element = self.wait_for_element(xpath, frame, timeout=timeout)
+        element.click()
+        try:
+            self.driver.switch_to.default_content()
+        except WebDriverException:
+            # A janela pode fechar com o próprio clique (ex.: OK de um popup)
+            pass
+
+    def run_script(self, script, *args, frame=None):
+        """Executa um script no frame indicado (ou no documento principal)."""
+        try:
+            self._enter(frame)
+            return self.driver.execute_script(script, *args)
+        finally:
+            self.driver.switch_to.default_content()